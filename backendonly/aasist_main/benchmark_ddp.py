@@ -0,0 +1,110 @@
+"""
+Scaling efficiency of CPU DistributedDataParallel training on one machine.
+
+Runs main.train_epoch on synthetic 64600-sample waveforms for 1, 2, 4 and 8
+gloo processes and reports samples/s and efficiency relative to linear
+scaling of the single-process run.
+
+    python benchmark_ddp.py --config ./config/AASIST-L.conf --nproc 1,2,4,8
+"""
+import argparse
+import json
+import time
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data.distributed import DistributedSampler
+
+from main import get_model, train_epoch
+from utils import create_optimizer
+
+
+def worker(rank: int, world_size: int, args: argparse.Namespace,
+           config: dict, results) -> None:
+    if world_size > 1:
+        dist.init_process_group(
+            "gloo",
+            init_method="tcp://127.0.0.1:{}".format(args.master_port +
+                                                    world_size),
+            rank=rank,
+            world_size=world_size)
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(args.seed)
+
+    n_samples = args.steps * args.batch_size
+    dataset = TensorDataset(torch.randn(n_samples, 64600),
+                            torch.randint(0, 2, (n_samples, )))
+    sampler = None
+    if world_size > 1:
+        sampler = DistributedSampler(dataset, world_size, rank,
+                                     drop_last=True)
+    loader = DataLoader(dataset,
+                        batch_size=args.batch_size // world_size,
+                        shuffle=sampler is None,
+                        sampler=sampler,
+                        drop_last=True)
+
+    model = get_model(config["model_config"], "cpu")
+    if world_size > 1:
+        model = DistributedDataParallel(model)
+    optim_config = config["optim_config"]
+    optim_config["epochs"] = 1
+    optim_config["steps_per_epoch"] = len(loader)
+    optimizer, scheduler = create_optimizer(model.parameters(), optim_config)
+
+    start = time.perf_counter()
+    train_epoch(loader, model, optimizer, "cpu", scheduler, config)
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        results.put(elapsed)
+    if world_size > 1:
+        dist.destroy_process_group()
+
+
+def main(args: argparse.Namespace) -> None:
+    with open(args.config, "r") as f_json:
+        config = json.loads(f_json.read())
+    config.setdefault("freq_aug", "False")
+
+    context = mp.get_context("spawn")
+    results = context.SimpleQueue()
+    rows = []
+    for world_size in [int(n) for n in args.nproc.split(",")]:
+        mp.spawn(worker,
+                 args=(world_size, args, config, results),
+                 nprocs=world_size)
+        elapsed = results.get()
+        throughput = args.steps * args.batch_size / elapsed
+        rows.append((world_size, throughput))
+
+    base = rows[0][1] / rows[0][0]
+    print("{:>6} {:>12} {:>11}".format("procs", "samples/s", "efficiency"))
+    for world_size, throughput in rows:
+        print("{:>6} {:>12.1f} {:>10.0f}%".format(
+            world_size, throughput, 100 * throughput / (base * world_size)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="CPU DDP scaling benchmark for AASIST training")
+    parser.add_argument("--config", type=str, required=True)
+    parser.add_argument("--nproc", type=str, default="1,2,4,8")
+    parser.add_argument("--threads",
+                        type=int,
+                        default=1,
+                        help="torch threads per process (default: 1)")
+    parser.add_argument("--batch_size",
+                        type=int,
+                        default=32,
+                        help="global batch size (default: 32)")
+    parser.add_argument("--steps",
+                        type=int,
+                        default=20,
+                        help="optimizer steps per run (default: 20)")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--master_port", type=int, default=29600)
+    main(parser.parse_args())
@@ -0,0 +1,142 @@
+"""
+Benchmark calculate_tDCF_EER on eval-sized synthetic score files and check
+that it reproduces the reference np.genfromtxt / per-attack-sort
+implementation exactly.
+
+    python benchmark_evaluation.py --repeats 5
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+import evaluation
+from evaluation import (calculate_tDCF_EER, compute_eer, compute_tDCF,
+                        obtain_asv_error_rates)
+
+# ASVspoof 2019 LA eval sizes
+N_CM_BONAFIDE = 7355
+N_CM_SPOOF_PER_ATTACK = 4914
+N_ASV = {"target": 5370, "nontarget": 33327, "spoof": 63882}
+ATTACK_TYPES = [f"A{_id:02d}" for _id in range(7, 20)]
+
+
+def write_score_files(out_dir: Path, seed: int):
+    """Deterministic ASV and CM score files with the eval-set layout"""
+    rng = np.random.default_rng(seed)
+    asv_file = out_dir / "asv_scores.txt"
+    with open(asv_file, "w") as fh:
+        for key, n in N_ASV.items():
+            mean = {"target": 3.0, "nontarget": -3.0, "spoof": 1.0}[key]
+            for sco in rng.normal(mean, 2.0, n):
+                fh.write("LA_0000 {} {}\n".format(key, sco))
+
+    cm_file = out_dir / "cm_scores.txt"
+    with open(cm_file, "w") as fh:
+        utt = 0
+        for sco in rng.normal(2.0, 1.5, N_CM_BONAFIDE):
+            fh.write("LA_E_{:07d} - bonafide {}\n".format(utt, sco))
+            utt += 1
+        for i, attack in enumerate(ATTACK_TYPES):
+            scores = rng.normal(-2.0 + 0.2 * i, 1.5, N_CM_SPOOF_PER_ATTACK)
+            # quantize some scores so ties with bona fide scores are exercised
+            scores[::7] = np.round(scores[::7], 1)
+            for sco in scores:
+                fh.write("LA_E_{:07d} {} spoof {}\n".format(utt, attack, sco))
+                utt += 1
+    return asv_file, cm_file
+
+
+def reference_tDCF_EER(cm_scores_file, asv_score_file):
+    """The previous implementation: genfromtxt parsing, one sort per EER"""
+    Pspoof = 0.05
+    cost_model = {
+        'Pspoof': Pspoof,
+        'Ptar': (1 - Pspoof) * 0.99,
+        'Pnon': (1 - Pspoof) * 0.01,
+        'Cmiss': 1,
+        'Cfa': 10,
+        'Cmiss_asv': 1,
+        'Cfa_asv': 10,
+        'Cmiss_cm': 1,
+        'Cfa_cm': 10,
+    }
+    asv_data = np.genfromtxt(asv_score_file, dtype=str)
+    asv_keys = asv_data[:, 1]
+    asv_scores = asv_data[:, 2].astype(np.float64)
+    cm_data = np.genfromtxt(cm_scores_file, dtype=str)
+    cm_sources = cm_data[:, 1]
+    cm_keys = cm_data[:, 2]
+    cm_scores = cm_data[:, 3].astype(np.float64)
+
+    tar_asv = asv_scores[asv_keys == 'target']
+    non_asv = asv_scores[asv_keys == 'nontarget']
+    spoof_asv = asv_scores[asv_keys == 'spoof']
+    bona_cm = cm_scores[cm_keys == 'bonafide']
+    spoof_cm = cm_scores[cm_keys == 'spoof']
+
+    _, asv_threshold = compute_eer(tar_asv, non_asv)
+    eer_cm = compute_eer(bona_cm, spoof_cm)[0]
+    breakdown = [
+        compute_eer(bona_cm, cm_scores[cm_sources == attack_type])[0]
+        for attack_type in ATTACK_TYPES
+    ]
+    Pfa_asv, Pmiss_asv, Pmiss_spoof_asv = obtain_asv_error_rates(
+        tar_asv, non_asv, spoof_asv, asv_threshold)
+    tDCF_curve, _ = compute_tDCF(bona_cm, spoof_cm, Pfa_asv, Pmiss_asv,
+                                 Pmiss_spoof_asv, cost_model, False)
+    return eer_cm * 100, tDCF_curve[np.argmin(tDCF_curve)], breakdown
+
+
+def read_breakdown(output_file):
+    with open(output_file, "r") as f_res:
+        return [
+            float(line.split("=")[1].split("%")[0])
+            for line in f_res if line.strip().startswith("EER A")
+        ]
+
+
+def main(args: argparse.Namespace) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        out_dir = Path(tmp)
+        asv_file, cm_file = write_score_files(out_dir, args.seed)
+        output_file = out_dir / "t-DCF_EER.txt"
+
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            ref_eer, ref_tdcf, ref_breakdown = reference_tDCF_EER(
+                cm_file, asv_file)
+        reference_time = (time.perf_counter() - start) / args.repeats
+
+        evaluation._asv_cache.clear()
+        start = time.perf_counter()
+        for _ in range(args.repeats):
+            eer, tdcf = calculate_tDCF_EER(cm_file, asv_file, output_file,
+                                           printout=False)
+        fast_time = (time.perf_counter() - start) / args.repeats
+
+        # full report (with per-attack breakdown) for the parity check
+        eer, tdcf = calculate_tDCF_EER(cm_file, asv_file, output_file,
+                                       printout=True)
+        breakdown = read_breakdown(output_file)
+        expected = ["{:8.9f}".format(v * 100) for v in ref_breakdown]
+        got = ["{:8.9f}".format(v) for v in breakdown]
+
+        print("\nreference: {:.3f}s per call".format(reference_time))
+        print("optimized: {:.3f}s per call ({:.1f}x)".format(
+            fast_time, reference_time / fast_time))
+        assert eer == ref_eer, (eer, ref_eer)
+        assert tdcf == ref_tdcf, (tdcf, ref_tdcf)
+        assert got == expected, (got, expected)
+        print("EER {:.6f}%, min t-DCF {:.6f}: identical to reference".format(
+            eer, tdcf))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark t-DCF/EER score-file evaluation")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1234)
+    main(parser.parse_args())
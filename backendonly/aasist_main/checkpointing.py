@@ -0,0 +1,92 @@
+"""
+Full-state training checkpoints written off the training thread.
+"""
+import os
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+import torch
+
+
+def to_cpu(obj):
+    """Deep copy of obj with every tensor cloned to CPU memory"""
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(value) for value in obj)
+    return obj
+
+
+def get_rng_state() -> Dict:
+    """RNG states as plain tuples and tensors (safe for weights_only loads)"""
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    state = {
+        "python": random.getstate(),
+        "numpy": (name, torch.from_numpy(keys.astype(np.int64)), pos,
+                  has_gauss, cached_gaussian),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state: Dict) -> None:
+    random.setstate(state["python"])
+    name, keys, pos, has_gauss, cached_gaussian = state["numpy"]
+    np.random.set_state((name, keys.numpy().astype(np.uint32), pos,
+                         has_gauss, cached_gaussian))
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class AsyncCheckpointer:
+    """Writes checkpoints from a background thread
+
+    save() takes a CPU snapshot on the calling thread (so training may keep
+    updating the live tensors) and hands it to a writer thread that saves
+    to a temporary file and atomically renames it over the target. At most
+    one write is in flight; the time the caller spends snapshotting or
+    waiting for the previous write is recorded as the stall.
+    """
+    def __init__(self):
+        self.thread = None
+        self.error = None
+        self.last_stall = 0.
+        self.total_stall = 0.
+
+    def save(self, state: Dict, path: Path) -> float:
+        start = time.perf_counter()
+        self.wait()
+        snapshot = to_cpu(state)
+        self.thread = threading.Thread(target=self._write,
+                                       args=(snapshot, Path(path)),
+                                       daemon=True)
+        self.thread.start()
+        self.last_stall = time.perf_counter() - start
+        self.total_stall += self.last_stall
+        return self.last_stall
+
+    def _write(self, snapshot: Dict, path: Path) -> None:
+        tmp_path = path.with_name(path.name + ".tmp")
+        try:
+            torch.save(snapshot, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:  # surfaced on the next save()/wait()
+            self.error = e
+
+    def wait(self) -> None:
+        """Block until the in-flight write (if any) is on disk"""
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError("checkpoint write failed") from error
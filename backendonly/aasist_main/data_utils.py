@@ -1,3 +1,5 @@
+from pathlib import Path
+
 import numpy as np
 import soundfile as sf
 import torch
@@ -97,3 +99,87 @@ class Dataset_ASVspoof2019_devNeval(Dataset):
         X_pad = pad(X, self.cut)
         x_inp = Tensor(X_pad)
         return x_inp, key
+
+
+class WaveformShards:
+    """Read-only view of waveforms pre-decoded by prepare_shards.py
+
+    The index (<split>.index.npz) maps each utt key to a shard file, a
+    sample offset and a length. Shards are opened lazily as np.memmap so
+    every DataLoader worker maps them itself after it is forked.
+    """
+    def __init__(self, shard_dir, split):
+        self.shard_dir = Path(shard_dir)
+        index = np.load(self.shard_dir / f"{split}.index.npz")
+        self.dtype = np.dtype(str(index["dtype"]))
+        self.shard_files = [str(name) for name in index["shard_files"]]
+        self.entries = {
+            key: (int(shard), int(offset), int(length))
+            for key, shard, offset, length in zip(
+                index["keys"], index["shard"], index["offset"],
+                index["length"])
+        }
+        self._maps = None
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_maps"] = None
+        return state
+
+    def read(self, key):
+        """Zero-copy slice of the stored samples for key"""
+        if self._maps is None:
+            self._maps = [
+                np.memmap(self.shard_dir / name, dtype=self.dtype, mode="r")
+                for name in self.shard_files
+            ]
+        shard, offset, length = self.entries[key]
+        return self._maps[shard][offset:offset + length]
+
+    def to_float(self, x):
+        """Copy the (small) cropped window out of the read-only map as float32"""
+        # int16 shards hold raw PCM; sf.read scales by 1/32768
+        if self.dtype == np.int16:
+            return x.astype(np.float32) / 32768.0
+        return np.array(x, dtype=np.float32)
+
+
+class Dataset_ASVspoof2019_train_shards(Dataset):
+    def __init__(self, list_IDs, labels, shards):
+        """Same items as Dataset_ASVspoof2019_train, read from WaveformShards"""
+        self.list_IDs = list_IDs
+        self.labels = labels
+        self.shards = shards
+        self.cut = 64600  # take ~4 sec audio (64600 samples)
+
+    def __len__(self):
+        return len(self.list_IDs)
+
+    def __getitem__(self, index):
+        key = self.list_IDs[index]
+        X = self.shards.read(key)
+        X_pad = self.shards.to_float(pad_random(X, self.cut))
+        x_inp = Tensor(X_pad)
+        y = self.labels[key]
+        return x_inp, y
+
+
+class Dataset_ASVspoof2019_devNeval_shards(Dataset):
+    def __init__(self, list_IDs, shards):
+        """Same items as Dataset_ASVspoof2019_devNeval, read from WaveformShards"""
+        self.list_IDs = list_IDs
+        self.shards = shards
+        self.cut = 64600  # take ~4 sec audio (64600 samples)
+
+    def __len__(self):
+        return len(self.list_IDs)
+
+    def __getitem__(self, index):
+        key = self.list_IDs[index]
+        X = self.shards.read(key)
+        X_pad = self.shards.to_float(pad(X, self.cut))
+        x_inp = Tensor(X_pad)
+        return x_inp, key
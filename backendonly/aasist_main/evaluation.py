@@ -30,32 +30,26 @@ def calculate_tDCF_EER(cm_scores_file,
         'Cfa_cm': 10,  # Cost of CM system falsely accepting spoof
     }
 
-    # Load organizers' ASV scores
-    asv_data = np.genfromtxt(asv_score_file, dtype=str)
-    # asv_sources = asv_data[:, 0]
-    asv_keys = asv_data[:, 1]
-    asv_scores = asv_data[:, 2].astype(np.float)
+    # Load organizers' ASV scores (parsed once per file and cached)
+    (tar_asv, non_asv, spoof_asv, eer_asv, asv_threshold, Pfa_asv,
+     Pmiss_asv, Pmiss_spoof_asv) = load_asv_operating_point(asv_score_file)
 
     # Load CM scores
-    cm_data = np.genfromtxt(cm_scores_file, dtype=str)
-    # cm_utt_id = cm_data[:, 0]
-    cm_sources = cm_data[:, 1]
-    cm_keys = cm_data[:, 2]
-    cm_scores = cm_data[:, 3].astype(np.float)
-
-    # Extract target, nontarget, and spoof scores from the ASV scores
-    tar_asv = asv_scores[asv_keys == 'target']
-    non_asv = asv_scores[asv_keys == 'nontarget']
-    spoof_asv = asv_scores[asv_keys == 'spoof']
+    cm_columns = read_score_columns(cm_scores_file)
+    # cm_utt_id = cm_columns[0]
+    cm_sources = cm_columns[1]
+    cm_keys = cm_columns[2]
+    cm_scores = cm_columns[3].astype(np.float64)
 
     # Extract bona fide (real human) and spoof scores from the CM scores
     bona_cm = cm_scores[cm_keys == 'bonafide']
     spoof_cm = cm_scores[cm_keys == 'spoof']
 
-    # EERs of the standalone systems and fix ASV operating point to
-    # EER threshold
-    eer_asv, asv_threshold = compute_eer(tar_asv, non_asv)
-    eer_cm = compute_eer(bona_cm, spoof_cm)[0]
+    # Sort the bona fide scores once and reuse them for every EER below
+    bona_cm_sorted = np.sort(bona_cm, kind='mergesort')
+
+    # EERs of the standalone CM system
+    eer_cm = compute_eer_presorted(bona_cm_sorted, spoof_cm)[0]
 
     attack_types = [f'A{_id:02d}' for _id in range(7, 20)]
     if printout:
@@ -65,15 +59,11 @@ def calculate_tDCF_EER(cm_scores_file,
         }
 
         eer_cm_breakdown = {
-            attack_type: compute_eer(bona_cm,
-                                     spoof_cm_breakdown[attack_type])[0]
+            attack_type: compute_eer_presorted(
+                bona_cm_sorted, spoof_cm_breakdown[attack_type])[0]
             for attack_type in attack_types
         }
 
-    [Pfa_asv, Pmiss_asv,
-     Pmiss_spoof_asv] = obtain_asv_error_rates(tar_asv, non_asv, spoof_asv,
-                                               asv_threshold)
-
     # Compute t-DCF
     tDCF_curve, CM_thresholds = compute_tDCF(bona_cm,
                                              spoof_cm,
@@ -108,6 +98,59 @@ def calculate_tDCF_EER(cm_scores_file,
     return eer_cm * 100, min_tDCF
 
 
+def read_score_columns(score_file):
+    """Split a whitespace-separated score file into per-column arrays of str
+
+    Much faster than np.genfromtxt(dtype=str); converting the score column
+    with astype(np.float64) parses the same strings to the same values.
+    """
+    with open(score_file, "r") as f:
+        first_line = f.readline()
+        tokens = first_line.split() + f.read().split()
+    n_cols = len(first_line.split())
+    if n_cols == 0 or len(tokens) % n_cols != 0:
+        raise ValueError(
+            "Malformed score file {}: expected {} columns per line".format(
+                score_file, n_cols))
+    return [np.array(tokens[col::n_cols]) for col in range(n_cols)]
+
+
+_asv_cache = {}
+
+
+def load_asv_operating_point(asv_score_file):
+    """ASV scores split by key, the EER threshold and the error rates there
+
+    These only depend on the organizers' ASV score file, which stays the
+    same for every call during training, so they are cached per file
+    (invalidated when its size or mtime changes).
+    """
+    stat = os.stat(asv_score_file)
+    cache_key = (str(asv_score_file), stat.st_size, stat.st_mtime_ns)
+    if cache_key not in _asv_cache:
+        asv_columns = read_score_columns(asv_score_file)
+        # asv_sources = asv_columns[0]
+        asv_keys = asv_columns[1]
+        asv_scores = asv_columns[2].astype(np.float64)
+
+        # Extract target, nontarget, and spoof scores from the ASV scores
+        tar_asv = asv_scores[asv_keys == 'target']
+        non_asv = asv_scores[asv_keys == 'nontarget']
+        spoof_asv = asv_scores[asv_keys == 'spoof']
+
+        # EER of the standalone ASV system; fix its operating point to the
+        # EER threshold
+        eer_asv, asv_threshold = compute_eer(tar_asv, non_asv)
+        [Pfa_asv, Pmiss_asv,
+         Pmiss_spoof_asv] = obtain_asv_error_rates(tar_asv, non_asv,
+                                                   spoof_asv, asv_threshold)
+        _asv_cache.clear()
+        _asv_cache[cache_key] = (tar_asv, non_asv, spoof_asv, eer_asv,
+                                 asv_threshold, Pfa_asv, Pmiss_asv,
+                                 Pmiss_spoof_asv)
+    return _asv_cache[cache_key]
+
+
 def obtain_asv_error_rates(tar_asv, non_asv, spoof_asv, asv_threshold):
 
     # False alarm and miss rates for ASV
@@ -151,6 +194,52 @@ def compute_det_curve(target_scores, nontarget_scores):
     return frr, far, thresholds
 
 
+def compute_det_curve_presorted(sorted_target_scores, nontarget_scores):
+    """ compute_det_curve for target scores that are already sorted.
+
+    A stable sort of [targets, nontargets] places targets before nontargets
+    on ties, so merging the sorted nontargets into the sorted targets with
+    searchsorted(side='right') yields the identical ordering and therefore
+    identical curves, without re-sorting the targets.
+    """
+    n_target = sorted_target_scores.size
+    n_nontarget = nontarget_scores.size
+    n_scores = n_target + n_nontarget
+    sorted_nontarget = np.sort(nontarget_scores, kind='mergesort')
+
+    # Positions of the nontarget scores in the merged order
+    nontarget_pos = np.searchsorted(sorted_target_scores, sorted_nontarget,
+                                    side='right') + np.arange(n_nontarget)
+    labels = np.ones(n_scores)
+    labels[nontarget_pos] = 0
+    sorted_scores = np.empty(n_scores)
+    sorted_scores[labels == 1] = sorted_target_scores
+    sorted_scores[nontarget_pos] = sorted_nontarget
+
+    # Compute false rejection and false acceptance rates
+    tar_trial_sums = np.cumsum(labels)
+    nontarget_trial_sums = n_nontarget - \
+        (np.arange(1, n_scores + 1) - tar_trial_sums)
+
+    frr = np.concatenate((np.atleast_1d(0), tar_trial_sums / n_target))
+    far = np.concatenate((np.atleast_1d(1),
+                          nontarget_trial_sums / n_nontarget))
+    thresholds = np.concatenate(
+        (np.atleast_1d(sorted_scores[0] - 0.001), sorted_scores))
+
+    return frr, far, thresholds
+
+
+def compute_eer_presorted(sorted_target_scores, nontarget_scores):
+    """ compute_eer for target scores that are already sorted. """
+    frr, far, thresholds = compute_det_curve_presorted(sorted_target_scores,
+                                                       nontarget_scores)
+    abs_diffs = np.abs(frr - far)
+    min_index = np.argmin(abs_diffs)
+    eer = np.mean((frr[min_index], far[min_index]))
+    return eer, thresholds[min_index]
+
+
 def compute_eer(target_scores, nontarget_scores):
     """ Returns equal error rate (EER) and the corresponding threshold. """
     frr, far, thresholds = compute_det_curve(target_scores, nontarget_scores)
@@ -9,22 +9,34 @@ MIT license
 import argparse
 import json
 import os
+import queue
 import sys
+import time
 import warnings
+from contextlib import nullcontext
+from datetime import timedelta
 from importlib import import_module
 from pathlib import Path
 from shutil import copy
 from typing import Dict, List, Union
 
 import torch
+import torch.distributed as dist
 import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import DataLoader
+from torch.utils.data.distributed import DistributedSampler
 from torch.utils.tensorboard import SummaryWriter
 from torchcontrib.optim import SWA
 
+from checkpointing import AsyncCheckpointer, get_rng_state, set_rng_state
 from data_utils import (Dataset_ASVspoof2019_train,
-                        Dataset_ASVspoof2019_devNeval, genSpoof_list)
+                        Dataset_ASVspoof2019_devNeval,
+                        Dataset_ASVspoof2019_train_shards,
+                        Dataset_ASVspoof2019_devNeval_shards, WaveformShards,
+                        genSpoof_list)
 from evaluation import calculate_tDCF_EER
+from profiling import StepProfiler
 from utils import create_optimizer, seed_worker, set_seed, str_to_bool
 
 warnings.filterwarnings("ignore", category=FutureWarning)
@@ -34,7 +46,69 @@ def main(args: argparse.Namespace) -> None:
     """
     Main function.
     Trains, validates, and evaluates the ASVspoof detection model.
+    With --nproc N > 1, trains under DistributedDataParallel across N
+    local CPU processes (gloo backend).
     """
+    if args.nproc > 1 and not args.eval:
+        torch.multiprocessing.spawn(distributed_worker,
+                                    args=(args, ),
+                                    nprocs=args.nproc)
+    else:
+        train_and_evaluate(args, rank=0, world_size=1)
+
+
+def distributed_worker(rank: int, args: argparse.Namespace) -> None:
+    """Entry point of one DDP process"""
+    dist.init_process_group(
+        "gloo",
+        init_method="tcp://127.0.0.1:{}".format(args.master_port),
+        rank=rank,
+        world_size=args.nproc,
+        # other ranks wait while rank 0 scores the dev / eval sets
+        timeout=timedelta(hours=6))
+    try:
+        train_and_evaluate(args, rank=rank, world_size=args.nproc)
+    finally:
+        dist.destroy_process_group()
+
+
+def broadcast_flag(flag: bool, world_size: int) -> bool:
+    """Share a decision made on rank 0 with every rank"""
+    if world_size == 1:
+        return flag
+    tensor = torch.tensor([int(flag)])
+    dist.broadcast(tensor, src=0)
+    return bool(tensor.item())
+
+
+def make_profiler(args: argparse.Namespace, name: str, device,
+                  model_tag: Path) -> Union[StepProfiler, None]:
+    """StepProfiler for one loop when --profile is given, else None"""
+    if not args.profile:
+        return None
+    return StepProfiler(name, device,
+                        trace_steps=args.profile_trace_steps,
+                        trace_dir=model_tag / "profile_trace" / name)
+
+
+def gather_rng_states(world_size: int) -> List[Dict]:
+    """RNG state of every rank, in rank order"""
+    if world_size == 1:
+        return [get_rng_state()]
+    states = [None] * world_size
+    dist.all_gather_object(states, get_rng_state())
+    return states
+
+
+def train_and_evaluate(args: argparse.Namespace, rank: int,
+                       world_size: int) -> None:
+    """
+    Trains, validates, and evaluates on one rank.
+    Only rank 0 evaluates, logs and writes checkpoints.
+    """
+    is_main = rank == 0
+    run_start = time.perf_counter()
+
     # load experiment configurations
     with open(args.config, "r") as f_json:
         config = json.loads(f_json.read())
@@ -73,22 +147,45 @@ def main(args: argparse.Namespace) -> None:
     model_tag = output_dir / model_tag
     model_save_path = model_tag / "weights"
     eval_score_path = model_tag / config["eval_output"]
-    writer = SummaryWriter(model_tag)
-    os.makedirs(model_save_path, exist_ok=True)
-    copy(args.config, model_tag / "config.conf")
+    checkpoint_path = model_save_path / "checkpoint.pth"
+    resume_state = None
+    start_epoch = 0
+    if args.resume:
+        resume_state = torch.load(checkpoint_path, map_location="cpu")
+        start_epoch = resume_state["epoch"] + 1
+        if is_main:
+            print("Resuming from {} at epoch {}".format(checkpoint_path,
+                                                        start_epoch))
+    writer = None
+    if is_main:
+        # with --async_eval the evaluator process owns the run directory's
+        # event file, so the trainer's scalars go to a subdirectory of it
+        writer = SummaryWriter(
+            model_tag / "trainer" if args.async_eval else model_tag,
+            purge_step=start_epoch if resume_state is not None else None)
+        os.makedirs(model_save_path, exist_ok=True)
+        copy(args.config, model_tag / "config.conf")
 
     # set device
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print("Device: {}".format(device))
-    if device == "cpu":
-        raise ValueError("GPU not detected!")
+    if world_size > 1:
+        # DDP processes share the CPU cores of one machine
+        device = "cpu"
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    else:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    if is_main:
+        print("Device: {}, processes: {}".format(device, world_size))
+    if device == "cpu" and world_size == 1 and not args.cpu:
+        raise ValueError("GPU not detected! (pass --cpu to train on CPU)")
 
     # define model architecture
     model = get_model(model_config, device)
+    if resume_state is not None:
+        model.load_state_dict(resume_state["model"])
 
     # define dataloaders
     trn_loader, dev_loader, eval_loader = get_loader(
-        database_path, args.seed, config)
+        database_path, args.seed, config, rank, world_size)
 
     # evaluates pretrained model and exit script
     if args.eval:
@@ -109,104 +206,388 @@ def main(args: argparse.Namespace) -> None:
             output_file=model_tag/"loaded_model_t-DCF_EER.txt")
         sys.exit(0)
 
+    # the unwrapped model is used for evaluation and checkpoints so saved
+    # weights load without DDP's "module." prefix
+    eval_model = model
+    if world_size > 1:
+        model = DistributedDataParallel(model)
+
     # get optimizer and scheduler
     optim_config["steps_per_epoch"] = len(trn_loader)
     optimizer, scheduler = create_optimizer(model.parameters(), optim_config)
     optimizer_swa = SWA(optimizer)
 
-    best_dev_eer = 1.
-    best_eval_eer = 100.
-    best_dev_tdcf = 0.05
-    best_eval_tdcf = 1.
     n_swa_update = 0  # number of snapshots of model to use in SWA
+    swa_snapshots = []  # --async_eval: snapshots of the best epochs
+    pending_eval = {}  # --async_eval: epoch -> queued, not yet scored
+    eval_state = None  # --async_eval: evaluator's latest best metrics
+    if resume_state is not None:
+        optimizer_swa.load_state_dict(resume_state["optimizer"])
+        if scheduler is not None:
+            scheduler.load_state_dict(resume_state["scheduler"])
+        trn_loader.generator.set_state(resume_state["loader_generator"])
+        saved_ranks = len(resume_state["rng"])
+        if saved_ranks != world_size and is_main:
+            print("Checkpoint was saved by {} process(es), resuming with {}: "
+                  "ranks without a saved RNG state are reseeded".format(
+                      saved_ranks, world_size))
+        if rank < saved_ranks:
+            set_rng_state(resume_state["rng"][rank])
+        else:
+            # distinct per rank and epoch, so a new rank never replays the
+            # random stream of the first epochs
+            set_seed(args.seed + start_epoch * 1000 + rank, config)
+        n_swa_update = resume_state["n_swa_update"]
+        eval_state = resume_state["evaluator"]
+        swa_snapshots = [Path(p) for p in resume_state["swa_snapshots"]]
+        pending_eval = {
+            task[0]: (task[0], Path(task[1]), task[2], task[3])
+            for task in resume_state["pending_eval"]
+        }
+
+    evaluator = None
+    checkpointer = AsyncCheckpointer()
+    train_profiler = None
+    if is_main:
+        train_profiler = make_profiler(args, "train", device, model_tag)
+    if is_main and args.async_eval:
+        # dev / eval scoring runs in its own process on saved snapshots
+        context = torch.multiprocessing.get_context("spawn")
+        eval_tasks = context.Queue()
+        eval_results = context.Queue()
+        evaluator_process = context.Process(
+            target=async_evaluator,
+            args=(args, config, model_tag, database_path, dev_trial_path,
+                  eval_trial_path, eval_tasks, eval_results, eval_state))
+        evaluator_process.start()
+        for epoch in sorted(pending_eval):
+            eval_tasks.put(pending_eval[epoch])
+    elif is_main:
+        f_log = open(model_tag / "metric_log.txt", "a")
+        f_log.write("=" * 5 + "\n")
+        evaluator = EpochEvaluator(config, database_path, model_tag,
+                                   dev_loader, eval_loader, dev_trial_path,
+                                   eval_trial_path, device, writer, f_log,
+                                   make_profiler(args, "dev", device,
+                                                 model_tag))
+        if eval_state is not None:
+            evaluator.load_state_dict(eval_state)
+
+    def handle_eval_result(result) -> None:
+        nonlocal eval_state
+        if result[0] == "epoch":
+            _, epoch, is_best, snapshot_path, eval_state = result
+            pending_eval.pop(epoch, None)
+            if is_best:
+                swa_snapshots.append(snapshot_path)
+        else:
+            _, eval_state = result
+
+    # Training
+    epoch = start_epoch - 1
+    for epoch in range(start_epoch, config["num_epochs"]):
+        if isinstance(trn_loader.sampler, DistributedSampler):
+            trn_loader.sampler.set_epoch(epoch)
+        if is_main:
+            print("Start training epoch{:03d}".format(epoch))
+        epoch_start = time.perf_counter()
+        running_loss = train_epoch(trn_loader, model, optimizer, device,
+                                   scheduler, config, train_profiler)
+        epoch_time = time.perf_counter() - epoch_start
+        if train_profiler is not None:
+            train_profiler.report(epoch, writer)
+
+        if args.async_eval:
+            if is_main:
+                snapshot_path = model_save_path / "snapshot_{:03d}.pth".format(
+                    epoch)
+                torch.save(eval_model.state_dict(), snapshot_path)
+                pending_eval[epoch] = (epoch, snapshot_path, running_loss,
+                                       epoch_time)
+                eval_tasks.put(pending_eval[epoch])
+                while True:
+                    try:
+                        handle_eval_result(eval_results.get_nowait())
+                    except queue.Empty:
+                        break
+        else:
+            is_best = False
+            if is_main:
+                evaluator.log_epoch_time(epoch, epoch_time)
+                is_best = evaluator.evaluate(eval_model, epoch, running_loss)
+                if is_best:
+                    print("Saving epoch {} for swa".format(epoch))
+
+            # every rank keeps identical SWA buffers
+            if broadcast_flag(is_best, world_size):
+                optimizer_swa.update_swa()
+                n_swa_update += 1
+
+        # full training state, so --resume continues exactly from here
+        rng_states = gather_rng_states(world_size)
+        if is_main:
+            stall = checkpointer.save({
+                "epoch": epoch,
+                "model": eval_model.state_dict(),
+                "optimizer": optimizer_swa.state_dict(),
+                "scheduler": scheduler.state_dict()
+                if scheduler is not None else None,
+                "loader_generator": trn_loader.generator.get_state(),
+                "rng": rng_states,
+                "n_swa_update": n_swa_update,
+                "evaluator": evaluator.state_dict()
+                if evaluator is not None else eval_state,
+                "swa_snapshots": [str(p) for p in swa_snapshots],
+                "pending_eval": [(e, str(path), loss, sec) for e, path, loss,
+                                 sec in pending_eval.values()],
+            }, checkpoint_path)
+            print("Checkpoint stall: {:.3f}s".format(stall))
+            writer.add_scalar("checkpoint_stall", stall, epoch)
+    checkpointer.wait()
+
+    if not is_main:
+        return
+    writer.close()
+
+    if args.async_eval:
+        # wait for the evaluator, then average the best snapshots exactly
+        # as update_swa would have during training
+        eval_tasks.put(None)
+        while True:
+            result = eval_results.get()
+            handle_eval_result(result)
+            if result[0] == "done":
+                break
+        evaluator_process.join()
+        best_eval_eer = eval_state["best_eval_eer"]
+        best_eval_tdcf = eval_state["best_eval_tdcf"]
+        n_swa_update = len(swa_snapshots)
+        if n_swa_update > 0:
+            load_snapshot_average(eval_model, swa_snapshots, device)
+        for snapshot_path in swa_snapshots:
+            os.remove(snapshot_path)
+    else:
+        best_eval_eer = evaluator.best_eval_eer
+        best_eval_tdcf = evaluator.best_eval_tdcf
+
+    print("Start final evaluation")
+    epoch += 1
+    if n_swa_update > 0:
+        if not args.async_eval:
+            optimizer_swa.swap_swa_sgd()
+        # batch-norm statistics are re-estimated over the whole training set
+        bn_loader = trn_loader
+        if world_size > 1:
+            bn_loader = DataLoader(trn_loader.dataset,
+                                   batch_size=trn_loader.batch_size,
+                                   shuffle=True,
+                                   drop_last=True)
+        optimizer_swa.bn_update(bn_loader, eval_model, device=device)
+    produce_evaluation_file(eval_loader, eval_model, device, eval_score_path,
+                            eval_trial_path)
+    eval_eer, eval_tdcf = calculate_tDCF_EER(cm_scores_file=eval_score_path,
+                                             asv_score_file=database_path /
+                                             config["asv_score_path"],
+                                             output_file=model_tag / "t-DCF_EER.txt")
     f_log = open(model_tag / "metric_log.txt", "a")
     f_log.write("=" * 5 + "\n")
+    f_log.write("EER: {:.3f}, min t-DCF: {:.5f}".format(eval_eer, eval_tdcf))
+    run_time = time.perf_counter() - run_start
+    f_log.write("\nend-to-end wall time: {:.1f}s\n".format(run_time))
+    f_log.write("checkpoint stall: {:.1f}s\n".format(
+        checkpointer.total_stall))
+    f_log.close()
 
-    # make directory for metric logging
-    metric_path = model_tag / "metrics"
-    os.makedirs(metric_path, exist_ok=True)
+    torch.save(eval_model.state_dict(),
+               model_save_path / "swa.pth")
 
-    # Training
-    for epoch in range(config["num_epochs"]):
-        print("Start training epoch{:03d}".format(epoch))
-        running_loss = train_epoch(trn_loader, model, optimizer, device,
-                                   scheduler, config)
-        produce_evaluation_file(dev_loader, model, device,
-                                metric_path/"dev_score.txt", dev_trial_path)
+    if eval_eer <= best_eval_eer:
+        best_eval_eer = eval_eer
+    if eval_tdcf <= best_eval_tdcf:
+        best_eval_tdcf = eval_tdcf
+        torch.save(eval_model.state_dict(),
+                   model_save_path / "best.pth")
+    print("Exp FIN. EER: {:.3f}, min t-DCF: {:.5f}".format(
+        best_eval_eer, best_eval_tdcf))
+    print("End-to-end wall time: {:.1f}s".format(run_time))
+
+
+class EpochEvaluator:
+    """Dev / eval scoring and best-model selection after every epoch
+
+    Used inside the training loop, or in a separate process with
+    --async_eval (see async_evaluator).
+    """
+    def __init__(self, config: dict, database_path: Path, model_tag: Path,
+                 dev_loader: DataLoader, eval_loader: DataLoader,
+                 dev_trial_path: Path, eval_trial_path: Path,
+                 device: torch.device, writer: SummaryWriter, f_log,
+                 profiler: StepProfiler = None):
+        self.config = config
+        self.asv_score_path = database_path / config["asv_score_path"]
+        self.model_save_path = model_tag / "weights"
+        self.eval_score_path = model_tag / config["eval_output"]
+        self.metric_path = model_tag / "metrics"
+        self.dev_loader = dev_loader
+        self.eval_loader = eval_loader
+        self.dev_trial_path = dev_trial_path
+        self.eval_trial_path = eval_trial_path
+        self.device = device
+        self.writer = writer
+        self.f_log = f_log
+        self.profiler = profiler
+
+        self.best_dev_eer = 1.
+        self.best_eval_eer = 100.
+        self.best_dev_tdcf = 0.05
+        self.best_eval_tdcf = 1.
+
+        # make directory for metric logging
+        os.makedirs(self.metric_path, exist_ok=True)
+
+    def state_dict(self) -> Dict:
+        return {
+            "best_dev_eer": self.best_dev_eer,
+            "best_eval_eer": self.best_eval_eer,
+            "best_dev_tdcf": self.best_dev_tdcf,
+            "best_eval_tdcf": self.best_eval_tdcf,
+        }
+
+    def load_state_dict(self, state: Dict) -> None:
+        self.best_dev_eer = state["best_dev_eer"]
+        self.best_eval_eer = state["best_eval_eer"]
+        self.best_dev_tdcf = state["best_dev_tdcf"]
+        self.best_eval_tdcf = state["best_eval_tdcf"]
+
+    def log_epoch_time(self, epoch: int, epoch_time: float) -> None:
+        print("Epoch{:03d} training wall time: {:.1f}s".format(
+            epoch, epoch_time))
+        self.writer.add_scalar("epoch_time", epoch_time, epoch)
+        self.f_log.write("epoch{:03d}, train wall time {:.1f}s\n".format(
+            epoch, epoch_time))
+
+    def evaluate(self, model, epoch: int, running_loss: float) -> bool:
+        """Score the dev set; returns True when this is the best epoch so far"""
+        produce_evaluation_file(self.dev_loader, model, self.device,
+                                self.metric_path/"dev_score.txt",
+                                self.dev_trial_path, self.profiler)
+        if self.profiler is not None:
+            self.profiler.report(epoch, self.writer)
         dev_eer, dev_tdcf = calculate_tDCF_EER(
-            cm_scores_file=metric_path/"dev_score.txt",
-            asv_score_file=database_path/config["asv_score_path"],
-            output_file=metric_path/"dev_t-DCF_EER_{}epo.txt".format(epoch),
+            cm_scores_file=self.metric_path/"dev_score.txt",
+            asv_score_file=self.asv_score_path,
+            output_file=self.metric_path/"dev_t-DCF_EER_{}epo.txt".format(
+                epoch),
             printout=False)
         print("DONE.\nLoss:{:.5f}, dev_eer: {:.3f}, dev_tdcf:{:.5f}".format(
             running_loss, dev_eer, dev_tdcf))
-        writer.add_scalar("loss", running_loss, epoch)
-        writer.add_scalar("dev_eer", dev_eer, epoch)
-        writer.add_scalar("dev_tdcf", dev_tdcf, epoch)
+        self.writer.add_scalar("loss", running_loss, epoch)
+        self.writer.add_scalar("dev_eer", dev_eer, epoch)
+        self.writer.add_scalar("dev_tdcf", dev_tdcf, epoch)
 
-        best_dev_tdcf = min(dev_tdcf, best_dev_tdcf)
-        if best_dev_eer >= dev_eer:
+        self.best_dev_tdcf = min(dev_tdcf, self.best_dev_tdcf)
+        is_best = self.best_dev_eer >= dev_eer
+        if is_best:
             print("best model find at epoch", epoch)
-            best_dev_eer = dev_eer
+            self.best_dev_eer = dev_eer
             torch.save(model.state_dict(),
-                       model_save_path / "epoch_{}_{:03.3f}.pth".format(epoch, dev_eer))
+                       self.model_save_path / "epoch_{}_{:03.3f}.pth".format(epoch, dev_eer))
 
             # do evaluation whenever best model is renewed
-            if str_to_bool(config["eval_all_best"]):
-                produce_evaluation_file(eval_loader, model, device,
-                                        eval_score_path, eval_trial_path)
+            if str_to_bool(self.config["eval_all_best"]):
+                produce_evaluation_file(self.eval_loader, model, self.device,
+                                        self.eval_score_path,
+                                        self.eval_trial_path)
                 eval_eer, eval_tdcf = calculate_tDCF_EER(
-                    cm_scores_file=eval_score_path,
-                    asv_score_file=database_path / config["asv_score_path"],
-                    output_file=metric_path /
+                    cm_scores_file=self.eval_score_path,
+                    asv_score_file=self.asv_score_path,
+                    output_file=self.metric_path /
                     "t-DCF_EER_{:03d}epo.txt".format(epoch))
 
                 log_text = "epoch{:03d}, ".format(epoch)
-                if eval_eer < best_eval_eer:
+                if eval_eer < self.best_eval_eer:
                     log_text += "best eer, {:.4f}%".format(eval_eer)
-                    best_eval_eer = eval_eer
-                if eval_tdcf < best_eval_tdcf:
+                    self.best_eval_eer = eval_eer
+                if eval_tdcf < self.best_eval_tdcf:
                     log_text += "best tdcf, {:.4f}".format(eval_tdcf)
-                    best_eval_tdcf = eval_tdcf
+                    self.best_eval_tdcf = eval_tdcf
                     torch.save(model.state_dict(),
-                               model_save_path / "best.pth")
+                               self.model_save_path / "best.pth")
                 if len(log_text) > 0:
                     print(log_text)
-                    f_log.write(log_text + "\n")
+                    self.f_log.write(log_text + "\n")
 
-            print("Saving epoch {} for swa".format(epoch))
-            optimizer_swa.update_swa()
-            n_swa_update += 1
-        writer.add_scalar("best_dev_eer", best_dev_eer, epoch)
-        writer.add_scalar("best_dev_tdcf", best_dev_tdcf, epoch)
+        self.writer.add_scalar("best_dev_eer", self.best_dev_eer, epoch)
+        self.writer.add_scalar("best_dev_tdcf", self.best_dev_tdcf, epoch)
+        return is_best
 
-    print("Start final evaluation")
-    epoch += 1
-    if n_swa_update > 0:
-        optimizer_swa.swap_swa_sgd()
-        optimizer_swa.bn_update(trn_loader, model, device=device)
-    produce_evaluation_file(eval_loader, model, device, eval_score_path,
-                            eval_trial_path)
-    eval_eer, eval_tdcf = calculate_tDCF_EER(cm_scores_file=eval_score_path,
-                                             asv_score_file=database_path /
-                                             config["asv_score_path"],
-                                             output_file=model_tag / "t-DCF_EER.txt")
+
+def async_evaluator(args: argparse.Namespace, config: dict, model_tag: Path,
+                    database_path: Path, dev_trial_path: Path,
+                    eval_trial_path: Path, tasks, results,
+                    evaluator_state: Dict = None) -> None:
+    """Evaluator process: scores epoch snapshots taken from tasks in order
+
+    Puts ("epoch", epoch, is_best, snapshot_path, best metrics) on results
+    for every snapshot and ("done", best metrics) once tasks yields None.
+    Snapshots that are not a new best are deleted.
+    """
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    if args.eval_threads:
+        torch.set_num_threads(args.eval_threads)
+    model = get_model(config["model_config"], device)
+    _, dev_loader, eval_loader = get_loader(database_path, args.seed, config)
+
+    writer = SummaryWriter(model_tag)
     f_log = open(model_tag / "metric_log.txt", "a")
     f_log.write("=" * 5 + "\n")
-    f_log.write("EER: {:.3f}, min t-DCF: {:.5f}".format(eval_eer, eval_tdcf))
+    evaluator = EpochEvaluator(config, database_path, model_tag, dev_loader,
+                               eval_loader, dev_trial_path, eval_trial_path,
+                               device, writer, f_log,
+                               make_profiler(args, "dev", device, model_tag))
+    if evaluator_state is not None:
+        evaluator.load_state_dict(evaluator_state)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        epoch, snapshot_path, running_loss, epoch_time = task
+        model.load_state_dict(torch.load(snapshot_path, map_location=device))
+        evaluator.log_epoch_time(epoch, epoch_time)
+        is_best = evaluator.evaluate(model, epoch, running_loss)
+        if not is_best:
+            os.remove(snapshot_path)
+        f_log.flush()
+        writer.flush()
+        results.put(("epoch", epoch, is_best, snapshot_path,
+                     evaluator.state_dict()))
+
     f_log.close()
+    writer.close()
+    results.put(("done", evaluator.state_dict()))
 
-    torch.save(model.state_dict(),
-               model_save_path / "swa.pth")
 
-    if eval_eer <= best_eval_eer:
-        best_eval_eer = eval_eer
-    if eval_tdcf <= best_eval_tdcf:
-        best_eval_tdcf = eval_tdcf
-        torch.save(model.state_dict(),
-                   model_save_path / "best.pth")
-    print("Exp FIN. EER: {:.3f}, min t-DCF: {:.5f}".format(
-        best_eval_eer, best_eval_tdcf))
+def load_snapshot_average(model, snapshot_paths: List[Path],
+                          device: torch.device) -> None:
+    """Load the SWA average of the snapshots' parameters into model
+
+    Uses the same running mean as torchcontrib's SWA.update_swa so the
+    result matches averaging during training; buffers are left as they are
+    (bn_update re-estimates them).
+    """
+    params = dict(model.named_parameters())
+    average = {}
+    for n_avg, snapshot_path in enumerate(snapshot_paths):
+        state = torch.load(snapshot_path, map_location=device)
+        for name in params:
+            if n_avg == 0:
+                average[name] = state[name].clone()
+            else:
+                average[name] += (state[name] - average[name]) / (n_avg + 1)
+    with torch.no_grad():
+        for name, param in params.items():
+            param.copy_(average[name])
 
 
 def get_model(model_config: Dict, device: torch.device):
@@ -220,11 +601,35 @@ def get_model(model_config: Dict, device: torch.device):
     return model
 
 
+def get_loader_kwargs(config: dict) -> Dict:
+    """DataLoader worker options from the config
+
+    "num_workers" (default 0), "persistent_workers" (default "True") and
+    "prefetch_factor" (default 2); the latter two only apply with workers.
+    """
+    num_workers = int(config.get("num_workers", 0))
+    if num_workers == 0:
+        return {"num_workers": 0}
+    return {
+        "num_workers": num_workers,
+        "persistent_workers": str_to_bool(
+            config.get("persistent_workers", "True")),
+        "prefetch_factor": int(config.get("prefetch_factor", 2)),
+    }
+
+
 def get_loader(
         database_path: str,
         seed: int,
-        config: dict) -> List[torch.utils.data.DataLoader]:
-    """Make PyTorch DataLoaders for train / developement / evaluation"""
+        config: dict,
+        rank: int = 0,
+        world_size: int = 1) -> List[torch.utils.data.DataLoader]:
+    """Make PyTorch DataLoaders for train / developement / evaluation
+
+    With world_size > 1 the training set is split across ranks by a
+    DistributedSampler and "batch_size" is the global batch size; dev and
+    eval loaders stay whole because only rank 0 scores them.
+    """
     track = config["track"]
     prefix_2019 = "ASVspoof2019.{}".format(track)
 
@@ -248,42 +653,76 @@ def get_loader(
                                             is_eval=False)
     print("no. training files:", len(file_train))
 
-    train_set = Dataset_ASVspoof2019_train(list_IDs=file_train,
-                                           labels=d_label_trn,
-                                           base_dir=trn_database_path)
+    # pre-decoded waveform shards (see prepare_shards.py) replace per-item
+    # FLAC decoding when "shard_dir" is set
+    shard_dir = config.get("shard_dir")
+    if shard_dir:
+        train_set = Dataset_ASVspoof2019_train_shards(
+            list_IDs=file_train,
+            labels=d_label_trn,
+            shards=WaveformShards(shard_dir, "train"))
+    else:
+        train_set = Dataset_ASVspoof2019_train(list_IDs=file_train,
+                                               labels=d_label_trn,
+                                               base_dir=trn_database_path)
+    loader_kwargs = get_loader_kwargs(config)
     gen = torch.Generator()
     gen.manual_seed(seed)
+    trn_sampler = None
+    trn_batch_size = config["batch_size"]
+    if world_size > 1:
+        assert trn_batch_size % world_size == 0, \
+            "batch_size must be divisible by the number of processes"
+        trn_batch_size //= world_size
+        trn_sampler = DistributedSampler(train_set,
+                                         num_replicas=world_size,
+                                         rank=rank,
+                                         shuffle=True,
+                                         seed=seed,
+                                         drop_last=True)
     trn_loader = DataLoader(train_set,
-                            batch_size=config["batch_size"],
-                            shuffle=True,
+                            batch_size=trn_batch_size,
+                            shuffle=trn_sampler is None,
+                            sampler=trn_sampler,
                             drop_last=True,
                             pin_memory=True,
                             worker_init_fn=seed_worker,
-                            generator=gen)
+                            generator=gen,
+                            **loader_kwargs)
 
     _, file_dev = genSpoof_list(dir_meta=dev_trial_path,
                                 is_train=False,
                                 is_eval=False)
     print("no. validation files:", len(file_dev))
 
-    dev_set = Dataset_ASVspoof2019_devNeval(list_IDs=file_dev,
-                                            base_dir=dev_database_path)
+    if shard_dir:
+        dev_set = Dataset_ASVspoof2019_devNeval_shards(
+            list_IDs=file_dev, shards=WaveformShards(shard_dir, "dev"))
+    else:
+        dev_set = Dataset_ASVspoof2019_devNeval(list_IDs=file_dev,
+                                                base_dir=dev_database_path)
     dev_loader = DataLoader(dev_set,
                             batch_size=config["batch_size"],
                             shuffle=False,
                             drop_last=False,
-                            pin_memory=True)
+                            pin_memory=True,
+                            **loader_kwargs)
 
     file_eval = genSpoof_list(dir_meta=eval_trial_path,
                               is_train=False,
                               is_eval=True)
-    eval_set = Dataset_ASVspoof2019_devNeval(list_IDs=file_eval,
-                                             base_dir=eval_database_path)
+    if shard_dir:
+        eval_set = Dataset_ASVspoof2019_devNeval_shards(
+            list_IDs=file_eval, shards=WaveformShards(shard_dir, "eval"))
+    else:
+        eval_set = Dataset_ASVspoof2019_devNeval(list_IDs=file_eval,
+                                                 base_dir=eval_database_path)
     eval_loader = DataLoader(eval_set,
                              batch_size=config["batch_size"],
                              shuffle=False,
                              drop_last=False,
-                             pin_memory=True)
+                             pin_memory=True,
+                             **loader_kwargs)
 
     return trn_loader, dev_loader, eval_loader
 
@@ -293,17 +732,23 @@ def produce_evaluation_file(
     model,
     device: torch.device,
     save_path: str,
-    trial_path: str) -> None:
+    trial_path: str,
+    profiler: StepProfiler = None) -> None:
     """Perform evaluation and save the score to a file"""
+    phase = profiler.phase if profiler is not None else nullcontext
+    if profiler is not None:
+        data_loader = profiler.iterate(data_loader)
     model.eval()
     with open(trial_path, "r") as f_trl:
         trial_lines = f_trl.readlines()
     fname_list = []
     score_list = []
     for batch_x, utt_id in data_loader:
-        batch_x = batch_x.to(device)
-        with torch.no_grad():
+        with phase("h2d_copy"):
+            batch_x = batch_x.to(device)
+        with torch.no_grad(), phase("forward"):
             _, batch_out = model(batch_x)
+        with phase("score_copy"):
             batch_score = (batch_out[:, 1]).data.cpu().numpy().ravel()
         # add outputs
         fname_list.extend(utt_id)
@@ -324,8 +769,12 @@ def train_epoch(
     optim: Union[torch.optim.SGD, torch.optim.Adam],
     device: torch.device,
     scheduler: torch.optim.lr_scheduler,
-    config: argparse.Namespace):
+    config: argparse.Namespace,
+    profiler: StepProfiler = None):
     """Train the model for one epoch"""
+    phase = profiler.phase if profiler is not None else nullcontext
+    if profiler is not None:
+        trn_loader = profiler.iterate(trn_loader)
     running_loss = 0
     num_total = 0.0
     ii = 0
@@ -338,14 +787,18 @@ def train_epoch(
         batch_size = batch_x.size(0)
         num_total += batch_size
         ii += 1
-        batch_x = batch_x.to(device)
-        batch_y = batch_y.view(-1).type(torch.int64).to(device)
-        _, batch_out = model(batch_x, Freq_aug=str_to_bool(config["freq_aug"]))
-        batch_loss = criterion(batch_out, batch_y)
-        running_loss += batch_loss.item() * batch_size
-        optim.zero_grad()
-        batch_loss.backward()
-        optim.step()
+        with phase("h2d_copy"):
+            batch_x = batch_x.to(device)
+            batch_y = batch_y.view(-1).type(torch.int64).to(device)
+        with phase("forward_backward"):
+            _, batch_out = model(batch_x,
+                                 Freq_aug=str_to_bool(config["freq_aug"]))
+            batch_loss = criterion(batch_out, batch_y)
+            optim.zero_grad()
+            batch_loss.backward()
+            optim.step()
+        with phase("loss_sync"):
+            running_loss += batch_loss.item() * batch_size
 
         if config["optim_config"]["scheduler"] in ["cosine", "keras_decay"]:
             scheduler.step()
@@ -354,6 +807,12 @@ def train_epoch(
         else:
             raise ValueError("scheduler error, got:{}".format(scheduler))
 
+    if dist.is_available() and dist.is_initialized():
+        # average the loss over every rank's samples
+        totals = torch.tensor([running_loss, num_total], dtype=torch.float64)
+        dist.all_reduce(totals)
+        running_loss, num_total = totals.tolist()
+
     running_loss /= num_total
     return running_loss
 
@@ -384,6 +843,40 @@ if __name__ == "__main__":
                         type=str,
                         default=None,
                         help="comment to describe the saved model")
+    parser.add_argument("--nproc",
+                        type=int,
+                        default=1,
+                        help="number of local DistributedDataParallel "
+                        "processes (gloo backend, CPU) (default: 1)")
+    parser.add_argument("--master_port",
+                        type=int,
+                        default=29500,
+                        help="TCP port for DDP rendezvous (default: 29500)")
+    parser.add_argument("--cpu",
+                        action="store_true",
+                        help="allow single-process training on CPU")
+    parser.add_argument("--async_eval",
+                        action="store_true",
+                        help="score dev / eval sets in a background "
+                        "evaluator process instead of blocking training")
+    parser.add_argument("--eval_threads",
+                        type=int,
+                        default=0,
+                        help="torch threads for the background evaluator "
+                        "(default: torch's default)")
+    parser.add_argument("--profile",
+                        action="store_true",
+                        help="time data wait / compute per step in training "
+                        "and dev scoring and print a summary every epoch")
+    parser.add_argument("--profile_trace_steps",
+                        type=int,
+                        default=0,
+                        help="with --profile, also record this many steps "
+                        "of the first epoch with torch.profiler (default: 0)")
+    parser.add_argument("--resume",
+                        action="store_true",
+                        help="continue training from the last full-state "
+                        "checkpoint (weights/checkpoint.pth)")
     parser.add_argument("--eval_model_weights",
                         type=str,
                         default=None,
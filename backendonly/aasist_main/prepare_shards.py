@@ -0,0 +1,106 @@
+"""
+One-time decoding of the ASVspoof 2019 protocol lists into memory-mapped
+waveform shards, so training does not run sf.read on every utterance in
+every epoch.
+
+    python prepare_shards.py --config ./config/AASIST.conf --shard_dir ./shards
+
+Then set "shard_dir" in the config file to use them in main.py.
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from data_utils import genSpoof_list
+
+
+def write_split(keys, flac_dir, shard_dir: Path, split: str, dtype: str,
+                shard_size_mb: int) -> None:
+    """Decode every key of one split into shards plus an offset index"""
+    itemsize = np.dtype(dtype).itemsize
+    max_samples = shard_size_mb * 1024 * 1024 // itemsize
+
+    shard_files, shard_ids, offsets, lengths = [], [], [], []
+    fh = None
+    offset = 0
+    for key in keys:
+        X, _ = sf.read(str(flac_dir / f"{key}.flac"), dtype=dtype)
+        if fh is None or offset + len(X) > max_samples:
+            if fh is not None:
+                fh.close()
+            shard_files.append(f"{split}.{len(shard_files):03d}.{dtype}")
+            fh = open(shard_dir / shard_files[-1], "wb")
+            offset = 0
+        fh.write(np.ascontiguousarray(X).tobytes())
+        shard_ids.append(len(shard_files) - 1)
+        offsets.append(offset)
+        lengths.append(len(X))
+        offset += len(X)
+    if fh is not None:
+        fh.close()
+
+    np.savez(shard_dir / f"{split}.index.npz",
+             keys=np.array(keys),
+             shard=np.array(shard_ids, dtype=np.int32),
+             offset=np.array(offsets, dtype=np.int64),
+             length=np.array(lengths, dtype=np.int64),
+             shard_files=np.array(shard_files),
+             dtype=np.array(dtype))
+    print("{}: {} utterances in {} shard(s)".format(split, len(keys),
+                                                    len(shard_files)))
+
+
+def main(args: argparse.Namespace) -> None:
+    with open(args.config, "r") as f_json:
+        config = json.loads(f_json.read())
+    track = config["track"]
+    prefix_2019 = "ASVspoof2019.{}".format(track)
+    database_path = Path(config["database_path"])
+    protocol_dir = database_path / "ASVspoof2019_{}_cm_protocols".format(track)
+
+    shard_dir = Path(args.shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+
+    _, file_train = genSpoof_list(
+        dir_meta=protocol_dir / "{}.cm.train.trn.txt".format(prefix_2019),
+        is_train=True, is_eval=False)
+    _, file_dev = genSpoof_list(
+        dir_meta=protocol_dir / "{}.cm.dev.trl.txt".format(prefix_2019),
+        is_train=False, is_eval=False)
+    file_eval = genSpoof_list(
+        dir_meta=protocol_dir / "{}.cm.eval.trl.txt".format(prefix_2019),
+        is_train=False, is_eval=True)
+
+    for split, keys in (("train", file_train), ("dev", file_dev),
+                        ("eval", file_eval)):
+        flac_dir = database_path / "ASVspoof2019_{}_{}/flac".format(
+            track, split)
+        write_split(keys, flac_dir, shard_dir, split, args.dtype,
+                    args.shard_size_mb)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pre-decode ASVspoof 2019 audio into memory-mapped shards")
+    parser.add_argument("--config",
+                        type=str,
+                        required=True,
+                        help="configuration file (for database_path/track)")
+    parser.add_argument("--shard_dir",
+                        type=str,
+                        required=True,
+                        help="output directory for shards and indexes")
+    parser.add_argument("--dtype",
+                        type=str,
+                        choices=["int16", "float32"],
+                        default="int16",
+                        help="storage type; int16 halves the size losslessly "
+                        "for 16-bit FLAC (default: int16)")
+    parser.add_argument("--shard_size_mb",
+                        type=int,
+                        default=2048,
+                        help="maximum size of one shard file (default: 2048)")
+    main(parser.parse_args())
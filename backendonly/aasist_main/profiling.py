@@ -0,0 +1,156 @@
+"""
+Opt-in per-step timing for the training and scoring loops (--profile).
+
+StepProfiler.iterate wraps a DataLoader and splits every step into the time
+spent waiting for the next batch (decoding / collation) and the time spent
+on the batch; phase() breaks the latter down further (host-to-device copy,
+forward/backward, loss sync). On CUDA each phase ends with a synchronize so
+asynchronous kernels are charged to the phase that launched them.
+"""
+import resource
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+import torch
+
+
+class StepProfiler:
+    """Per-epoch step timings, samples/s and peak memory of one loop
+
+    With trace_steps > 0, steps trace_skip .. trace_skip + trace_steps of the
+    first profiled epoch are also recorded with torch.profiler and written
+    to trace_dir (viewable in TensorBoard's profiler plugin).
+    """
+    def __init__(self, name: str, device, trace_steps: int = 0,
+                 trace_skip: int = 5, trace_dir: Path = None):
+        self.name = name
+        self.cuda = torch.device(device).type == "cuda"
+        self.trace_steps = trace_steps
+        self.trace_skip = trace_skip
+        self.trace_dir = trace_dir
+        self.traced = False
+        self.reset()
+
+    def reset(self) -> None:
+        self.times = {"data_wait": [], "compute": []}
+        self.phases = {}
+        self.samples = 0
+        self.elapsed = 0.
+        if self.cuda:
+            torch.cuda.reset_peak_memory_stats()
+
+    def _sync(self) -> None:
+        if self.cuda:
+            torch.cuda.synchronize()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        yield name
+        self._sync()
+        self.phases.setdefault(name, []).append(time.perf_counter() - start)
+
+    def iterate(self, loader: Iterable):
+        """Yield loader's batches, timing the wait for and the work on each"""
+        self.reset()
+        trace = None
+        if self.trace_steps > 0 and not self.traced:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.cuda:
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            trace = torch.profiler.profile(
+                activities=activities,
+                schedule=torch.profiler.schedule(wait=self.trace_skip,
+                                                 warmup=1,
+                                                 active=self.trace_steps,
+                                                 repeat=1),
+                on_trace_ready=torch.profiler.tensorboard_trace_handler(
+                    str(self.trace_dir)),
+                record_shapes=True,
+                profile_memory=True)
+            trace.start()
+            self.traced = True
+
+        epoch_start = time.perf_counter()
+        wait_start = epoch_start
+        try:
+            for batch in loader:
+                step_start = time.perf_counter()
+                self.times["data_wait"].append(step_start - wait_start)
+                yield batch
+                self._sync()
+                wait_start = time.perf_counter()
+                self.times["compute"].append(wait_start - step_start)
+                self.samples += len(batch[0])
+                if trace is not None:
+                    trace.step()
+        finally:
+            if trace is not None:
+                trace.stop()
+            self.elapsed = time.perf_counter() - epoch_start
+
+    def peak_memory_mb(self) -> float:
+        if self.cuda:
+            return torch.cuda.max_memory_allocated() / 2**20
+        # ru_maxrss is in KiB on Linux; this is the process high-water mark
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+
+    def summary(self) -> Dict:
+        rows = {}
+        for name, values in list(self.times.items()) + list(
+                self.phases.items()):
+            values = np.asarray(values) * 1000
+            rows[name] = {
+                "total_s": values.sum() / 1000,
+                "mean_ms": values.mean() if len(values) else 0.,
+                "p50_ms": np.percentile(values, 50) if len(values) else 0.,
+                "p95_ms": np.percentile(values, 95) if len(values) else 0.,
+            }
+        return {
+            "steps": len(self.times["compute"]),
+            "samples_per_sec": self.samples / max(self.elapsed, 1e-9),
+            "peak_memory_mb": self.peak_memory_mb(),
+            "elapsed_s": self.elapsed,
+            "rows": rows,
+        }
+
+    def format_table(self, epoch: int, summary: Dict) -> List[str]:
+        lines = [
+            "[{}] epoch {:03d}: {} steps, {:.1f} samples/s, "
+            "peak memory {:.0f} MB".format(self.name, epoch,
+                                           summary["steps"],
+                                           summary["samples_per_sec"],
+                                           summary["peak_memory_mb"]),
+            "{:<18}{:>10}{:>10}{:>10}{:>10}{:>8}".format(
+                "", "total s", "mean ms", "p50 ms", "p95 ms", "share"),
+        ]
+        for name, row in summary["rows"].items():
+            lines.append("{:<18}{:>10.2f}{:>10.2f}{:>10.2f}{:>10.2f}"
+                         "{:>7.1f}%".format(
+                             name, row["total_s"], row["mean_ms"],
+                             row["p50_ms"], row["p95_ms"],
+                             100 * row["total_s"] /
+                             max(summary["elapsed_s"], 1e-9)))
+        return lines
+
+    def report(self, epoch: int, writer=None) -> Dict:
+        """Print the epoch's summary table and log it to TensorBoard"""
+        summary = self.summary()
+        lines = self.format_table(epoch, summary)
+        print("\n".join(lines))
+        if writer is not None:
+            tag = "profile/{}/".format(self.name)
+            writer.add_scalar(tag + "samples_per_sec",
+                              summary["samples_per_sec"], epoch)
+            writer.add_scalar(tag + "peak_memory_mb",
+                              summary["peak_memory_mb"], epoch)
+            for name, row in summary["rows"].items():
+                writer.add_scalar(tag + name + "_mean_ms", row["mean_ms"],
+                                  epoch)
+            # four leading spaces render the table as preformatted markdown
+            writer.add_text(tag + "summary",
+                            "\n".join("    " + line for line in lines), epoch)
+        return summary
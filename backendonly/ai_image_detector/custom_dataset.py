@@ -1,14 +1,22 @@
 # custom_dataset.py
 
 from torchvision import datasets, transforms
+from torch.utils.data import Dataset
+from PIL import Image
+import numpy as np
+import torch
 import shutil
 import os
 
+IMAGE_SIZE = 200
+MEAN = [0.485, 0.456, 0.406]
+STD = [0.229, 0.224, 0.225]
+
 def get_transform():
     transform = transforms.Compose([
-        transforms.Resize((200, 200)),
+        transforms.Resize((IMAGE_SIZE, IMAGE_SIZE)),
         transforms.ToTensor(),
-        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+        transforms.Normalize(mean=MEAN, std=STD),
     ])
     return transform
 
@@ -27,4 +35,182 @@ def get_dataset(data_dir):
 
     transform = get_transform()
     dataset = datasets.ImageFolder(root=data_dir, transform=transform, is_valid_file=is_valid_file)
-    return dataset
\ No newline at end of file
+    return dataset
+
+
+# Pre-resized uint8 cache
+#
+# build_cache decodes and resizes every image of an ImageFolder tree once and
+# appends it as a 200x200x3 uint8 row to a raw shard file; index.npz maps the
+# relative path of each image to (shard, row, label, mtime). Rebuilding only
+# decodes files that are new or whose mtime changed; rows of changed or
+# deleted files go stale, and a shard whose live fraction falls below
+# COMPACT_BELOW has its live rows copied into the new shard and is deleted,
+# so the cache stays close to the size of the dataset. CachedImageDataset serves
+# the rows as uint8 tensors and normalize_batch applies ToTensor + Normalize
+# to a whole batch at once on the consumer side. The resize is the same PIL
+# bilinear resize transforms.Resize performs, so the normalized batches equal
+# what get_transform produces.
+
+ROW_SHAPE = (IMAGE_SIZE, IMAGE_SIZE, 3)
+ROW_BYTES = IMAGE_SIZE * IMAGE_SIZE * 3
+COMPACT_BELOW = 0.5
+
+
+def scan_image_folder(data_dir):
+    """(classes, [(relative path, label)]) in ImageFolder order"""
+    classes = sorted(entry.name for entry in os.scandir(data_dir)
+                     if entry.is_dir() and entry.name != '.ipynb_checkpoints')
+    samples = []
+    for label, class_name in enumerate(classes):
+        class_dir = os.path.join(data_dir, class_name)
+        for root, _, fnames in sorted(os.walk(class_dir, followlinks=True)):
+            for fname in sorted(fnames):
+                if is_valid_file(fname):
+                    path = os.path.join(root, fname)
+                    samples.append((os.path.relpath(path, data_dir), label))
+    return classes, samples
+
+
+def load_resized(path):
+    image = Image.open(path).convert('RGB')
+    return np.asarray(image.resize((IMAGE_SIZE, IMAGE_SIZE), Image.BILINEAR), dtype=np.uint8)
+
+
+def build_cache(data_dir, cache_dir):
+    """Create or incrementally update the uint8 cache of data_dir"""
+    os.makedirs(cache_dir, exist_ok=True)
+    index_path = os.path.join(cache_dir, 'index.npz')
+    classes, samples = scan_image_folder(data_dir)
+
+    known = {}
+    shard_files = []
+    if os.path.exists(index_path):
+        index = np.load(index_path)
+        # labels are positions in the class list, so a new class means a rebuild
+        if [str(c) for c in index['classes']] == classes:
+            shard_files = [str(name) for name in index['shard_files']]
+            known = {
+                str(path): (int(shard), int(row), float(mtime))
+                for path, shard, row, mtime in zip(
+                    index['paths'], index['shard'], index['row'], index['mtime'])
+            }
+
+    plan = []
+    live = [0] * len(shard_files)
+    for path, label in samples:
+        mtime = os.path.getmtime(os.path.join(data_dir, path))
+        cached = known.get(path)
+        if cached is not None and cached[2] != mtime:
+            cached = None
+        if cached is not None:
+            live[cached[0]] += 1
+        plan.append((path, label, mtime, cached))
+    compact = {
+        shard for shard, name in enumerate(shard_files)
+        if live[shard] < COMPACT_BELOW * (os.path.getsize(os.path.join(cache_dir, name)) // ROW_BYTES)
+    }
+    kept = [shard for shard in range(len(shard_files)) if shard not in compact]
+    renumber = {shard: i for i, shard in enumerate(kept)}
+    sparse = {
+        shard: np.memmap(os.path.join(cache_dir, shard_files[shard]), dtype=np.uint8, mode='r').reshape(-1, ROW_BYTES)
+        for shard in compact
+    }
+
+    entries = []
+    new_rows = decoded = 0
+    # Numbered past every current shard, so it never overwrites one
+    number = max((int(name[len('shard_'):-len('.u8')]) for name in shard_files), default=-1) + 1
+    shard_name = f'shard_{number:03d}.u8'
+    with open(os.path.join(cache_dir, shard_name), 'wb') as fh:
+        for path, label, mtime, cached in plan:
+            if cached is not None and cached[0] not in compact:
+                entries.append((path, renumber[cached[0]], cached[1], label, mtime))
+                continue
+            if cached is not None:
+                fh.write(sparse[cached[0]][cached[1]].tobytes())
+            else:
+                fh.write(load_resized(os.path.join(data_dir, path)).tobytes())
+                decoded += 1
+            entries.append((path, len(kept), new_rows, label, mtime))
+            new_rows += 1
+    del sparse
+    shard_files = [shard_files[shard] for shard in kept]
+    if new_rows:
+        shard_files.append(shard_name)
+    else:
+        os.remove(os.path.join(cache_dir, shard_name))
+
+    np.savez(index_path,
+             paths=np.array([e[0] for e in entries]),
+             shard=np.array([e[1] for e in entries], dtype=np.int32),
+             row=np.array([e[2] for e in entries], dtype=np.int64),
+             label=np.array([e[3] for e in entries], dtype=np.int64),
+             mtime=np.array([e[4] for e in entries], dtype=np.float64),
+             classes=np.array(classes),
+             shard_files=np.array(shard_files))
+    for name in os.listdir(cache_dir):
+        if name.startswith('shard_') and name not in shard_files:
+            os.remove(os.path.join(cache_dir, name))  # compacted, or left over from a full rebuild
+    print(f"Cached {len(entries)} images ({decoded} newly decoded, "
+          f"{len(compact)} sparse shard(s) compacted) in {cache_dir}")
+    return len(entries), decoded
+
+
+class CachedImageDataset(Dataset):
+    """uint8 (3, 200, 200) images and labels from a build_cache directory
+
+    Shards are memory-mapped lazily so each DataLoader worker maps them
+    itself after it is forked.
+    """
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        index = np.load(os.path.join(cache_dir, 'index.npz'))
+        self.classes = [str(c) for c in index['classes']]
+        self.class_to_idx = {name: i for i, name in enumerate(self.classes)}
+        self.shard_files = [str(name) for name in index['shard_files']]
+        self.paths = [str(p) for p in index['paths']]
+        self.shard = index['shard']
+        self.row = index['row']
+        self.targets = index['label'].tolist()
+        self._maps = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_maps'] = None
+        return state
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        if self._maps is None:
+            self._maps = [
+                np.memmap(os.path.join(self.cache_dir, name), dtype=np.uint8, mode='r').reshape(-1, *ROW_SHAPE)
+                for name in self.shard_files
+            ]
+        image = self._maps[self.shard[idx]][self.row[idx]]
+        return torch.from_numpy(np.array(image)).permute(2, 0, 1), self.targets[idx]
+
+
+def normalize_batch(batch, device=None):
+    """ToTensor + Normalize for a uint8 (N, 3, H, W) batch, as one tensor op"""
+    batch = batch.to(device, non_blocking=True).float().div_(255)
+    mean = torch.tensor(MEAN, device=batch.device).view(1, 3, 1, 1)
+    std = torch.tensor(STD, device=batch.device).view(1, 3, 1, 1)
+    return batch.sub_(mean).div_(std)
+
+
+def get_cached_dataset(cache_dir):
+    return CachedImageDataset(cache_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Build or update the pre-resized uint8 image cache.')
+    parser.add_argument('data_dir', type=str, help='ImageFolder-style dataset directory.')
+    parser.add_argument('cache_dir', type=str, help='Cache directory (created if missing).')
+    args = parser.parse_args()
+    remove_ipynb_checkpoints(args.data_dir)
+    build_cache(args.data_dir, args.cache_dir)
@@ -0,0 +1,166 @@
+# train_head.py
+#
+# Head-only fine-tuning of the CvT-13 detector.
+#
+# The transforms from custom_dataset.get_transform are deterministic, so the
+# 384-d pooled backbone features of a dataset never change while the backbone
+# is frozen. "extract" runs the backbone once and stores them in a
+# memory-mapped array; "train" then fits CustomClassifier on those features
+# (seconds per epoch instead of minutes) and writes a model_epoch_*.pth with
+# the full model state, loadable by ai_image_detector_integration.
+#
+#   python train_head.py extract <data_dir> --features_dir ./features [--weights model/model_epoch_24.pth]
+#   python train_head.py train --features_dir ./features --output_dir ./model --epochs 30
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader
+
+from custom_dataset import build_cache, get_cached_dataset, get_dataset, normalize_batch
+from model import CustomClassifier, get_model
+
+
+def load_backbone_model(device, weights=None):
+    """Full CvT model, optionally initialised from a model_epoch_*.pth"""
+    model = get_model(device)
+    if weights:
+        checkpoint = torch.load(weights, map_location=device)
+        model.load_state_dict(checkpoint['model_state_dict'])
+    return model
+
+
+def extract(args):
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    if args.cache_dir:
+        build_cache(args.data_dir, args.cache_dir)
+        dataset = get_cached_dataset(args.cache_dir)
+    else:
+        dataset = get_dataset(args.data_dir)
+    loader = DataLoader(dataset, batch_size=args.batch_size, shuffle=False,
+                        num_workers=args.num_workers)
+
+    model = load_backbone_model(device, args.weights)
+    # everything up to (and including) the pooled layernorm output
+    model.classifier = nn.Identity()
+    model.eval()
+
+    os.makedirs(args.features_dir, exist_ok=True)
+    features = np.lib.format.open_memmap(
+        os.path.join(args.features_dir, 'features.npy'), mode='w+',
+        dtype=np.float32, shape=(len(dataset), 384))
+    labels = np.empty(len(dataset), dtype=np.int64)
+
+    start = time.perf_counter()
+    offset = 0
+    with torch.no_grad():
+        for images, targets in loader:
+            if args.cache_dir:
+                images = normalize_batch(images, device)
+            pooled = model(images.to(device)).logits.cpu().numpy()
+            features[offset:offset + len(pooled)] = pooled
+            labels[offset:offset + len(pooled)] = targets.numpy()
+            offset += len(pooled)
+    features.flush()
+    np.save(os.path.join(args.features_dir, 'labels.npy'), labels)
+
+    meta = {
+        'num_samples': len(dataset),
+        'class_to_idx': dataset.class_to_idx,
+        'weights': os.path.abspath(args.weights) if args.weights else None,
+    }
+    with open(os.path.join(args.features_dir, 'meta.json'), 'w') as fh:
+        json.dump(meta, fh, indent=2)
+    print(f"Extracted {len(dataset)} features in {time.perf_counter() - start:.1f}s "
+          f"to {args.features_dir} (classes: {dataset.class_to_idx})")
+
+
+def train(args):
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    torch.manual_seed(args.seed)
+    with open(os.path.join(args.features_dir, 'meta.json')) as fh:
+        meta = json.load(fh)
+    features = np.load(os.path.join(args.features_dir, 'features.npy'), mmap_mode='r')
+    labels = np.load(os.path.join(args.features_dir, 'labels.npy'))
+
+    # 384 floats per image: even large datasets fit on the device at once
+    features = torch.from_numpy(np.ascontiguousarray(features)).to(device)
+    labels = torch.from_numpy(labels).to(device)
+
+    order = torch.randperm(len(labels), device=device)
+    num_val = int(len(labels) * args.val_split)
+    val_idx, train_idx = order[:num_val], order[num_val:]
+
+    head = CustomClassifier().to(device)
+    optimizer = torch.optim.AdamW(head.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+    criterion = nn.CrossEntropyLoss()
+
+    for epoch in range(1, args.epochs + 1):
+        start = time.perf_counter()
+        head.train()
+        running_loss = 0.0
+        perm = train_idx[torch.randperm(len(train_idx), device=device)]
+        for i in range(0, len(perm), args.batch_size):
+            batch = perm[i:i + args.batch_size]
+            if len(batch) < 2:  # BatchNorm1d needs more than one sample
+                continue
+            loss = criterion(head(features[batch]), labels[batch])
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * len(batch)
+
+        message = f"Epoch {epoch}: loss {running_loss / max(len(train_idx), 1):.4f}"
+        if num_val:
+            head.eval()
+            with torch.no_grad():
+                predicted = head(features[val_idx]).argmax(1)
+            accuracy = (predicted == labels[val_idx]).float().mean().item()
+            message += f", val accuracy {accuracy * 100:.2f}%"
+        print(f"{message} ({time.perf_counter() - start:.2f}s)")
+
+    # full model state, so existing loaders (load_state_dict on get_model) work unchanged
+    model = load_backbone_model(device, meta['weights'])
+    model.classifier.load_state_dict(head.state_dict())
+    os.makedirs(args.output_dir, exist_ok=True)
+    model_file = os.path.join(args.output_dir, f'model_epoch_{args.epochs}.pth')
+    torch.save({
+        'epoch': args.epochs,
+        'model_state_dict': model.state_dict(),
+        'class_to_idx': meta['class_to_idx'],
+    }, model_file)
+    print(f"Saved {model_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Head-only fine-tuning of the CvT detector on cached features.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    extract_parser = subparsers.add_parser('extract', help='Run the backbone once and cache pooled features.')
+    extract_parser.add_argument('data_dir', type=str, help='ImageFolder-style dataset directory.')
+    extract_parser.add_argument('--features_dir', type=str, required=True, help='Output directory for the feature cache.')
+    extract_parser.add_argument('--weights', type=str, default=None, help='model_epoch_*.pth to take the backbone from. Defaults to the pretrained microsoft/cvt-13.')
+    extract_parser.add_argument('--cache_dir', type=str, default=None, help='Read images through a pre-resized uint8 cache (built or updated on the fly).')
+    extract_parser.add_argument('--batch_size', type=int, default=64)
+    extract_parser.add_argument('--num_workers', type=int, default=4)
+
+    train_parser = subparsers.add_parser('train', help='Fit CustomClassifier on cached features.')
+    train_parser.add_argument('--features_dir', type=str, required=True, help='Directory written by "extract".')
+    train_parser.add_argument('--output_dir', type=str, default='./model', help='Where model_epoch_*.pth is written.')
+    train_parser.add_argument('--epochs', type=int, default=30)
+    train_parser.add_argument('--batch_size', type=int, default=256)
+    train_parser.add_argument('--lr', type=float, default=1e-3)
+    train_parser.add_argument('--weight_decay', type=float, default=1e-4)
+    train_parser.add_argument('--val_split', type=float, default=0.1, help='Fraction of samples held out for accuracy reporting.')
+    train_parser.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args()
+    if args.command == 'extract':
+        extract(args)
+    else:
+        train(args)
@@ -1,15 +1,115 @@
 import sys
+import math
 import torch
 import argparse
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageSequence
 from ai_image_detector.model import get_model
-from ai_image_detector.custom_dataset import get_transform
+from ai_image_detector.custom_dataset import IMAGE_SIZE, get_transform
 import os
 import glob
 
-def predict_single_image(image_path, model, device, transform):
+# label_map = {0: "Authentic", 1: "AI-Generated"}   # flipped logic
+label_map = {0: "AI-Generated", 1: "Authentic"}
+
+# --fast: let the JPEG decoder downscale while decoding (the model sees 200x200)
+FAST_DRAFT_SIZE = (400, 400)
+
+# Pre-resized client payload: raw uint8 RGB, IMAGE_SIZE x IMAGE_SIZE x 3, row-major
+TENSOR_SUFFIX = '.rgb'
+TENSOR_BYTES = IMAGE_SIZE * IMAGE_SIZE * 3
+
+def load_image(image_path, draft_size=None):
+    if image_path.endswith(TENSOR_SUFFIX):
+        with open(image_path, 'rb') as f:
+            data = f.read()
+        if len(data) != TENSOR_BYTES:
+            raise ValueError(f"Tensor payload must be {TENSOR_BYTES} bytes ({IMAGE_SIZE}x{IMAGE_SIZE}x3 uint8), got {len(data)}")
+        return Image.frombytes("RGB", (IMAGE_SIZE, IMAGE_SIZE), data)
+    image = Image.open(image_path)
+    if draft_size is not None:
+        image.draft("RGB", draft_size)
+    return image.convert("RGB")
+
+# --frames: animated GIF/WebP, multi-page TIFF, burst sequences
+MAX_SCANNED_FRAMES = 64  # frames converted and hashed, evenly spaced over the part visited
+MAX_DECODED_FRAMES = 1024  # frames decode in order, so longer animations are only visited this far
+MAX_FRAMES = 16  # distinct frames scored by the model
+FAST_MAX_FRAMES = 4  # with --fast
+DHASH_MIN_DISTANCE = 5  # bits; a frame closer than this to the last kept one is a near-duplicate
+
+def dhash(image, hash_size=8):
+    """Difference hash: signs of the horizontal gradients of a tiny grayscale copy"""
+    pixels = np.asarray(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR), dtype=np.int16)
+    return int.from_bytes(np.packbits(pixels[:, 1:] > pixels[:, :-1]).tobytes(), "big")
+
+def sample_frames(image_path, transform, max_frames=MAX_FRAMES, max_scanned=MAX_SCANNED_FRAMES,
+                  min_distance=DHASH_MIN_DISTANCE, max_decoded=MAX_DECODED_FRAMES):
+    """Transformed distinct frames as [(frame index, tensor)], the file's frame count and the frames visited
+
+    GIF / WebP frames are decoded on top of the previous one, so seeking to a
+    frame decodes every frame before it. The file is therefore walked once,
+    in order, up to the last sampled frame; of the first max_decoded frames
+    only every stride-th one (at most max_scanned) is converted and hashed.
+    A frame within min_distance dHash bits of the last kept one is dropped,
+    so static stretches collapse to one frame. If more than max_frames
+    remain, an evenly spaced subset is scored.
+    """
+    image = Image.open(image_path)
+    total = getattr(image, "n_frames", 1)
+    visited = min(total, max_decoded)
+    stride = max(1, math.ceil(visited / max_scanned))
+    last_sampled = (visited - 1) // stride * stride
+    kept, last_hash = [], None
+    for index, frame in enumerate(ImageSequence.Iterator(image)):
+        if index > last_sampled:
+            break
+        if index % stride:
+            continue
+        frame = frame.convert("RGB")
+        frame_hash = dhash(frame)
+        if last_hash is not None and bin(frame_hash ^ last_hash).count("1") < min_distance:
+            continue
+        # Keep the model input, not the full-resolution frame
+        kept.append((index, transform(frame)))
+        last_hash = frame_hash
+    if len(kept) > max_frames:
+        step = (len(kept) - 1) / max(max_frames - 1, 1)
+        kept = [kept[round(i * step)] for i in range(max_frames)]
+    return kept, total, visited
+
+def predict_frames(image_path, model, device, transform, max_frames=MAX_FRAMES, batch_size=8):
+    """Score sampled frames in batches; returns ([(frame index, label, [p_ai, p_authentic])], frame count, frames visited)"""
     try:
-        image = Image.open(image_path).convert("RGB")
+        frames, total, visited = sample_frames(image_path, transform, max_frames)
+        results = []
+        for start in range(0, len(frames), batch_size):
+            chunk = frames[start:start + batch_size]
+            scores = predict_batch(model, torch.stack([tensor for _, tensor in chunk]), device)
+            results.extend((index, label, probs) for (index, _), (label, probs) in zip(chunk, scores))
+        return results, total, visited
+    except Exception as e:
+        return f"Error: {str(e)}", None, None
+
+def prepare_image(image_path, transform):
+    return transform(load_image(image_path))
+
+def predict_batch(model, batch, device):
+    """Score a batch of transformed images; returns (label, [p_ai, p_authentic]) per image"""
+    model.eval()
+    with torch.no_grad():
+        outputs = model(torch.as_tensor(batch).to(device))
+        _, predicted = outputs.logits.max(1)
+        probabilities = torch.nn.functional.softmax(outputs.logits, dim=1).cpu()
+
+    return [
+        (label_map[index], probs)
+        for index, probs in zip(predicted.tolist(), probabilities.tolist())
+    ]
+
+def predict_single_image(image_path, model, device, transform, draft_size=None):
+    try:
+        image = load_image(image_path, draft_size)
         transformed_image = transform(image).unsqueeze(0).to(device)
 
         model.eval()
@@ -18,20 +118,19 @@ def predict_single_image(image_path, model, device, transform):
             _, predicted = outputs.logits.max(1)
             probabilities = torch.nn.functional.softmax(outputs.logits, dim=1)
 
-        # label_map = {0: "Authentic", 1: "AI-Generated"}   # flipped logic
-        label_map = {0: "AI-Generated", 1: "Authentic"}
         predicted_label = label_map[predicted.item()]
         return predicted_label, probabilities, None
     except Exception as e:
         return f"Error: {str(e)}", None, None
 
-def load_model(model, device, weights_folder='./model'):
+def load_model(model, device, weights_folder='./model', model_file=None):
     try:
         
         weights_folder = os.path.join(os.path.dirname(__file__), 'ai_image_detector', 'model')
 
-        # Directly specify the file path
-        model_file = os.path.join(weights_folder, 'model_epoch_24.pth')
+        # Directly specify the file path (a hot-swap passes its own)
+        if model_file is None:
+            model_file = os.path.join(weights_folder, 'model_epoch_24.pth')
 
         if not os.path.exists(model_file):
             print(model_file)
@@ -74,7 +173,40 @@ def generate_report(image_path, predicted_label, probabilities):
     
     return "\n".join(report)
 
-def main(image_path):
+def generate_frames_report(image_path, frames, total, max_frames, visited=None):
+    """Forensic report for a multi-frame image: aggregate verdict and per-frame scores"""
+    ai_probs = [probs[0] for _, _, probs in frames]
+    mean_ai = sum(ai_probs) / len(ai_probs) * 100
+    peak_index, _, peak_probs = max(frames, key=lambda frame: frame[2][0])
+    flagged = sum(1 for _, label, _ in frames if label == "AI-Generated")
+    predicted_label = "AI-Generated" if mean_ai > 50 else "Authentic"
+
+    report = [
+        "====== AI IMAGE FORENSIC ANALYSIS (MULTI-FRAME) ======\n",
+        f"File: {os.path.basename(image_path)}",
+        f"Frames: {total} in file, {len(frames)} distinct frames scored (cap {max_frames})"
+        + (f", sampled from the first {visited}" if visited is not None and visited < total else ""),
+        f"Prediction: {predicted_label}",
+        "Aggregate Scores:",
+        f"  Mean AI-Generated: {mean_ai:.2f}%",
+        f"  Max AI-Generated: {peak_probs[0] * 100:.2f}% (frame {peak_index})",
+        f"  Frames flagged AI-Generated: {flagged} of {len(frames)}",
+        "",
+        "Per-frame Scores:",
+    ]
+    report.extend(
+        f"  Frame {index}: {label} (AI-Generated {probs[0] * 100:.2f}%, Authentic {probs[1] * 100:.2f}%)"
+        for index, label, probs in frames
+    )
+    report.extend([
+        "",
+        "Conclusion:",
+        f"This image sequence is likely {predicted_label.lower()} based on deep forensic analysis"
+        + (f", although {flagged} frame(s) show synthetic generation patterns." if flagged and predicted_label == "Authentic" else "."),
+    ])
+    return "\n".join(report)
+
+def main(image_path, fast=False, frames=False):
     # Set up device
     device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
     
@@ -89,8 +221,16 @@ def main(image_path):
     # Get image transformations
     transform = get_transform()
     
+    if frames:
+        max_frames = FAST_MAX_FRAMES if fast else MAX_FRAMES
+        results, total, visited = predict_frames(image_path, model, device, transform, max_frames)
+        if isinstance(results, str):
+            return results
+        return generate_frames_report(image_path, results, total, max_frames, visited)
+
     # Make prediction
-    predicted_label, probabilities, _ = predict_single_image(image_path, model, device, transform)
+    draft_size = FAST_DRAFT_SIZE if fast else None
+    predicted_label, probabilities, _ = predict_single_image(image_path, model, device, transform, draft_size)
     
     if predicted_label.startswith("Error"):
         return predicted_label
@@ -101,7 +241,10 @@ def main(image_path):
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='AI Image Forensic Analysis')
     parser.add_argument('image_path', help='Path to image file')
+    parser.add_argument('--fast', action='store_true', help='Decode JPEGs at reduced resolution')
+    parser.add_argument('--frames', action='store_true',
+                        help='Score distinct frames of an animated / multi-page image instead of the first frame')
     args = parser.parse_args()
     
-    result = main(args.image_path)
+    result = main(args.image_path, args.fast, args.frames)
     print(result)
\ No newline at end of file
@@ -0,0 +1,111 @@
+"""
+Rolling-window state for live audio analysis (/api/stream/audio).
+
+PCM frames are appended at the caller's sample rate. Once at least `hop`
+new samples (counted at 16 kHz) have arrived, the newest 64600-sample
+window -- shorter at the start of the stream -- is prepared with
+audio_detector.prepare_waveform, i.e. resampled, normalized,
+silence-trimmed and padded exactly like an uploaded file. If audio
+arrives faster than it is scored, only the newest window is scored and the
+skipped ones are counted, so one stream costs at most one model call per
+hop however far behind it falls. That relies on each feed() getting all
+the audio received since the last one: ReadAhead reads the request body
+on a side thread, so whatever piled up during a model call is taken in
+one go.
+"""
+import queue
+import threading
+
+import numpy as np
+
+SAMPLE_FORMATS = {'s16le': np.dtype('<i2'), 'f32le': np.dtype('<f4')}
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+
+
+class ReadAhead:
+    """Reads a blocking byte stream on a side thread, so the consumer can take all that has arrived"""
+
+    def __init__(self, source, read_size):
+        self.chunks = queue.Queue()
+        self.ended = False
+        self.error = None
+        threading.Thread(target=self._pump, args=(source, read_size), daemon=True).start()
+
+    def _pump(self, source, read_size):
+        try:
+            while True:
+                data = source.read(read_size)
+                if not data:
+                    break
+                self.chunks.put(data)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.chunks.put(None)
+
+    def take(self):
+        """Every byte received since the last call, waiting for at least one; b'' at end of stream"""
+        if self.ended:
+            return b''
+        data = [self.chunks.get()]
+        while data[-1] is not None:
+            try:
+                data.append(self.chunks.get_nowait())
+            except queue.Empty:
+                break
+        if data[-1] is None:
+            data.pop()
+            self.ended = True
+            if self.error is not None and not data:
+                raise self.error
+        return b''.join(data)
+
+
+class AudioStream:
+    def __init__(self, sample_rate, hop, sample_format='s16le', window=64600, expected_sr=16000):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"Sample rate must be between {MIN_SAMPLE_RATE} and {MAX_SAMPLE_RATE} Hz")
+        self.sample_rate = sample_rate
+        self.dtype = SAMPLE_FORMATS[sample_format]
+        # Window and hop in samples at the stream's own rate
+        self.window = int(round(window * sample_rate / expected_sr))
+        self.hop = max(1, int(round(hop * sample_rate / expected_sr)))
+        self.buffer = np.zeros(0, dtype=np.float32)
+        self.pending = b''  # bytes of a sample split across reads
+        self.received = 0  # samples seen so far
+        self.scored_at = 0  # value of received at the last scored window
+        self.windows = 0
+        self.skipped = 0
+
+    def feed(self, data):
+        """Append raw PCM bytes; returns (window samples, end sample) to score, or None"""
+        data = self.pending + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        self.pending = data[usable:]
+        samples = np.frombuffer(data[:usable], dtype=self.dtype).astype(np.float32)
+        if self.dtype.kind == 'i':
+            samples /= 32768.0
+        if not len(samples):
+            return None
+
+        self.received += len(samples)
+        self.buffer = np.concatenate([self.buffer, samples])[-self.window:]
+        new = self.received - self.scored_at
+        if new < self.hop:
+            return None
+        self.skipped += new // self.hop - 1
+        return self._take()
+
+    def flush(self):
+        """Window covering the unscored tail at end of stream, or None"""
+        if self.received > self.scored_at and len(self.buffer):
+            return self._take()
+        return None
+
+    def _take(self):
+        self.scored_at = self.received
+        self.windows += 1
+        return self.buffer.copy(), self.received
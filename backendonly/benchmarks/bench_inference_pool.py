@@ -0,0 +1,84 @@
+"""
+Aggregate inference throughput of the pre-forked pool against worker count
+and threads per worker.
+
+Run from backendonly/ so the detectors find their model files:
+    python benchmarks/bench_inference_pool.py --detector audio --workers 1,2,4,8 --threads 1,2,4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detectors import DETECTORS
+from inference_pool import InferencePool
+
+
+def int_list(value):
+    return [int(v) for v in value.split(',')]
+
+
+def run(detector_name, num_workers, threads_per_worker, num_requests, batch_size):
+    shape = (batch_size, *DETECTORS[detector_name].input_shape)
+    rng = np.random.default_rng(0)
+    batch = rng.standard_normal(shape).astype(np.float32)
+
+    pool = InferencePool([detector_name], num_workers, threads_per_worker)
+    try:
+        # Warm up: every worker loads its model before the clock starts
+        for future in [pool.submit(detector_name, batch) for _ in range(num_workers * 2)]:
+            future.result()
+
+        start = time.perf_counter()
+        futures = [pool.submit(detector_name, batch) for _ in range(num_requests)]
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - start
+    finally:
+        pool.close()
+
+    return {
+        'detector': detector_name,
+        'workers': num_workers,
+        'threads_per_worker': threads_per_worker,
+        'batch_size': batch_size,
+        'requests': num_requests,
+        'seconds': elapsed,
+        'samples_per_second': num_requests * batch_size / elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inference pool throughput benchmark')
+    parser.add_argument('--detector', choices=sorted(DETECTORS), default='audio')
+    parser.add_argument('--workers', type=int_list, default=[1, 2, 4, 8])
+    parser.add_argument('--threads', type=int_list, default=[1, 2, 4])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    num_cpus = len(os.sched_getaffinity(0))
+    results = []
+    print(f"{'workers':>8} {'threads':>8} {'samples/s':>12}")
+    for num_workers in args.workers:
+        for threads_per_worker in args.threads:
+            if num_workers * threads_per_worker > num_cpus:
+                continue
+            result = run(args.detector, num_workers, threads_per_worker,
+                         args.requests, args.batch_size)
+            results.append(result)
+            print(f"{num_workers:>8} {threads_per_worker:>8} {result['samples_per_second']:>12.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
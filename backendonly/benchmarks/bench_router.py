@@ -0,0 +1,121 @@
+"""
+Router throughput against 1, 2 and 4 local stand-in backends.
+
+Each stand-in mimics server.py: it answers /api/server-info and
+/api/process/<endpoint>, analyses one upload at a time for --work-ms and
+keeps a result cache keyed on the content hash. The router runs
+in-process in front of them.
+
+    python benchmarks/bench_router.py --backends 1,2,4 --requests 400
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from router import Router, create_app
+
+
+def stand_in_backend(work_seconds):
+    app = Flask(__name__)
+    busy = threading.Semaphore(1)
+    cache = {}
+
+    @app.route('/api/server-info', methods=['GET'])
+    def server_info():
+        return jsonify(status='running', name='Stand-in Backend')
+
+    @app.route('/api/process/<endpoint>', methods=['POST'])
+    def process(endpoint):
+        content_hash = hashlib.sha256(request.files['file'].read()).hexdigest()
+        if content_hash not in cache:
+            with busy:
+                time.sleep(work_seconds)
+            cache[content_hash] = f"{endpoint} report for {content_hash[:12]}"
+        return jsonify(success=True, output=cache[content_hash])
+
+    return app
+
+
+def serve(app, port):
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(num_backends, base_port, args):
+    servers = []
+    backends = []
+    for i in range(num_backends):
+        port = base_port + 1 + i
+        servers.append(serve(stand_in_backend(args.work_ms / 1000.0), port))
+        backends.append(f"http://127.0.0.1:{port}")
+
+    router = Router(backends)
+    router_server = serve(create_app(router), base_port)
+    url = f"http://127.0.0.1:{base_port}/api/process/ai-image"
+
+    payloads = [f"synthetic upload {i}".encode() * 64 for i in range(args.distinct)]
+
+    def upload(i):
+        data = payloads[i % len(payloads)]
+        response = requests.post(url, files={'file': (f'{i}.jpg', data, 'image/jpeg')})
+        return response.status_code == 200
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            ok = sum(pool.map(upload, range(args.requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        router_server.shutdown()
+        for server in servers:
+            server.shutdown()
+
+    return {
+        'backends': num_backends,
+        'requests': args.requests,
+        'succeeded': ok,
+        'seconds': elapsed,
+        'requests_per_second': args.requests / elapsed,
+        'per_backend': list(router.metrics['per_backend'].values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Router throughput benchmark')
+    parser.add_argument('--backends', default='1,2,4')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--distinct', type=int, default=100,
+                        help='number of distinct uploads; repeats exercise the result cache')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--work-ms', type=float, default=50.0,
+                        help='simulated analysis time per uncached upload')
+    parser.add_argument('--base-port', type=int, default=18080)
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'backends':>9} {'req/s':>10}  per-backend")
+    for offset, num_backends in enumerate(int(n) for n in args.backends.split(',')):
+        result = run(num_backends, args.base_port + offset * 10, args)
+        results.append(result)
+        print(f"{num_backends:>9} {result['requests_per_second']:>10.1f}  {result['per_backend']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
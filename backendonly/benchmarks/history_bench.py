@@ -0,0 +1,182 @@
+"""
+Query latency of the SQLite history store (history.py) at scale.
+
+Fills a database with --rows synthetic analyses (default 10M, spread over
+a year, with a quarter as many distinct files as rows so hashes repeat),
+then times the queries behind /api/history and the cache fallback:
+
+    hash_page       newest 50 analyses of one file
+    hash_summary    per endpoint / model version summary of one file
+    lookup          latest successful output for one exact analysis
+    endpoint_page   newest 50 for an endpoint
+    version_page    newest 50 for a model version
+    verdict_range   newest 50 with a verdict within one day
+    deep_page       a page 20 cursors deep for an endpoint
+    newest_page     newest 50 overall
+
+and the write throughput of HistoryStore.record (batched writer thread).
+A populated --db is reused, so the fill is paid once:
+
+    python benchmarks/history_bench.py --db /tmp/history-10m.db --rows 10000000
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from history import COLUMNS, HistoryStore
+
+ENDPOINTS = {
+    'ai-image': ('AI-Generated', 'Authentic'),
+    'forged-image': ('Tampered (Fake)', 'Authentic (Real)'),
+    'audio': ('spoof', 'bonafide'),
+}
+MODEL_VERSIONS = [hashlib.sha1(str(i).encode()).hexdigest()[:12] for i in range(5)]
+YEAR = 365 * 24 * 3600
+
+
+def content_hash(i):
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def synthetic_rows(start, count, total, output_bytes, now):
+    rng = random.Random(start)
+    output = 'x' * output_bytes
+    for i in range(start, start + count):
+        endpoint = rng.choice(list(ENDPOINTS))
+        yield (
+            now - YEAR + YEAR * i / total,
+            content_hash(rng.randrange(max(total // 4, 1))),
+            endpoint,
+            '',
+            'full',
+            MODEL_VERSIONS[min(i * len(MODEL_VERSIONS) // total, len(MODEL_VERSIONS) - 1)],
+            rng.choice(ENDPOINTS[endpoint]),
+            rng.random(),
+            1,
+            rng.uniform(0.05, 2.0),
+            f'file_{i}.bin',
+            output,
+        )
+
+
+def fill(path, rows, output_bytes, batch=50000):
+    store = HistoryStore(path)  # creates the schema and indexes
+    store.close()
+    conn = sqlite3.connect(path)
+    existing = conn.execute("SELECT COUNT(*) FROM analyses").fetchone()[0]
+    if existing >= rows:
+        conn.close()
+        return existing, 0.0
+    insert = f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+    now = time.time()
+    start = time.perf_counter()
+    for offset in range(existing, rows, batch):
+        with conn:
+            conn.executemany(insert, synthetic_rows(offset, min(batch, rows - offset), rows, output_bytes, now))
+        print(f"\r  filled {min(offset + batch, rows):,} / {rows:,}", end='', flush=True)
+    print()
+    conn.execute("ANALYZE")
+    conn.close()
+    return rows, time.perf_counter() - start
+
+
+def time_query(fn, repeats):
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    values = np.array(latencies)
+    return {q: float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+
+def deep_page(store, endpoint, depth):
+    cursor = None
+    for _ in range(depth):
+        _, cursor = store.query({'endpoint': endpoint}, cursor=cursor)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='History store query latency benchmark')
+    parser.add_argument('--db', default='history_bench.db', help='database to fill (reused if already filled)')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--output-bytes', type=int, default=300, help='size of the stored report text')
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--write-rows', type=int, default=100000, help='rows for the write throughput test')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    rows, fill_seconds = fill(args.db, args.rows, args.output_bytes)
+    if fill_seconds:
+        print(f"Filled {rows:,} rows in {fill_seconds:.1f}s ({rows / fill_seconds:,.0f} rows/s)")
+    print(f"Database: {rows:,} rows, {os.path.getsize(args.db) / 2**30:.2f} GiB")
+
+    store = HistoryStore(args.db)
+    rng = random.Random(0)
+    now = time.time()
+
+    def random_hash():
+        return content_hash(rng.randrange(max(rows // 4, 1)))
+
+    def random_day():
+        since = now - rng.uniform(0, YEAR)
+        return since, since + 24 * 3600
+
+    queries = {
+        'hash_page': lambda: store.query({'content_hash': random_hash()}),
+        'hash_summary': lambda: store.summary(random_hash()),
+        'lookup': lambda: store.lookup(random_hash(), rng.choice(list(ENDPOINTS)), '', 'full',
+                                       rng.choice(MODEL_VERSIONS)),
+        'endpoint_page': lambda: store.query({'endpoint': rng.choice(list(ENDPOINTS))}),
+        'version_page': lambda: store.query({'model_version': rng.choice(MODEL_VERSIONS)}),
+        'verdict_range': lambda: store.query({'verdict': rng.choice(ENDPOINTS['ai-image'])}, *random_day()),
+        'deep_page': lambda: deep_page(store, rng.choice(list(ENDPOINTS)), 20),
+        'newest_page': lambda: store.query(),
+    }
+    results = {'rows': rows, 'queries': {}}
+    print(f"{'query':<14} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, fn in queries.items():
+        fn()  # warm the page cache
+        stats = time_query(fn, args.repeats)
+        results['queries'][name] = stats
+        print(f"{name:<14} {stats[50]:>9.3f} {stats[95]:>9.3f} {stats[99]:>9.3f}")
+
+    store.close()
+
+    # Queue large enough to hold the whole burst, so this measures the writer
+    writer = HistoryStore(args.db, queue_size=args.write_rows + 1)
+    row = dict(zip(COLUMNS, next(synthetic_rows(0, 1, 1, args.output_bytes, now))))
+    start = time.perf_counter()
+    for _ in range(args.write_rows):
+        writer.record(**row)
+    enqueue_seconds = time.perf_counter() - start
+    writer.close()
+    write_seconds = time.perf_counter() - start
+    stats = writer.stats()
+    results['writes'] = {
+        'rows': args.write_rows,
+        'record_us': enqueue_seconds / args.write_rows * 1e6,
+        'rows_per_second': stats['written'] / write_seconds,
+        'dropped': stats['dropped'],
+        'batches': stats['batches'],
+    }
+    print(f"record(): {results['writes']['record_us']:.1f} us/row on the request path, "
+          f"{results['writes']['rows_per_second']:,.0f} rows/s committed "
+          f"in {stats['batches']} batches, {stats['dropped']} dropped")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+"""
+End-to-end load test of a running server (server.py or router.py).
+
+Generates deterministic synthetic uploads -- JPEG/PNG/WebP images at several
+resolutions and WAV/FLAC/MP3 audio at several durations and sample rates --
+and drives /api/process/ai-image, /forged-image and /audio at each
+concurrency level. For every scenario it reports p50/p95/p99 latency,
+throughput and error rate, plus the server's CPU use and peak RSS sampled
+from /proc (the server process and all of its children, so the subprocess
+script path is included).
+
+Start the server first, then for example:
+    python benchmarks/load_test.py --url http://127.0.0.1:80 --concurrency 1,4,16 --requests 40 --out results/run1
+
+With --slo-ms each scenario also records whether its p99 stayed under the
+target, and every row shows the fraction of responses the server produced on
+its degraded tier (qos.py), so an overload run shows the tiers keeping p99
+under FORENSICS_QOS_SLO_MS.
+
+Each upload is drawn from --variants distinct files per input spec; use
+--variants >= --requests to measure uncached analysis only. Results are
+written to <out>.json (metadata and all scenarios) and <out>.csv.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from urllib.parse import urlparse
+
+import numpy as np
+import requests
+from PIL import Image
+
+IMAGE_MIME = {'jpeg': 'image/jpeg', 'png': 'image/png', 'webp': 'image/webp'}
+AUDIO_MIME = {'wav': 'audio/wav', 'flac': 'audio/flac', 'mp3': 'audio/mpeg'}
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def str_list(value):
+    return [v for v in value.split(',') if v]
+
+
+def int_list(value):
+    return [int(v) for v in str_list(value)]
+
+
+def float_list(value):
+    return [float(v) for v in str_list(value)]
+
+
+def seeded_rng(*key):
+    digest = hashlib.sha256(repr(key).encode()).digest()
+    return np.random.default_rng(int.from_bytes(digest[:8], 'little'))
+
+
+# Synthetic inputs
+
+def make_image(fmt, width, height, variant):
+    """Gradient, blocks and noise: compresses like a photo, not like noise or a flat fill"""
+    rng = seeded_rng('image', fmt, width, height, variant)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    pixels = np.stack([
+        128 + 100 * np.sin(x / width * np.pi * rng.uniform(1, 4) + rng.uniform(0, np.pi)),
+        128 + 100 * np.cos(y / height * np.pi * rng.uniform(1, 4)),
+        255 * (x + y) / (width + height),
+    ], axis=-1)
+    for _ in range(12):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        pixels[y0:y0 + height // 6, x0:x0 + width // 6] = rng.integers(0, 256, 3)
+    pixels += rng.normal(0, 8, pixels.shape)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    options = {} if fmt == 'png' else {'quality': 90}
+    image.save(buffer, format=fmt.upper(), **options)
+    return buffer.getvalue()
+
+
+def write_wav(path, samples, sample_rate):
+    with wave.open(path, 'wb') as fh:
+        fh.setnchannels(1)
+        fh.setsampwidth(2)
+        fh.setframerate(sample_rate)
+        fh.writeframes((samples * 32767).astype('<i2').tobytes())
+
+
+def make_audio(fmt, seconds, sample_rate, variant):
+    """Speech-like harmonic tone with a wandering pitch and noise; None if fmt cannot be encoded here"""
+    rng = seeded_rng('audio', fmt, seconds, sample_rate, variant)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * rng.uniform(0.2, 1.0) * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    samples = sum(np.sin(k * phase) / k for k in range(1, 6))
+    samples *= 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 5) * t) ** 2
+    samples += rng.normal(0, 0.02, len(t))
+    samples = 0.8 * samples / np.max(np.abs(samples))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path = os.path.join(tmp, 'input.wav')
+        write_wav(wav_path, samples, sample_rate)
+        if fmt == 'wav':
+            path = wav_path
+        else:
+            path = os.path.join(tmp, f'input.{fmt}')
+            if not encode_audio(wav_path, path, fmt):
+                return None
+        with open(path, 'rb') as fh:
+            return fh.read()
+
+
+def encode_audio(wav_path, path, fmt):
+    try:
+        import soundfile as sf
+        if fmt.upper() in sf.available_formats():
+            data, sample_rate = sf.read(wav_path)
+            sf.write(path, data, sample_rate, format=fmt.upper())
+            return True
+    except ImportError:
+        pass
+    if shutil.which('ffmpeg'):
+        result = subprocess.run(['ffmpeg', '-loglevel', 'error', '-y', '-i', wav_path, path])
+        return result.returncode == 0
+    return False
+
+
+def build_specs(args):
+    """[(endpoint, spec label, filename, mime, [payload per variant])]"""
+    specs = []
+    image_endpoints = [e for e in args.endpoints if e != 'audio']
+    for fmt in args.image_formats:
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.split('x'))
+            payloads = [make_image(fmt, width, height, v) for v in range(args.variants)]
+            for endpoint in image_endpoints:
+                specs.append((endpoint, f'{fmt} {resolution}', f'input.{fmt}', IMAGE_MIME[fmt], payloads))
+    if 'audio' in args.endpoints:
+        for fmt in args.audio_formats:
+            for seconds in args.durations:
+                for sample_rate in args.sample_rates:
+                    payloads = [make_audio(fmt, seconds, sample_rate, v) for v in range(args.variants)]
+                    if payloads[0] is None:
+                        print(f"Skipping {fmt} audio: no encoder available (install libsndfile >= 1.1 or ffmpeg)")
+                        break
+                    specs.append(('audio', f'{fmt} {seconds:g}s {sample_rate}Hz', f'input.{fmt}',
+                                  AUDIO_MIME[fmt], payloads))
+    return specs
+
+
+# Server resource sampling
+
+def find_listening_pid(port):
+    """pid of the local process listening on port, from /proc (None if not visible)"""
+    inodes = set()
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table) as fh:
+                next(fh)
+                for line in fh:
+                    fields = line.split()
+                    if int(fields[1].rsplit(':', 1)[1], 16) == port and fields[3] == '0A':
+                        inodes.add(fields[9])
+        except OSError:
+            continue
+    targets = {f'socket:[{inode}]' for inode in inodes}
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            for fd in os.listdir(f'/proc/{pid}/fd'):
+                if os.readlink(f'/proc/{pid}/fd/{fd}') in targets:
+                    return int(pid)
+        except OSError:
+            continue
+    return None
+
+
+def read_proc_stats():
+    """{pid: (ppid, cpu seconds, rss bytes)} for every visible process"""
+    stats = {}
+    for pid in filter(str.isdigit, os.listdir('/proc')):
+        try:
+            with open(f'/proc/{pid}/stat') as fh:
+                # the command name may contain spaces; fields restart after ')'
+                fields = fh.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        cpu = (int(fields[11]) + int(fields[12]) + int(fields[13]) + int(fields[14])) / CLOCK_TICKS
+        stats[int(pid)] = (int(fields[1]), cpu, int(fields[21]) * PAGE_SIZE)
+    return stats
+
+
+class ProcessTreeSampler:
+    """Samples CPU time and RSS of a process and its descendants in the background
+
+    CPU time per process includes its reaped children (cutime/cstime), so
+    summing over the live tree counts finished subprocesses exactly once.
+    """
+    def __init__(self, pid, interval=0.25):
+        self.pid = pid
+        self.interval = interval
+        self.cpu = 0.
+        self.peak_rss = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def sample(self):
+        stats = read_proc_stats()
+        tree = {self.pid} & stats.keys()
+        children = tree
+        while children:
+            children = {pid for pid, (ppid, _, _) in stats.items() if ppid in children}
+            tree |= children
+        self.cpu = sum(stats[pid][1] for pid in tree)
+        self.peak_rss = max(self.peak_rss, sum(stats[pid][2] for pid in tree))
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.sample()
+        self.start_cpu = self.cpu
+        self.start = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop_event.set()
+        self.thread.join()
+        self.sample()
+        elapsed = time.perf_counter() - self.start
+        self.cpu_seconds = self.cpu - self.start_cpu
+        self.cpu_percent = 100 * self.cpu_seconds / elapsed
+
+
+# Load generation
+
+def run_scenario(session_factory, url, spec, concurrency, num_requests, timeout, server_pid, slo_ms=0):
+    endpoint, label, filename, mime, payloads = spec
+    target = f"{url}/api/process/{endpoint}"
+    local = threading.local()
+
+    def upload(i):
+        if not hasattr(local, 'session'):
+            local.session = session_factory()
+        data = payloads[i % len(payloads)]
+        start = time.perf_counter()
+        tier = None
+        try:
+            response = local.session.post(target, files={'file': (filename, data, mime)}, timeout=timeout)
+            body = response.json()
+            ok = response.status_code == 200 and body.get('success', False)
+            tier = body.get('tier')
+        except (requests.RequestException, ValueError):
+            ok = False
+        return time.perf_counter() - start, ok, tier
+
+    sampler = ProcessTreeSampler(server_pid) if server_pid else None
+    with sampler or nullcontext():
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(upload, range(num_requests)))
+        elapsed = time.perf_counter() - start
+
+    latencies = np.array([latency for latency, _, _ in outcomes]) * 1000
+    errors = sum(1 for _, ok, _ in outcomes if not ok)
+    degraded = sum(1 for _, _, tier in outcomes if tier == 'degraded')
+    return {
+        'endpoint': endpoint,
+        'input': label,
+        'bytes': len(payloads[0]),
+        'concurrency': concurrency,
+        'requests': num_requests,
+        'errors': errors,
+        'error_rate': errors / num_requests,
+        'seconds': elapsed,
+        'requests_per_second': num_requests / elapsed,
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'p99_ms': float(np.percentile(latencies, 99)),
+        'degraded_fraction': degraded / num_requests,
+        'slo_met': bool(np.percentile(latencies, 99) <= slo_ms) if slo_ms else None,
+        'server_cpu_percent': sampler.cpu_percent if sampler else None,
+        'server_peak_rss_mb': sampler.peak_rss / 2**20 if sampler else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end server load test')
+    parser.add_argument('--url', default='http://127.0.0.1:80', help='server (or router) base URL')
+    parser.add_argument('--endpoints', type=str_list, default=['ai-image', 'forged-image', 'audio'])
+    parser.add_argument('--concurrency', type=int_list, default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=40, help='requests per scenario')
+    parser.add_argument('--variants', type=int, default=8,
+                        help='distinct files per input spec; repeats exercise the result cache')
+    parser.add_argument('--image-formats', type=str_list, default=['jpeg', 'png', 'webp'])
+    parser.add_argument('--resolutions', type=str_list, default=['320x240', '1280x960', '4000x3000'])
+    parser.add_argument('--audio-formats', type=str_list, default=['wav', 'flac', 'mp3'])
+    parser.add_argument('--durations', type=float_list, default=[2.0, 4.0, 10.0], help='audio seconds')
+    parser.add_argument('--sample-rates', type=int_list, default=[16000, 44100])
+    parser.add_argument('--timeout', type=float, default=300.0, help='per-request timeout in seconds')
+    parser.add_argument('--server-pid', type=int,
+                        help='server process to sample; found from the URL port if omitted')
+    parser.add_argument('--slo-ms', type=float, default=0,
+                        help='p99 latency target; reports whether each scenario met it (see FORENSICS_QOS_SLO_MS)')
+    parser.add_argument('--out', default='load_test', help='output path prefix for .json and .csv')
+    args = parser.parse_args()
+
+    url = args.url.rstrip('/')
+    server_info = requests.get(f"{url}/api/server-info", timeout=10).json()
+    parsed = urlparse(url)
+    server_pid = args.server_pid
+    if server_pid is None and parsed.hostname in ('127.0.0.1', 'localhost'):
+        server_pid = find_listening_pid(parsed.port or 80)
+    if server_pid is None:
+        print("Server process not found; CPU and RSS will not be reported (pass --server-pid)")
+
+    print("Generating inputs...")
+    specs = build_specs(args)
+
+    results = []
+    print(f"{'endpoint':<13} {'input':<22} {'conc':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>7} {'degr.':>6} {'cpu %':>7} {'rss MB':>8}  slo")
+    for spec in specs:
+        for concurrency in args.concurrency:
+            row = run_scenario(requests.Session, url, spec, concurrency, args.requests, args.timeout, server_pid,
+                               args.slo_ms)
+            results.append(row)
+            cpu = f"{row['server_cpu_percent']:.0f}" if server_pid else '-'
+            rss = f"{row['server_peak_rss_mb']:.0f}" if server_pid else '-'
+            print(f"{row['endpoint']:<13} {row['input']:<22} {concurrency:>4} {row['requests_per_second']:>8.2f} "
+                  f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} "
+                  f"{row['error_rate'] * 100:>6.1f}% {row['degraded_fraction'] * 100:>5.0f}% {cpu:>7} {rss:>8}  "
+                  f"{'-' if row['slo_met'] is None else 'met' if row['slo_met'] else 'MISSED'}")
+
+    out_dir = os.path.dirname(args.out)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(f"{args.out}.json", 'w') as f:
+        json.dump({
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'url': url,
+            'server_info': server_info,
+            'server_pid': server_pid,
+            'host': {'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'args': vars(args),
+            'results': results,
+        }, f, indent=2)
+    with open(f"{args.out}.csv", 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]) if results else [])
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"Wrote {args.out}.json and {args.out}.csv")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,332 @@
+"""
+Numerical parity of the optimized inference paths against the reference
+single-file paths of each detector.
+
+Reference paths (models are loaded once, so the timing compares inference
+and not model loading):
+    ai-image      ai_image_detector_integration.predict_single_image
+    forged-image  forged_image_detector.prepare_image + predict_batch of one,
+                  as in predict_image
+    audio         audio_detector.preprocess_audio + predict, as in
+                  analyze_audio
+
+With --fast the reference scripts take their cheaper path: ai-image
+decodes JPEGs in draft mode, audio decodes only the centre window.
+
+Optimized paths, expected to match the reference:
+    batched   Detector.preprocess per file, np.stack, one Detector.infer call
+              per --batch-size files (what the server's model stage does)
+    pipeline  AnalysisPipeline with in-process models
+    pool      one batched call per --batch-size files through a one-worker
+              InferencePool (shared-memory hand-off to a forked worker)
+    degraded  AnalysisPipeline at the degraded QoS tier, against the --fast
+              reference (forged-image: against the plain reference, since its
+              degraded tier only drops tiling)
+
+Approximate paths, expected to change some scores:
+    fast      the --fast reference against the full one (ai-image, audio)
+    tiled     forged_image_detector.analyze_tiles, the most suspicious tile's
+              score against the single 128x128 ELA pass (forged-image)
+
+For each detector and path it reports the maximum absolute difference of the
+"fake" probability (AI-generated / tampered / spoof), the number of verdict
+flips and the speedup over its reference. It exits non-zero when a path
+expected to match exceeds --max-prob-delta or --max-flips, or when an
+approximate path flips more than --max-approx-flip-rate of the verdicts.
+
+Run from backendonly/ so the detectors find their model files:
+    python benchmarks/parity.py --paths batched,pipeline --batch-size 8
+    python benchmarks/parity.py --paths pool,degraded,fast,tiled
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detectors import DETECTORS
+from load_test import make_audio
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.webp')
+
+
+def summarize(detector_name, result):
+    """(fake probability, verdict) from a detector's raw result"""
+    if detector_name == 'ai-image':
+        label, probabilities = result
+        return float(probabilities[0]), label
+    if detector_name == 'forged-image':
+        return float(result), 'Tampered' if result > 0.5 else 'Authentic'
+    return float(result['spoof_prob']), result['prediction']
+
+
+# Reference paths
+
+def reference_ai_image(fast=False):
+    import ai_image_detector_integration as module
+    from ai_image_detector.custom_dataset import get_transform
+    detector = DETECTORS['ai-image']
+    model, device, transform = detector.load(), detector.device, get_transform()
+    draft_size = module.FAST_DRAFT_SIZE if fast else None
+
+    def run(path):
+        label, probabilities, _ = module.predict_single_image(path, model, device, transform, draft_size)
+        if probabilities is None:
+            raise RuntimeError(label)
+        return label, probabilities[0].tolist()
+    return run
+
+
+def reference_forged_image(fast=False):
+    import forged_image_detector as module
+    module.load_model()
+    return lambda path: module.predict_batch(module.prepare_image(path))[0]
+
+
+def reference_audio(fast=False):
+    import audio_detector as module
+    detector = DETECTORS['audio']
+    model, device = detector.load(), detector.device
+    center_seconds = module.CONFIG["fast_window_seconds"] if fast else None
+
+    def run(path):
+        audio_tensor = module.preprocess_audio(path, center_seconds=center_seconds)
+        if audio_tensor is None:
+            raise RuntimeError(f"preprocess_audio failed for {path}")
+        return module.predict(model, audio_tensor, device)
+    return run
+
+
+REFERENCE = {
+    'ai-image': reference_ai_image,
+    'forged-image': reference_forged_image,
+    'audio': reference_audio,
+}
+
+
+# Optimized paths
+
+def chunks(paths, size):
+    return [paths[i:i + size] for i in range(0, len(paths), size)]
+
+
+def run_batched(detector_name, paths, args):
+    detector = DETECTORS[detector_name]
+    model = detector.load()
+    detector.infer(model, np.stack([detector.preprocess(paths[0])]))  # warm-up
+
+    start = time.perf_counter()
+    results = []
+    for chunk in chunks(paths, args.batch_size):
+        results.extend(detector.infer(model, np.stack([detector.preprocess(p) for p in chunk])))
+    return results, time.perf_counter() - start
+
+
+def run_pipeline(detector_name, paths, args, tier='full'):
+    from pipeline import AnalysisPipeline
+    pipeline = AnalysisPipeline(max_batch=args.batch_size)
+    try:
+        pipeline.submit(detector_name, paths[0], tier).result()  # loads the model
+        start = time.perf_counter()
+        futures = [pipeline.submit(detector_name, path, tier) for path in paths]
+        results = [future.result() for future in futures]
+        return results, time.perf_counter() - start
+    finally:
+        pipeline.close()
+
+
+def run_degraded(detector_name, paths, args):
+    return run_pipeline(detector_name, paths, args, tier='degraded')
+
+
+def run_pool(detector_name, paths, args):
+    # Forked in main() before this process loaded any model
+    detector, pool = DETECTORS[detector_name], args.pool
+    pool.submit(detector_name, np.stack([detector.preprocess(paths[0])])).result()
+    start = time.perf_counter()
+    results = []
+    for chunk in chunks(paths, args.batch_size):
+        batch = np.stack([detector.preprocess(p) for p in chunk])
+        results.extend(pool.submit(detector_name, batch).result())
+    return results, time.perf_counter() - start
+
+
+def run_fast(detector_name, paths, args):
+    run = REFERENCE[detector_name](fast=True)
+    run(paths[0])  # warm-up
+    start = time.perf_counter()
+    results = [run(path) for path in paths]
+    return results, time.perf_counter() - start
+
+
+def run_tiled(detector_name, paths, args):
+    import forged_image_detector as module
+    module.analyze_tiles(paths[0])  # loads the model
+    start = time.perf_counter()
+    results = [module.analyze_tiles(path)['max_score'] for path in paths]
+    return results, time.perf_counter() - start
+
+
+def degraded_reference(detector_name):
+    # Degraded forged-image only drops tiling, which the reference never uses
+    return 'full' if detector_name == 'forged-image' else 'fast'
+
+
+# name -> (run, detectors it applies to (None = all), reference it is
+# compared with, whether it is an approximation)
+OPTIMIZED = {
+    'batched': (run_batched, None, 'full', False),
+    'pipeline': (run_pipeline, None, 'full', False),
+    'pool': (run_pool, None, 'full', False),
+    'degraded': (run_degraded, None, degraded_reference, False),
+    'fast': (run_fast, {'ai-image', 'audio'}, 'full', True),
+    'tiled': (run_tiled, {'forged-image'}, 'full', True),
+}
+
+
+# Corpus
+
+def image_corpus(directory):
+    paths = []
+    for pattern in IMAGE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(directory, pattern)))
+    return sorted(paths)
+
+
+def audio_corpus(directory, tmp):
+    """Files in directory, or a fixed synthetic set written to tmp"""
+    if directory:
+        return sorted(p for p in glob.glob(os.path.join(directory, '*'))
+                      if p.lower().endswith(('.wav', '.flac', '.mp3', '.ogg')))
+    paths = []
+    for seconds in (1.5, 4.0, 6.0):
+        for sample_rate in (16000, 44100):
+            for variant in range(2):
+                path = os.path.join(tmp, f'synthetic_{seconds:g}s_{sample_rate}_{variant}.wav')
+                with open(path, 'wb') as fh:
+                    fh.write(make_audio('wav', seconds, sample_rate, variant))
+                paths.append(path)
+    return paths
+
+
+def run_reference(detector_name, paths, fast):
+    run = REFERENCE[detector_name](fast=fast)
+    run(paths[0])  # warm-up
+    start = time.perf_counter()
+    expected = [summarize(detector_name, run(path)) for path in paths]
+    return expected, time.perf_counter() - start
+
+
+def compare(detector_name, paths, args):
+    references = {}  # 'full' / 'fast' -> (expected, seconds), run on first use
+    rows = []
+    for path_name in args.paths:
+        run, detectors, reference, approximate = OPTIMIZED[path_name]
+        if detectors is not None and detector_name not in detectors:
+            continue
+        if callable(reference):
+            reference = reference(detector_name)
+        if reference not in references:
+            references[reference] = run_reference(detector_name, paths, fast=reference == 'fast')
+        expected, reference_seconds = references[reference]
+
+        results, seconds = run(detector_name, paths, args)
+        got = [summarize(detector_name, result) for result in results]
+        deltas = [abs(g[0] - e[0]) for g, e in zip(got, expected)]
+        flips = [path for path, g, e in zip(paths, got, expected) if g[1] != e[1]]
+        max_delta = max(deltas) if deltas else 0.0
+        if approximate:
+            passed = len(flips) <= args.max_approx_flip_rate * len(paths)
+        else:
+            passed = max_delta <= args.max_prob_delta and len(flips) <= args.max_flips
+        rows.append({
+            'detector': detector_name,
+            'path': path_name,
+            'reference': reference,
+            'approximate': approximate,
+            'files': len(paths),
+            'max_prob_delta': max_delta,
+            'verdict_flips': len(flips),
+            'flipped_files': flips,
+            'reference_seconds': reference_seconds,
+            'optimized_seconds': seconds,
+            'speedup': reference_seconds / seconds,
+            'passed': passed,
+        })
+    return rows
+
+
+def main():
+    default_images = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'ai_image_detector', 'Testing3')
+    parser = argparse.ArgumentParser(description='Numerical parity harness for optimized inference paths')
+    parser.add_argument('--detectors', default='ai-image,forged-image,audio')
+    parser.add_argument('--paths', default='batched,pipeline',
+                        help=f"comma-separated optimized paths: {','.join(OPTIMIZED)}")
+    parser.add_argument('--images', default=default_images, help='directory of corpus images')
+    parser.add_argument('--audio', help='directory of corpus audio files (default: synthetic WAVs)')
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=4, help='torch/TF threads of the pool worker')
+    parser.add_argument('--max-prob-delta', type=float, default=1e-4)
+    parser.add_argument('--max-flips', type=int, default=0)
+    parser.add_argument('--max-approx-flip-rate', type=float, default=0.05,
+                        help='share of verdicts the approximate paths (fast, tiled) may flip')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+    args.paths = [p for p in args.paths.split(',') if p]
+    unknown = set(args.paths) - set(OPTIMIZED)
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+    detector_names = [name for name in args.detectors.split(',') if name]
+
+    # Fork the pool worker before the reference paths initialise torch /
+    # TensorFlow here: a fork of an initialised runtime can deadlock
+    args.pool = None
+    if 'pool' in args.paths:
+        from inference_pool import InferencePool
+        args.pool = InferencePool(detector_names, 1, args.threads)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for detector_name in detector_names:
+            if detector_name == 'audio':
+                paths = audio_corpus(args.audio, tmp)
+            else:
+                paths = image_corpus(args.images)
+            if not paths:
+                print(f"No corpus files for {detector_name}; skipped")
+                continue
+            rows.extend(compare(detector_name, paths, args))
+    if args.pool is not None:
+        args.pool.close()
+
+    print(f"{'detector':<13} {'path':<9} {'vs':<5} {'files':>5} {'max |dp|':>10} {'flips':>5} "
+          f"{'ref s':>8} {'opt s':>8} {'speedup':>8}  status")
+    for row in rows:
+        print(f"{row['detector']:<13} {row['path']:<9} {row['reference']:<5} {row['files']:>5} "
+              f"{row['max_prob_delta']:>10.2e} "
+              f"{row['verdict_flips']:>5} {row['reference_seconds']:>8.2f} {row['optimized_seconds']:>8.2f} "
+              f"{row['speedup']:>7.1f}x  {'ok' if row['passed'] else 'FAIL'}")
+        for path in row['flipped_files']:
+            print(f"    verdict flipped: {path}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(rows, f, indent=2)
+
+    failed = [row for row in rows if not row['passed']]
+    if failed:
+        print(f"{len(failed)} path(s) exceeded the parity thresholds "
+              f"(max prob delta {args.max_prob_delta:g}, max flips {args.max_flips}, "
+              f"approximate paths: max flip rate {args.max_approx_flip_rate:g})")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
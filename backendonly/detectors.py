@@ -0,0 +1,255 @@
+"""
+Load / preprocess / infer / report hooks for each detector.
+
+Detector modules are imported lazily so a process that never runs a model
+(the server before it forks its inference workers) does not pull in torch
+or TensorFlow.
+"""
+import hashlib
+import importlib
+import os
+import re
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class Detector:
+    name = None
+    script = None
+    module_name = None
+    input_shape = None
+    weights = None  # weights file, relative to this directory
+    # What the model consumes and what clients may send, advertised by
+    # /api/server-info. Kept literal so the server need not import the module.
+    contract = None
+
+    @property
+    def module(self):
+        return importlib.import_module(self.module_name)
+
+    @property
+    def device(self):
+        import torch
+        return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    def load(self, weights=None):
+        """Load the model from weights (a path, default self.weights)"""
+        raise NotImplementedError
+
+    def weights_path(self, weights=None):
+        return os.path.join(BASE_DIR, weights or self.weights)
+
+    def warm(self, model, passes=2):
+        """Dummy forward passes, so the first real batch does not pay for lazy initialisation"""
+        batch = np.zeros((1, *self.input_shape), dtype=np.float32)
+        for _ in range(passes):
+            self.infer(model, batch)
+
+    def unload(self, model):
+        """Drop any reference to model held outside the caller (module globals)"""
+
+    def decode(self, path, tier='full'):
+        """Read and decode the file (I/O bound); tier 'degraded' may decode less (see qos)"""
+        raise NotImplementedError
+
+    def prepare(self, decoded):
+        """Turn decoded media into one model input without a batch dimension (CPU bound)"""
+        raise NotImplementedError
+
+    def preprocess(self, path, tier='full'):
+        return self.prepare(self.decode(path, tier))
+
+    def infer(self, model, batch):
+        """Return one picklable result per row of batch"""
+        raise NotImplementedError
+
+    def report(self, path, result):
+        raise NotImplementedError
+
+    def error_output(self, error):
+        """Output the standalone script prints when preprocessing fails"""
+        return f"Error: {str(error)}"
+
+    def model_version(self, weights=None):
+        """Short fingerprint of a weights file; changes whenever the file is replaced"""
+        path = self.weights_path(weights)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return hashlib.sha1(f"{os.path.relpath(path, BASE_DIR)}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest()[:12]
+
+    def verdict(self, output):
+        """(verdict, probability of 'fake') read back from a report, or (None, None)"""
+        match = re.search(r"^Prediction: (.+)$", output, re.MULTILINE)
+        return (match.group(1).strip() if match else None), None
+
+
+class AiImageDetector(Detector):
+    name = 'ai-image'
+    script = 'ai_image_detector_integration.py'
+    module_name = 'ai_image_detector_integration'
+    input_shape = (3, 200, 200)
+    weights = 'ai_image_detector/model/model_epoch_24.pth'
+    contract = {
+        'endpoint': '/api/process/ai-image',
+        'input': 'image',
+        'size': [200, 200],
+        'color': 'RGB',
+        'resize': 'bilinear to exactly 200x200, aspect ratio not preserved',
+        # Applied on the server to every payload, as in custom_dataset.get_transform
+        'normalization': {'scale': 1 / 255, 'mean': [0.485, 0.456, 0.406], 'std': [0.229, 0.224, 0.225]},
+        'original_bytes_required': False,
+        'payloads': {
+            'file': 'any image file; decoded and resized on the server',
+            'resized': 'image file already 200x200 (form field payload=resized)',
+            'tensor': 'raw uint8 RGB, row-major 200x200x3 = 120000 bytes (form field payload=tensor)',
+        },
+        'modes': {
+            'frames': 'animated GIF/WebP or multi-page TIFF: up to 16 distinct frames scored (form field mode=frames)',
+        },
+    }
+
+    def load(self, weights=None):
+        from ai_image_detector.model import get_model
+        model = self.module.load_model(get_model(self.device), self.device, model_file=self.weights_path(weights))
+        if isinstance(model, str):
+            raise RuntimeError(model)
+        return model.eval()
+
+    def decode(self, path, tier='full'):
+        draft_size = self.module.FAST_DRAFT_SIZE if tier == 'degraded' else None
+        return self.module.load_image(path, draft_size)
+
+    def prepare(self, decoded):
+        from ai_image_detector.custom_dataset import get_transform
+        return get_transform()(decoded).numpy()
+
+    def infer(self, model, batch):
+        return self.module.predict_batch(model, batch, self.device)
+
+    def report(self, path, result):
+        import torch
+        predicted_label, probabilities = result
+        return self.module.generate_report(path, predicted_label, torch.tensor([probabilities]))
+
+    def verdict(self, output):
+        label, _ = super().verdict(output)
+        # Multi-frame reports give the mean over frames
+        match = re.search(r"^\s*(?:Mean )?AI-Generated: ([\d.]+)%", output, re.MULTILINE)
+        return label, float(match.group(1)) / 100 if match else None
+
+
+class ForgedImageDetector(Detector):
+    name = 'forged-image'
+    script = 'forged_image_detector.py'
+    module_name = 'forged_image_detector'
+    input_shape = (128, 128, 3)
+    weights = 'temp_model.keras'
+    contract = {
+        'endpoint': '/api/process/forged-image',
+        'input': 'image',
+        'size': [128, 128],
+        'color': 'RGB',
+        'normalization': 'JPEG quality 90 error level map, brightness-stretched, resized, scaled by 1/255',
+        # ELA measures the recompression error of the file as captured, which
+        # any client-side resize or re-encode destroys
+        'original_bytes_required': True,
+        'payloads': {'file': 'the original image file, unmodified'},
+    }
+
+    def load(self, weights=None):
+        # Always read the file afresh: the module's cached global would hand a
+        # swap the model it is replacing
+        return self.module.load_model(self.weights_path(weights))
+
+    def unload(self, model):
+        # No clear_session(): another thread may still be predicting with it.
+        # The module global belongs to the standalone script path; drop it
+        # only if it is this very model.
+        if self.module.model is model:
+            self.module.model = None
+
+    def decode(self, path, tier='full'):
+        return self.module.load_image(path)
+
+    def prepare(self, decoded):
+        return self.module.prepare_ela_array(decoded)[0]
+
+    def infer(self, model, batch):
+        return self.module.predict_batch(batch, model)
+
+    def report(self, path, result):
+        return self.module.generate_report(path, result)
+
+    def error_output(self, error):
+        return f"Error processing image: {str(error)}"
+
+    def verdict(self, output):
+        label, _ = super().verdict(output)
+        # Tiled reports give the most suspicious tile's score
+        match = re.search(r"Confidence: ([\d.]+)", output)
+        return label, float(match.group(1)) if match else None
+
+
+class AudioDetector(Detector):
+    name = 'audio'
+    script = 'audio_detector.py'
+    module_name = 'audio_detector'
+    input_shape = (64600,)
+    weights = 'aasist_main/models/weights/AASIST-L.pth'
+    contract = {
+        'endpoint': '/api/process/audio',
+        'input': 'audio',
+        'sample_rate': 16000,
+        'channels': 1,
+        'samples': 64600,
+        'normalization': 'peak-normalized, silence trimmed, centre-cropped or zero-padded to 64600 samples',
+        'original_bytes_required': False,
+        'payloads': {
+            'file': 'any audio file librosa can decode, at any sample rate',
+            'stream': 'raw s16le/f32le PCM to /api/stream/audio',
+        },
+    }
+
+    def load(self, weights=None):
+        return self.module.load_model(model_path=self.weights_path(weights), device=self.device)
+
+    def decode(self, path, tier='full'):
+        center_seconds = self.module.CONFIG["fast_window_seconds"] if tier == 'degraded' else None
+        return self.module.load_audio(path, center_seconds)
+
+    def prepare(self, decoded):
+        x, sr = decoded
+        return self.module.prepare_waveform(x, sr).numpy()
+
+    def infer(self, model, batch):
+        return self.module.predict_batch(model, batch, self.device)
+
+    def report(self, path, result):
+        return self.module.generate_report(path, result)
+
+    def error_output(self, error):
+        return "Error processing audio file"
+
+    def verdict(self, output):
+        conclusion = re.search(r"^Conclusion: (.+)$", output, re.MULTILINE)
+        if conclusion is None:
+            return None, None
+        label = 'bonafide' if conclusion.group(1).startswith('Authentic') else 'spoof'
+        # The report gives max(bonafide_prob, spoof_prob)
+        confidence = re.search(r"^Confidence: ([\d.]+)%", output, re.MULTILINE)
+        if confidence is None:
+            return label, None
+        confidence = float(confidence.group(1)) / 100
+        return label, confidence if label == 'spoof' else 1 - confidence
+
+
+DETECTORS = {
+    detector.name: detector
+    for detector in (AiImageDetector(), ForgedImageDetector(), AudioDetector())
+}
+
+SCRIPT_DETECTORS = {detector.script: name for name, detector in DETECTORS.items()}
@@ -1,4 +1,6 @@
+import io
 import sys
+import time
 import numpy as np
 from PIL import Image, ImageChops, ImageEnhance
 import tensorflow as tf
@@ -12,16 +14,43 @@ tf.get_logger().setLevel('ERROR')  # Suppress TF warnings
 # Image size based on your model input
 image_size = (128, 128)
 
-# Load Model
-model = tf.keras.models.load_model('temp_model.keras')
+# Tiled mode: overlapping ELA tiles covering the whole image
+tile_stride = 64  # 50% overlap between neighbouring tiles
+max_tiles = 1024  # above this the ELA map is downscaled; the stride never widens
+tile_batch_size = 64
+
+# Model is loaded on first use so worker processes can configure TF threading first
+model_path = 'temp_model.keras'
+model = None
+
+def load_model(path=None):
+    """The shared model from model_path, or a separate one from path (model hot-swap)"""
+    global model
+    if path is not None:
+        return tf.keras.models.load_model(path)
+    if model is None:
+        model = tf.keras.models.load_model(model_path)
+    return model
+
+def predict_batch(batch, keras_model=None):
+    if keras_model is None:
+        keras_model = load_model()
+    prediction = keras_model.predict(batch, verbose=0)
+    return [float(score) for score in prediction[:, 0]]
+
+def load_image(path):
+    return Image.open(path).convert('RGB')
 
 def convert_to_ela_image(path, quality=90):
-    temp_filename = 'temp_ela.jpg'
-    ela_filename = 'temp_ela.png'
+    return compute_ela(load_image(path), quality)
 
-    image = Image.open(path).convert('RGB')
-    image.save(temp_filename, 'JPEG', quality=quality)
-    temp_image = Image.open(temp_filename)
+def compute_ela(image, quality=90):
+    # Re-encode in memory so concurrent requests never share a temp file
+    temp_buffer = io.BytesIO()
+
+    image.save(temp_buffer, 'JPEG', quality=quality)
+    temp_buffer.seek(0)
+    temp_image = Image.open(temp_buffer)
 
     # Compute ELA difference
     ela_image = ImageChops.difference(image, temp_image)
@@ -38,30 +67,139 @@ def convert_to_ela_image(path, quality=90):
     return image, ela_image
 
 def prepare_image(image_path):
-    original_image, ela_image = convert_to_ela_image(image_path, 90)
+    return prepare_ela_array(load_image(image_path))
+
+def prepare_ela_array(image):
+    original_image, ela_image = compute_ela(image, 90)
     ela_image_resized = ela_image.resize(image_size)
     ela_array = np.array(ela_image_resized).flatten() / 255.0  # Normalize pixel values
     return ela_array.reshape(1, 128, 128, 3)  # Reshape for model input
 
+def _tile_offsets(length, stride):
+    # Always include a final tile flush with the edge so nothing is skipped
+    last = max(length - image_size[0], 0)
+    offsets = list(range(0, last + 1, stride))
+    if offsets[-1] != last:
+        offsets.append(last)
+    return offsets
+
+def _covered(offsets, length):
+    """Fraction of [0, length) inside at least one tile starting at offsets"""
+    mask = np.zeros(length, dtype=bool)
+    for offset in offsets:
+        mask[offset:offset + image_size[0]] = True
+    return float(mask.mean())
+
+def prepare_tiles(image_path, stride=tile_stride, tile_cap=max_tiles):
+    """ELA map, tile offsets, the scale the map was resized by to fit tile_cap tiles
+    and the (height, width) of the image within the map, which may be padded"""
+    original_image, ela_image = convert_to_ela_image(image_path, 90)
+
+    # Keep the overlapping grid and shrink the map instead, so every pixel is scored
+    width, height = ela_image.size
+    scale = 1.0
+    def grid_size(scale):
+        return len(_tile_offsets(round(height * scale), stride)) * len(_tile_offsets(round(width * scale), stride))
+    while grid_size(scale) > tile_cap:
+        scale *= 0.9
+    if scale < 1.0:
+        ela_image = ela_image.resize((max(round(width * scale), 1), max(round(height * scale), 1)), Image.BILINEAR)
+
+    # Images smaller than one tile are padded up to the model input size
+    width, height = ela_image.size
+    extent = (height, width)
+    if width < image_size[0] or height < image_size[1]:
+        padded = Image.new('RGB', (max(width, image_size[0]), max(height, image_size[1])))
+        padded.paste(ela_image, (0, 0))
+        ela_image = padded
+
+    ela_array = np.asarray(ela_image, dtype=np.float32) / 255.0  # Normalize pixel values
+    height, width = ela_array.shape[:2]
+    return ela_array, _tile_offsets(height, stride), _tile_offsets(width, stride), scale, extent
+
+def analyze_tiles(image_path, batch_size=tile_batch_size, stride=tile_stride):
+    ela_array, ys, xs, scale, (height, width) = prepare_tiles(image_path, stride)
+    offsets = [(y, x) for y in ys for x in xs]
+    keras_model = load_model()
+
+    # Tiles are cut per batch, so memory stays at one batch however large the grid
+    start = time.perf_counter()
+    scores = []
+    for first in range(0, len(offsets), batch_size):
+        tiles = np.stack([
+            ela_array[y:y + image_size[1], x:x + image_size[0]]
+            for y, x in offsets[first:first + batch_size]
+        ])
+        scores.append(keras_model.predict(tiles, verbose=0)[:, 0])
+    elapsed = time.perf_counter() - start
+
+    heatmap = np.concatenate(scores).reshape(len(ys), len(xs))
+    row, col = np.unravel_index(np.argmax(heatmap), heatmap.shape)
+    return {
+        "heatmap": heatmap,
+        "max_score": float(heatmap[row, col]),
+        # In original image pixels
+        "max_tile": (round(xs[col] / scale), round(ys[row] / scale)),
+        "num_tiles": len(offsets),
+        "stride": stride,
+        "scale": scale,
+        # Share of the image's pixels inside at least one tile
+        "coverage": _covered(ys, height) * _covered(xs, width),
+        "tiles_per_second": len(offsets) / elapsed if elapsed > 0 else float("inf"),
+    }
+
+def generate_report(image_path, confidence):
+    result = "Tampered (Fake)" if confidence > 0.5 else "Authentic (Real)"
+
+    return "\n".join([
+        "======== IMAGE ANALYSIS REPORT ========\n",
+        f"File: {Path(image_path).name}",
+        f"Prediction: {result}",
+        f"Confidence: {confidence:.4f}",
+        "\n======== ANALYSIS DETAILS ========\n",
+        "Method: Error Level Analysis (ELA) + Deep Learning",
+        "Input: 128x128 ELA-enhanced image",
+        f"Threshold: 0.5 (>{0.5}=Fake, <{0.5}=Real)"
+    ])
+
 def predict_image(image_path):
     try:
         processed_image = prepare_image(image_path)
         
-        # Disable progress bar during prediction
-        prediction = model.predict(processed_image, verbose=0)
-        
-        confidence = float(prediction[0][0])
+        confidence = predict_batch(processed_image)[0]
+        return generate_report(image_path, confidence)
+    except Exception as e:
+        return f"Error processing image: {str(e)}"
+
+def predict_image_tiled(image_path):
+    try:
+        analysis = analyze_tiles(image_path)
+
+        confidence = analysis["max_score"]
         result = "Tampered (Fake)" if confidence > 0.5 else "Authentic (Real)"
-        
+        heatmap_rows = [
+            " ".join(f"{score:.2f}" for score in row)
+            for row in analysis["heatmap"]
+        ]
+        rows, cols = analysis["heatmap"].shape
+        resolution = "full" if analysis["scale"] == 1.0 else f"ELA map scaled to {analysis['scale'] * 100:.0f}%"
+
         return "\n".join([
             "======== IMAGE ANALYSIS REPORT ========\n",
             f"File: {Path(image_path).name}",
             f"Prediction: {result}",
             f"Confidence: {confidence:.4f}",
+            f"Most suspicious tile: x={analysis['max_tile'][0]}, y={analysis['max_tile'][1]}",
+            "\n======== TAMPER HEATMAP ========\n",
+            *heatmap_rows,
             "\n======== ANALYSIS DETAILS ========\n",
-            "Method: Error Level Analysis (ELA) + Deep Learning",
-            "Input: 128x128 ELA-enhanced image",
-            f"Threshold: 0.5 (>{0.5}=Fake, <{0.5}=Real)"
+            "Method: Tiled Error Level Analysis (ELA) + Deep Learning",
+            f"Input: {analysis['num_tiles']} overlapping 128x128 ELA tiles "
+            f"({rows}x{cols} grid, stride {analysis['stride']})",
+            f"Resolution: {resolution}",
+            f"Coverage: {analysis['coverage'] * 100:.0f}% of the image",
+            f"Throughput: {analysis['tiles_per_second']:.1f} tiles/s",
+            f"Threshold: 0.5 (max tile >{0.5}=Fake, <{0.5}=Real)"
         ])
     except Exception as e:
         return f"Error processing image: {str(e)}"
@@ -71,6 +209,8 @@ def main():
         return "No image path provided"
     
     image_path = sys.argv[1]
+    if "--tiled" in sys.argv[2:]:
+        return predict_image_tiled(image_path)
     return predict_image(image_path)
 
 if __name__ == "__main__":
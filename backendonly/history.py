@@ -0,0 +1,199 @@
+"""
+Server-side analysis history in an embedded SQLite database.
+
+Every analysis the server runs is appended as one row: content hash,
+endpoint and options, tier, model version (Detector.model_version), the
+verdict and fake probability read back from the report, timing and the
+report itself. Writes are queued and committed by a background thread in
+batches of up to batch_size rows per transaction, so a request never waits
+on the disk; if the queue is full the row is dropped and counted.
+
+The database runs in WAL mode, so queries (/api/history) read a consistent
+snapshot while the writer appends. Every filterable column has an index;
+SQLite keeps rowids sorted within an index entry, so "newest first" pages
+on any single filter are plain index range scans, and a time window is
+turned into a rowid range first. That relies on created_at never going
+down as ids go up, so the writer thread stamps it as it inserts. Pages
+are keyed on the row id (cursor = id of the last row returned), so deep
+pages cost the same as the first.
+"""
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    content_hash TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    options TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    model_version TEXT,
+    verdict TEXT,
+    fake_prob REAL,
+    success INTEGER NOT NULL,
+    seconds REAL,
+    filename TEXT,
+    output TEXT
+);
+CREATE INDEX IF NOT EXISTS analyses_content_hash ON analyses (content_hash);
+CREATE INDEX IF NOT EXISTS analyses_endpoint ON analyses (endpoint);
+CREATE INDEX IF NOT EXISTS analyses_model_version ON analyses (model_version);
+CREATE INDEX IF NOT EXISTS analyses_verdict ON analyses (verdict);
+CREATE INDEX IF NOT EXISTS analyses_created_at ON analyses (created_at);
+"""
+
+COLUMNS = ('created_at', 'content_hash', 'endpoint', 'options', 'tier', 'model_version',
+           'verdict', 'fake_prob', 'success', 'seconds', 'filename', 'output')
+FILTERS = ('content_hash', 'endpoint', 'model_version', 'verdict')
+MAX_PAGE_SIZE = 500
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL + NORMAL: a crash can lose the last commits, never corrupt the file
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class HistoryStore:
+    def __init__(self, path, batch_size=256, flush_seconds=0.5, queue_size=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.counters = {'written': 0, 'dropped': 0, 'batches': 0}
+        self.lock = threading.Lock()
+
+        with connect(path) as conn:
+            conn.executescript(SCHEMA)
+        # One connection per reading thread; the writer has its own
+        self.local = threading.local()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def record(self, **row):
+        """Queue one analysis row (keys from COLUMNS; created_at is set when it is written)"""
+        try:
+            self.queue.put_nowait(tuple(row.get(column) for column in COLUMNS[1:]))
+        except queue.Full:
+            with self.lock:
+                self.counters['dropped'] += 1
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        insert = f"INSERT INTO analyses ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+        # Ids are assigned here, so created_at is too, and never steps back
+        # even if the clock does: a time window is then an id range (query)
+        last = conn.execute("SELECT MAX(created_at) FROM analyses").fetchone()[0] or 0.0
+        while True:
+            rows = [self.queue.get()]
+            if rows[0] is None:
+                break
+            # Gather whatever else arrives within flush_seconds, up to a batch
+            deadline = time.monotonic() + self.flush_seconds
+            stop = False
+            while len(rows) < self.batch_size:
+                try:
+                    row = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                rows.append(row)
+            last = max(time.time(), last)
+            with conn:
+                conn.executemany(insert, [(last, *row) for row in rows])
+            with self.lock:
+                self.counters['written'] += len(rows)
+                self.counters['batches'] += 1
+            if stop:
+                break
+        conn.close()
+
+    def _reader(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = connect(self.path)
+        return conn
+
+    def query(self, filters=None, since=None, until=None, cursor=None, limit=50, include_output=False):
+        """Newest-first page of rows; returns (rows, cursor for the next page or None)"""
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+        for column, value in (filters or {}).items():
+            if column not in FILTERS:
+                raise ValueError(f"Unknown filter: {column}")
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        conn = self._reader()
+        # Rows are stamped in id order, so a time window is an id range;
+        # bounding the id keeps every filtered page an index range scan. The
+        # unary + stops SQLite from using the created_at index for the exact
+        # (rechecked) comparison instead.
+        for bound, op, value in (('id >= ?', '+created_at >= ?', since), ('id < ?', '+created_at < ?', until)):
+            if value is None:
+                continue
+            first = conn.execute("SELECT id FROM analyses WHERE created_at >= ? ORDER BY created_at, id LIMIT 1",
+                                 (float(value),)).fetchone()
+            if first is None:
+                if bound == 'id >= ?':
+                    return [], None  # window starts after the newest row
+                continue
+            clauses.extend((bound, op))
+            params.extend((first['id'], float(value)))
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+        columns = ('id',) + tuple(c for c in COLUMNS if include_output or c != 'output')
+        sql = (f"SELECT {', '.join(columns)} FROM analyses"
+               f"{' WHERE ' + ' AND '.join(clauses) if clauses else ''}"
+               " ORDER BY id DESC LIMIT ?")
+        rows = [dict(row) for row in conn.execute(sql, (*params, limit + 1))]
+        next_cursor = rows[limit - 1]['id'] if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def summary(self, content_hash):
+        """What each endpoint / model version said about a file: counts and the latest verdict"""
+        rows = self._reader().execute("""
+            SELECT endpoint, options, model_version, COUNT(*) AS analyses,
+                   MIN(created_at) AS first_seen, MAX(created_at) AS last_seen,
+                   (SELECT verdict FROM analyses AS latest
+                    WHERE latest.content_hash = a.content_hash AND latest.endpoint = a.endpoint
+                      AND latest.options = a.options AND latest.model_version IS a.model_version
+                    ORDER BY latest.id DESC LIMIT 1) AS verdict,
+                   (SELECT fake_prob FROM analyses AS latest
+                    WHERE latest.content_hash = a.content_hash AND latest.endpoint = a.endpoint
+                      AND latest.options = a.options AND latest.model_version IS a.model_version
+                    ORDER BY latest.id DESC LIMIT 1) AS fake_prob
+            FROM analyses AS a
+            WHERE content_hash = ?
+            GROUP BY endpoint, options, model_version
+            ORDER BY last_seen DESC
+        """, (content_hash,))
+        return [dict(row) for row in rows]
+
+    def lookup(self, content_hash, endpoint, options, tier, model_version):
+        """Latest successful output for exactly this analysis, or None"""
+        row = self._reader().execute("""
+            SELECT output FROM analyses
+            WHERE content_hash = ? AND endpoint = ? AND options = ? AND tier = ?
+              AND model_version IS ? AND success = 1
+            ORDER BY id DESC LIMIT 1
+        """, (content_hash, endpoint, options, tier, model_version)).fetchone()
+        return row['output'] if row is not None else None
+
+    def stats(self):
+        with self.lock:
+            return {**self.counters, 'queued': self.queue.qsize()}
+
+    def close(self):
+        """Flush queued rows and stop the writer"""
+        self.queue.put(None)
+        self.writer.join()
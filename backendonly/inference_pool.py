@@ -0,0 +1,339 @@
+"""
+Pre-forked model worker processes.
+
+Each worker is pinned to its own CPU set and sizes the torch / TensorFlow
+thread pools to match, so workers do not oversubscribe each other.
+Preprocessed inputs are handed over through shared memory; only the block
+name, shape and dtype travel over the task queue. Model hot-swaps go to
+every worker over its own control queue and are loaded and warmed by a
+side thread while the worker keeps serving batches; no worker switches
+until every one of them has the new model ready.
+
+Each worker has its own task and result queues, so the parent knows which
+jobs every worker holds. A worker that dies (OOM kill, segfault in native
+code) is noticed by its collector thread within liveness_seconds: the jobs
+it held fail with an error instead of hanging, and a replacement worker is
+started on the same CPU set with the currently swapped-in weights.
+"""
+import itertools
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+from concurrent.futures import Future
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from detectors import DETECTORS
+from model_registry import ModelRegistry
+
+
+def parse_cpu_sets(spec):
+    """Parse "0-3;4-7;8,10" into [{0, 1, 2, 3}, {4, 5, 6, 7}, {8, 10}]"""
+    if not spec:
+        return None
+    cpu_sets = []
+    for group in spec.split(';'):
+        cpus = set()
+        for part in group.split(','):
+            if '-' in part:
+                first, last = part.split('-')
+                cpus.update(range(int(first), int(last) + 1))
+            elif part.strip():
+                cpus.add(int(part))
+        cpu_sets.append(cpus)
+    return cpu_sets
+
+
+def default_cpu_sets(num_workers, threads_per_worker):
+    """Give each worker its own contiguous block of the CPUs we may run on"""
+    cpus = sorted(os.sched_getaffinity(0))
+    return [
+        {cpus[(i * threads_per_worker + j) % len(cpus)] for j in range(threads_per_worker)}
+        for i in range(num_workers)
+    ]
+
+
+def configure_threads(num_threads, use_tensorflow=True):
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(num_threads)
+
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+
+    if use_tensorflow:
+        try:
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(num_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(1)
+        except (ImportError, RuntimeError):
+            pass
+
+
+def attach_shared_memory(name):
+    """Attach to a block owned by the parent without taking over its cleanup"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the block with the resource tracker.
+        # Workers share the parent's tracker (InferencePool starts it before
+        # forking), where this is a no-op: the parent's unlink unregisters it.
+        return shared_memory.SharedMemory(name=name)
+
+
+def control_loop(models, control, results):
+    """Apply model swaps sent by InferencePool.swap, next to the batches being served
+
+    A swap arrives in two steps: 'prepare' loads and warms the new model,
+    then 'commit' serves it or 'abort' drops it.
+    """
+    prepared = {}  # name -> ModelEntry loaded by 'prepare'
+    while True:
+        message = control.get()
+        if message is None:
+            break
+        job_id, step, name, weights = message
+        try:
+            entry = prepared.pop(name, None)
+            if entry is not None and step != 'commit':
+                models.discard(name, entry)
+            if step == 'prepare':
+                prepared[name] = models.prepare(name, weights)
+                output = {'name': name, 'version': prepared[name].version}
+            elif step == 'commit' and entry is not None:
+                output = models.commit(name, entry, weights)
+            elif step == 'commit':
+                # A replacement started after the prepare step is already on these weights
+                output = models.swap(name, weights, load_if_absent=False)
+            else:
+                output = None
+            results.put((job_id, True, output))
+        except Exception as e:
+            results.put((job_id, False, f"{type(e).__name__}: {e}"))
+
+
+def worker_main(cpu_set, num_threads, detector_names, tasks, results, registry_options, control, weights):
+    if cpu_set:
+        os.sched_setaffinity(0, cpu_set)
+    configure_threads(num_threads, use_tensorflow='forged-image' in detector_names)
+
+    models = ModelRegistry(**registry_options)
+    # A replacement worker starts on the weights swapped in since the pool started
+    for name, model_weights in weights.items():
+        models.swap(name, model_weights, load_if_absent=False)
+    threading.Thread(target=control_loop, args=(models, control, results), daemon=True).start()
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+
+        job_id, name, shm_name, shape, dtype = task
+        try:
+            detector = DETECTORS[name]
+            shm = attach_shared_memory(shm_name)
+            try:
+                batch = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                with models.lease(name) as model:
+                    output = detector.infer(model, batch)
+                del batch
+            finally:
+                shm.close()
+            results.put((job_id, True, output))
+        except Exception as e:
+            results.put((job_id, False, f"{type(e).__name__}: {e}"))
+
+
+class WorkerSlot:
+    """One worker process and the queues only it reads and writes"""
+
+    def __init__(self, index, cpu_set):
+        self.index = index
+        self.cpu_set = cpu_set
+        self.process = None
+        self.tasks = self.control = self.results = None
+        self.jobs = set()  # ids of jobs sent to this worker and not answered yet
+        self.restarts = 0
+
+
+class InferencePool:
+    """Fork num_workers model processes and dispatch batches to them
+
+    registry_options are ModelRegistry arguments; each worker keeps its own
+    models, so the memory budget applies per worker. timeout is how long
+    callers should wait on a future (None = forever), for a worker that is
+    alive but stuck.
+    """
+
+    def __init__(self, detector_names, num_workers, threads_per_worker=1, cpu_sets=None,
+                 registry_options=None, timeout=None, liveness_seconds=1.0):
+        self.detector_names = list(detector_names)
+        self.threads_per_worker = threads_per_worker
+        self.registry_options = registry_options or {}
+        self.timeout = timeout
+        self.liveness_seconds = liveness_seconds
+        self.pending = {}  # job id -> (future, shared memory block or None, slot)
+        self.lock = threading.Lock()
+        self.job_ids = itertools.count()
+        # Version each model is serving, and the weights swapped in; workers
+        # load the detector's own file until the first swap
+        self.versions = {name: DETECTORS[name].model_version() for name in detector_names}
+        self.weights = {}
+        self.swap_lock = threading.Lock()
+        self.closing = False
+
+        if cpu_sets is None:
+            cpu_sets = default_cpu_sets(num_workers, threads_per_worker)
+        self.slots = [WorkerSlot(i, cpu_sets[i % len(cpu_sets)]) for i in range(num_workers)]
+
+        # Fork before starting any thread in this process. Workers, replacements
+        # included, share one resource tracker, so attaching to a block never
+        # hands its cleanup to a worker.
+        resource_tracker.ensure_running()
+        context = mp.get_context('fork')
+        for slot in self.slots:
+            self._start_worker(slot, context)
+
+        self.collectors = [threading.Thread(target=self._collect, args=(slot,), daemon=True) for slot in self.slots]
+        for collector in self.collectors:
+            collector.start()
+
+    def _start_worker(self, slot, context):
+        # Fresh queues: a worker killed mid-get or mid-put can leave a queue's lock held
+        slot.tasks, slot.control, slot.results = context.Queue(), context.Queue(), context.Queue()
+        slot.process = context.Process(
+            target=worker_main,
+            args=(slot.cpu_set, self.threads_per_worker, self.detector_names, slot.tasks, slot.results,
+                  self.registry_options, slot.control, dict(self.weights)),
+            daemon=True)
+        slot.process.start()
+
+    def submit(self, name, batch):
+        """Queue a batch for detector name; the future resolves to one result per row"""
+        batch = np.ascontiguousarray(batch)
+        shm = shared_memory.SharedMemory(create=True, size=max(batch.nbytes, 1))
+        view = np.ndarray(batch.shape, dtype=batch.dtype, buffer=shm.buf)
+        view[...] = batch
+        del view
+
+        future = Future()
+        with self.lock:
+            job_id = next(self.job_ids)
+            # The worker with the fewest jobs in hand
+            slot = min(self.slots, key=lambda slot: len(slot.jobs))
+            self.pending[job_id] = (future, shm, slot)
+            slot.jobs.add(job_id)
+            tasks = slot.tasks
+        tasks.put((job_id, name, shm.name, batch.shape, batch.dtype.str))
+        return future
+
+    def swap(self, name, weights=None):
+        """Hot-swap name in every worker; returns once all of them serve the new model
+
+        Every worker loads and warms the new model before any of them
+        switches. If one fails, the others drop theirs and the error is
+        raised, so the pool keeps serving the previous version everywhere.
+        """
+        with self.swap_lock:
+            prepared = [self._outcome(future) for future in self._control('prepare', name, weights)]
+            failures = [outcome for outcome in prepared if isinstance(outcome, Exception)]
+            if failures:
+                # Queued behind the prepare step, so a worker that timed out drops it too
+                self._control('abort', name, weights)
+                raise failures[0]
+
+            # Workers replaced from here on start on the new weights
+            self.weights[name] = weights
+            self.versions[name] = prepared[0]['version']
+            results = [self._outcome(future) for future in self._control('commit', name, weights)]
+            failures = [outcome for outcome in results if isinstance(outcome, Exception)]
+            if failures:
+                raise RuntimeError(f"{len(failures)} worker(s) did not confirm the switch to "
+                                   f"{name} {self.versions[name]}: {failures[0]}")
+            return results
+
+    def _control(self, step, name, weights):
+        """Send one swap step to every worker; returns a future per worker"""
+        futures = []
+        for slot in self.slots:
+            future = Future()
+            with self.lock:
+                job_id = next(self.job_ids)
+                self.pending[job_id] = (future, None, slot)
+                slot.jobs.add(job_id)
+                control = slot.control
+            control.put((job_id, step, name, weights))
+            futures.append(future)
+        return futures
+
+    def _outcome(self, future):
+        try:
+            return future.result(timeout=self.timeout)
+        except Exception as e:
+            return e
+
+    def model_version(self, name):
+        return self.versions.get(name)
+
+    def _collect(self, slot):
+        while True:
+            try:
+                item = slot.results.get(timeout=self.liveness_seconds)
+            except queue.Empty:
+                if not self.closing and not slot.process.is_alive():
+                    self._replace(slot)
+                continue
+            if item is None:
+                break
+
+            job_id, ok, output = item
+            with self.lock:
+                future, shm, _ = self.pending.pop(job_id)
+                slot.jobs.discard(job_id)
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+            if ok:
+                future.set_result(output)
+            else:
+                future.set_exception(RuntimeError(output))
+
+    def _replace(self, slot):
+        """Fail the jobs a dead worker held and start a new one in its place"""
+        exitcode = slot.process.exitcode
+        with self.lock:
+            lost = [self.pending.pop(job_id) for job_id in slot.jobs]
+            slot.jobs.clear()
+            slot.restarts += 1
+            # The parent has threads by now, so the replacement comes from a
+            # clean forkserver process rather than a fork of this one
+            self._start_worker(slot, mp.get_context('forkserver'))
+        print(f"Inference worker {slot.index} died (exit code {exitcode}); "
+              f"failed {len(lost)} job(s) and started a replacement", file=sys.stderr)
+        for future, shm, _ in lost:
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+            future.set_exception(RuntimeError(f"Inference worker died (exit code {exitcode})"))
+
+    def stats(self):
+        with self.lock:
+            return [{'pid': slot.process.pid, 'alive': slot.process.is_alive(), 'jobs': len(slot.jobs),
+                     'restarts': slot.restarts} for slot in self.slots]
+
+    def close(self):
+        self.closing = True
+        for slot in self.slots:
+            slot.control.put(None)
+            slot.tasks.put(None)
+        for slot in self.slots:
+            slot.process.join()
+            slot.results.put(None)
+        for collector in self.collectors:
+            collector.join()
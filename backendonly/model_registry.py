@@ -0,0 +1,288 @@
+"""
+Loaded models by detector name, kept under a RAM budget.
+
+Models are loaded on first use. Each load is timed and its footprint is
+taken as the growth of the process RSS during the load (TF / torch runtime
+allocations included), which is remembered across evictions so a reload
+can make room up front. Loads are measured one at a time, so two models
+loading at once do not both claim the same growth. When resident models
+exceed the budget the least recently used unpinned, unleased model is
+evicted ('lfu' evicts the least used one instead, ties broken by recency).
+A retired model still counts against the budget until it is unloaded.
+
+Callers hold a model through lease(); a model that is evicted or swapped
+out while leased is unloaded only when its last lease is released, so
+batches already running finish on it. swap() loads new weights next to the
+current model, warms them up with dummy batches and then switches new
+leases over in one step, so a weights update needs no restart and no
+request sees a cold model.
+"""
+import ctypes
+import ctypes.util
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from detectors import DETECTORS
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def current_rss():
+    """Resident set size of this process in bytes"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def release_free_memory():
+    """Hand freed heap pages back to the OS so the RSS actually drops (glibc only)"""
+    gc.collect()
+    libc_name = ctypes.util.find_library('c')
+    if libc_name:
+        try:
+            ctypes.CDLL(libc_name).malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class ModelEntry:
+    def __init__(self, model, footprint, version=None):
+        self.model = model
+        self.footprint = footprint
+        self.version = version
+        self.uses = 0
+        self.leases = 0
+        self.retired = False  # evicted or swapped out; unloaded when leases drops to 0
+        self.warm_seconds = None  # set by prepare()
+
+
+class ModelRegistry:
+    def __init__(self, budget_mb=0, pinned=(), policy='lru'):
+        if policy not in ('lru', 'lfu'):
+            raise ValueError(f"unknown eviction policy: {policy}")
+        self.budget = int(budget_mb * 2**20)  # 0 = unlimited
+        self.pinned = set(pinned)
+        self.policy = policy
+        self.entries = OrderedDict()  # name -> ModelEntry, least recently used first
+        self.footprints = {}  # name -> last measured footprint, survives eviction
+        self.weights = {}  # name -> weights installed by swap(), used for reloads
+        self.retiring = []  # (name, entry) swapped out or evicted while leased
+        self.load_locks = {}
+        self.measure_lock = threading.Lock()  # one RSS-measured load at a time
+        self.lock = threading.Lock()
+        self.counters = {'loads': 0, 'hits': 0, 'evictions': 0, 'swaps': 0}
+        self.load_seconds = {}  # name -> latency of the most recent load
+
+    def get(self, name):
+        """The loaded model for detector name, loading (and evicting) as needed"""
+        return self._entry(name).model
+
+    @contextmanager
+    def lease(self, name):
+        """The current model for name, kept loaded until the block exits even if swapped out"""
+        entry = self._entry(name, lease=True)
+        try:
+            yield entry.model
+        finally:
+            with self.lock:
+                entry.leases -= 1
+                drained = self._drain()
+            if drained:
+                release_free_memory()
+
+    def version(self, name):
+        """Version of the model new leases of name get (or would get, once loaded)"""
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None:
+                return entry.version
+            weights = self.weights.get(name)
+        return DETECTORS[name].model_version(weights)
+
+    def _entry(self, name, lease=False):
+        with self.lock:
+            entry = self._hit(name, lease)
+            if entry is not None:
+                return entry
+            load_lock = self._load_lock(name)
+
+        # One load per model at a time; other models stay available meanwhile
+        with load_lock:
+            with self.lock:
+                entry = self._hit(name, lease)
+                if entry is not None:
+                    return entry
+                evicted = self._make_room(self.footprints.get(name, 0))
+                weights = self.weights.get(name)
+            if evicted:
+                release_free_memory()
+
+            entry = self._load(name, weights)
+            with self.lock:
+                entry.uses = 1
+                entry.leases = int(lease)
+                self.entries[name] = entry
+                self.counters['loads'] += 1
+                evicted = self._make_room(0, keep=name)
+            if evicted:
+                release_free_memory()
+            return entry
+
+    def swap(self, name, weights=None, load_if_absent=True):
+        """Switch name to a warmed-up model loaded from weights (default: the detector's file)
+
+        Leases taken before the switch keep the old model until they end;
+        the old model is unloaded after the last one. With load_if_absent
+        False a model that is not resident is not loaded, only pointed at
+        the new weights for its next load.
+        """
+        with self._load_lock(name):
+            with self.lock:
+                if name not in self.entries and not load_if_absent:
+                    self.weights[name] = weights
+                    return {'name': name, 'version': DETECTORS[name].model_version(weights),
+                            'previous_version': None, 'loaded': False}
+            return self._commit(name, self._prepare(name, weights), weights)
+
+    def prepare(self, name, weights=None):
+        """The first half of swap(): a warmed-up model from weights, not yet served
+
+        Pass it to commit() to switch to it or to discard() to drop it, so a
+        caller holding several registries can switch all of them or none.
+        """
+        with self._load_lock(name):
+            return self._prepare(name, weights)
+
+    def commit(self, name, entry, weights=None):
+        """The second half of swap(): serve a model from prepare(); returns what swap() does"""
+        with self._load_lock(name):
+            return self._commit(name, entry, weights)
+
+    def discard(self, name, entry):
+        """Unload a model from prepare() that will not be committed"""
+        DETECTORS[name].unload(entry.model)
+        release_free_memory()
+
+    def _prepare(self, name, weights):
+        entry = self._load(name, weights)
+        start = time.perf_counter()
+        DETECTORS[name].warm(entry.model)
+        entry.warm_seconds = time.perf_counter() - start
+        return entry
+
+    def _commit(self, name, entry, weights):
+        with self.lock:
+            old = self.entries.pop(name, None)
+            self.entries[name] = entry
+            self.weights[name] = weights
+            self.counters['swaps'] += 1
+            if old is not None:
+                entry.uses = old.uses
+                self._retire(name, old)
+            drained = self._drain()
+            evicted = self._make_room(0, keep=name)
+        if drained or evicted:
+            release_free_memory()
+        return {
+            'name': name,
+            'version': entry.version,
+            'previous_version': old.version if old is not None else None,
+            'loaded': True,
+            'load_seconds': self.load_seconds[name],
+            'warm_seconds': entry.warm_seconds,
+        }
+
+    def _load_lock(self, name):
+        # dict.setdefault is atomic, so this is safe with or without self.lock held
+        return self.load_locks.setdefault(name, threading.Lock())
+
+    def _load(self, name, weights):
+        detector = DETECTORS[name]
+        # Fingerprint before loading: if the file changes mid-load, the next swap picks it up
+        version = detector.model_version(weights)
+        with self.measure_lock:
+            rss_before = current_rss()
+            start = time.perf_counter()
+            model = detector.load(weights)
+            load_seconds = time.perf_counter() - start
+            footprint = max(current_rss() - rss_before, 0)
+        with self.lock:
+            self.footprints[name] = footprint
+            self.load_seconds[name] = load_seconds
+        return ModelEntry(model, footprint, version)
+
+    def resident_bytes(self):
+        # Retired models stay in memory until their last lease ends
+        return (sum(entry.footprint for entry in self.entries.values())
+                + sum(entry.footprint for _, entry in self.retiring))
+
+    def _hit(self, name, lease=False):
+        entry = self.entries.get(name)
+        if entry is not None:
+            self.entries.move_to_end(name)
+            entry.uses += 1
+            entry.leases += int(lease)
+            self.counters['hits'] += 1
+        return entry
+
+    def _retire(self, name, entry):
+        entry.retired = True
+        self.retiring.append((name, entry))
+
+    def _drain(self):
+        """Unload retired models nobody holds any more; returns whether any was unloaded"""
+        drained = [(name, entry) for name, entry in self.retiring if entry.leases == 0]
+        if drained:
+            self.retiring = [item for item in self.retiring if item[1].leases]
+            for name, entry in drained:
+                DETECTORS[name].unload(entry.model)
+        return bool(drained)
+
+    def _victim(self, keep):
+        # Evicting a leased model frees nothing until its batches finish
+        candidates = [name for name, entry in self.entries.items()
+                      if name not in self.pinned and name != keep and not entry.leases]
+        if not candidates:
+            return None
+        if self.policy == 'lfu':
+            # min() keeps the first (least recent) of equally used models
+            return min(candidates, key=lambda name: self.entries[name].uses)
+        return candidates[0]
+
+    def _make_room(self, needed, keep=None):
+        """Evict until needed more bytes fit in the budget; returns the evicted names"""
+        evicted = []
+        while self.budget and self.resident_bytes() + needed > self.budget:
+            name = self._victim(keep)
+            if name is None:
+                break  # only pinned / leased models left: run over budget
+            self._retire(name, self.entries.pop(name))
+            self.counters['evictions'] += 1
+            evicted.append(name)
+        self._drain()
+        return evicted
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                'policy': self.policy,
+                'budget_mb': self.budget / 2**20,
+                'resident_mb': self.resident_bytes() / 2**20,
+                'resident': {
+                    name: {
+                        'footprint_mb': entry.footprint / 2**20,
+                        'uses': entry.uses,
+                        'leases': entry.leases,
+                        'version': entry.version,
+                        'pinned': name in self.pinned,
+                    }
+                    for name, entry in self.entries.items()
+                },
+                'draining': [{'name': name, 'version': entry.version, 'leases': entry.leases}
+                             for name, entry in self.retiring],
+                'last_load_seconds': dict(self.load_seconds),
+            }
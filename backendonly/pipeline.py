@@ -0,0 +1,318 @@
+"""
+Staged analysis pipeline: decode -> preprocess -> model.
+
+Each stage is a thread pool reading from a bounded queue, so decoding one
+request, preprocessing another and running the model on a third happen at
+the same time, and a slow stage pushes back on the stages before it.
+Every stage reports its own utilization so the pools can be sized to
+match the bottleneck.
+
+Jobs belong to a priority lane ('interactive' or 'bulk'). Every stage
+queue is a LaneQueue: each lane has its own bound, so a full bulk backlog
+never blocks interactive submissions, and workers take jobs from the lanes
+by weighted fair sharing. Batches are never interrupted; an interactive job
+overtakes queued bulk work at the next batch boundary.
+"""
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from detectors import DETECTORS
+from model_registry import ModelRegistry
+
+LANES = ('interactive', 'bulk')
+DEFAULT_LANE_WEIGHTS = {'interactive': 8, 'bulk': 1}
+
+
+def parse_lane_weights(spec):
+    """'interactive=8,bulk=1' -> {'interactive': 8.0, 'bulk': 1.0}"""
+    weights = dict(DEFAULT_LANE_WEIGHTS)
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        lane, separator, weight = item.partition('=')
+        lane = lane.strip()
+        if not separator:
+            raise ValueError(f"Invalid lane weight {item.strip()!r}: expected lane=weight")
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane {lane!r} in lane weights (lanes: {', '.join(LANES)})")
+        try:
+            weights[lane] = float(weight)
+        except ValueError:
+            raise ValueError(f"Invalid weight for lane {lane!r}: {weight.strip()!r}")
+        # A lane's turn comes every 1/weight passes, so the weight must be positive
+        if not weights[lane] > 0 or weights[lane] == float('inf'):
+            raise ValueError(f"Weight for lane {lane!r} must be a positive number, got {weight.strip()}")
+    return weights
+
+
+class PreprocessError(Exception):
+    """Decode/prepare failed; the message is the output the detector script would print"""
+
+
+class Job:
+    def __init__(self, detector_name, path, tier='full', lane='interactive'):
+        self.detector_name = detector_name
+        self.tier = tier
+        self.lane = lane
+        self.submitted_at = time.perf_counter()
+        self.detector = DETECTORS[detector_name]
+        self.path = path
+        self.decoded = None
+        self.sample = None
+        self.future = Future()
+
+
+class LaneQueue:
+    """Bounded per-lane queues drained by weighted fair sharing (stride scheduling)
+
+    Each get() serves the non-empty lane with the lowest pass value and
+    advances that lane by 1/weight, so backlogged lanes are served in
+    proportion to their weights and an idle lane banks no credit. None
+    (the stage shutdown marker) is returned only once every lane is empty.
+    """
+
+    def __init__(self, maxsize, weights):
+        self.maxsize = maxsize
+        self.weights = weights
+        self.lanes = {lane: deque() for lane in weights}
+        self.passes = dict.fromkeys(weights, 0.0)
+        self.stops = 0
+        self.condition = threading.Condition()
+
+    def put(self, job):
+        with self.condition:
+            if job is None:
+                self.stops += 1
+            else:
+                lane = self.lanes[job.lane]
+                while len(lane) >= self.maxsize:
+                    self.condition.wait()
+                if not lane:
+                    # An idle lane rejoins at the current virtual time
+                    busy = [self.passes[name] for name, jobs in self.lanes.items() if jobs]
+                    if busy:
+                        self.passes[job.lane] = max(self.passes[job.lane], min(busy))
+                lane.append(job)
+            self.condition.notify_all()
+
+    def _pop(self):
+        ready = [name for name, jobs in self.lanes.items() if jobs]
+        if not ready:
+            self.stops -= 1
+            return None
+        name = min(ready, key=lambda lane: self.passes[lane])
+        self.passes[name] += 1.0 / self.weights[name]
+        self.condition.notify_all()
+        return self.lanes[name].popleft()
+
+    def get(self):
+        with self.condition:
+            while not self.stops and not any(self.lanes.values()):
+                self.condition.wait()
+            return self._pop()
+
+    def get_nowait(self):
+        with self.condition:
+            if not self.stops and not any(self.lanes.values()):
+                raise queue.Empty
+            return self._pop()
+
+    def qsize(self):
+        with self.condition:
+            return sum(len(jobs) for jobs in self.lanes.values())
+
+    def lane_sizes(self):
+        with self.condition:
+            return {name: len(jobs) for name, jobs in self.lanes.items()}
+
+
+class Stage:
+    """A pool of threads pulling jobs from a lane-aware bounded queue"""
+
+    def __init__(self, name, num_threads, queue_size, handler, next_stage=None, batch_size=1,
+                 lane_weights=None):
+        self.name = name
+        self.num_threads = num_threads
+        self.queue = LaneQueue(queue_size, lane_weights or DEFAULT_LANE_WEIGHTS)
+        self.handler = handler
+        self.next_stage = next_stage
+        self.batch_size = batch_size
+
+        self.lock = threading.Lock()
+        self.busy_seconds = 0.0
+        self.processed = 0
+        self.started_at = time.perf_counter()
+
+        self.threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(num_threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def put(self, job):
+        # Blocks while the queue is full, pushing back on the stage before us
+        self.queue.put(job)
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+
+            jobs = [job]
+            while len(jobs) < self.batch_size:
+                try:
+                    job = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    self.queue.put(None)
+                    break
+                jobs.append(job)
+
+            start = time.perf_counter()
+            forward = self.handler(jobs)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.busy_seconds += elapsed
+                self.processed += len(jobs)
+
+            # Time spent blocked on a full downstream queue is not counted as busy
+            if self.next_stage is not None:
+                for job in forward:
+                    self.next_stage.put(job)
+
+    def stats(self):
+        with self.lock:
+            wall = time.perf_counter() - self.started_at
+            return {
+                'threads': self.num_threads,
+                'queue_depth': self.queue.qsize(),
+                'lane_queue_depth': self.queue.lane_sizes(),
+                'processed': self.processed,
+                'utilization': self.busy_seconds / (wall * self.num_threads) if wall > 0 else 0.0,
+            }
+
+    def close(self):
+        for _ in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+
+
+class AnalysisPipeline:
+    def __init__(self, decode_threads=4, preprocess_threads=4, queue_size=32,
+                 max_batch=8, inference_pool=None, model_threads=1, model_registry=None,
+                 lane_weights=None):
+        self.inference_pool = inference_pool
+        self.model_registry = model_registry or ModelRegistry()
+        lane_weights = lane_weights or DEFAULT_LANE_WEIGHTS
+
+        self.model_stage = Stage('model', model_threads, queue_size, self._infer,
+                                 batch_size=max_batch, lane_weights=lane_weights)
+        self.preprocess_stage = Stage('preprocess', preprocess_threads, queue_size,
+                                      self._prepare, next_stage=self.model_stage,
+                                      lane_weights=lane_weights)
+        self.decode_stage = Stage('decode', decode_threads, queue_size, self._decode,
+                                  next_stage=self.preprocess_stage, lane_weights=lane_weights)
+        self.stages = [self.decode_stage, self.preprocess_stage, self.model_stage]
+
+        # Recent submit-to-result latencies per lane
+        self.lane_latencies = {lane: deque(maxlen=1000) for lane in lane_weights}
+        self.lane_completed = dict.fromkeys(lane_weights, 0)
+        self.lane_lock = threading.Lock()
+
+    def submit(self, detector_name, path, tier='full', lane='interactive'):
+        """Queue path for analysis; the future resolves to the raw model result"""
+        job = Job(detector_name, path, tier, lane)
+        job.future.add_done_callback(lambda _: self._record_latency(job))
+        self.decode_stage.put(job)
+        return job.future
+
+    def _record_latency(self, job):
+        with self.lane_lock:
+            self.lane_latencies[job.lane].append(time.perf_counter() - job.submitted_at)
+            self.lane_completed[job.lane] += 1
+
+    def lane_stats(self):
+        with self.lane_lock:
+            stats = {}
+            for lane, latencies in self.lane_latencies.items():
+                values = np.array(latencies) * 1000
+                stats[lane] = {
+                    'completed': self.lane_completed[lane],
+                    'queued': sum(stage.queue.lane_sizes()[lane] for stage in self.stages),
+                    **{
+                        f'p{q}_ms': float(np.percentile(values, q)) if len(values) else 0.0
+                        for q in (50, 95, 99)
+                    },
+                }
+            return stats
+
+    def stats(self):
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def close(self):
+        for stage in self.stages:
+            stage.close()
+
+    def _decode(self, jobs):
+        forward = []
+        for job in jobs:
+            try:
+                job.decoded = job.detector.decode(job.path, job.tier)
+                forward.append(job)
+            except Exception as e:
+                job.future.set_exception(PreprocessError(job.detector.error_output(e)))
+        return forward
+
+    def _prepare(self, jobs):
+        forward = []
+        for job in jobs:
+            try:
+                job.sample = job.detector.prepare(job.decoded)
+                job.decoded = None
+                forward.append(job)
+            except Exception as e:
+                job.future.set_exception(PreprocessError(job.detector.error_output(e)))
+        return forward
+
+    def swap_model(self, detector_name, weights=None):
+        """Hot-swap a model (see ModelRegistry.swap); returns one result per model holder"""
+        if self.inference_pool is not None:
+            return self.inference_pool.swap(detector_name, weights)
+        return [self.model_registry.swap(detector_name, weights)]
+
+    def model_version(self, detector_name):
+        if self.inference_pool is not None:
+            return self.inference_pool.model_version(detector_name)
+        return self.model_registry.version(detector_name)
+
+    def _infer(self, jobs):
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job.detector_name, []).append(job)
+
+        for detector_name, group in groups.items():
+            try:
+                batch = np.stack([job.sample for job in group])
+                if self.inference_pool is not None:
+                    future = self.inference_pool.submit(detector_name, batch)
+                    results = future.result(timeout=self.inference_pool.timeout)
+                else:
+                    with self.model_registry.lease(detector_name) as model:
+                        results = DETECTORS[detector_name].infer(model, batch)
+            except Exception as e:
+                for job in group:
+                    job.future.set_exception(e)
+                continue
+
+            for job, result in zip(group, results):
+                job.future.set_result(result)
+        return []
@@ -0,0 +1,96 @@
+"""
+Load-aware analysis tiers.
+
+Every endpoint has a 'full' tier and a cheaper 'degraded' one:
+    ai-image      JPEG decoded at reduced resolution (PIL draft mode); with
+                  mode=frames, at most 4 frames scored instead of 16
+    forged-image  single 128x128 ELA pass instead of tiling (mode=tiled only)
+    audio         only the centre window of the file is decoded and trimmed
+
+A TierController per endpoint watches the requests in flight and the p95
+latency of recent requests. It switches to 'degraded' as soon as either
+crosses its high mark, and back to 'full' only after both have stayed below
+their low marks for hold_seconds, so it does not flap at the boundary.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+TIERS = ('full', 'degraded')
+
+
+def tier_args(endpoint, extra_args, tier):
+    """Script arguments for running endpoint at tier, or None if the tier makes no difference"""
+    if tier == 'full':
+        return list(extra_args)
+    if endpoint in ('forged-image', 'image'):
+        return [arg for arg in extra_args if arg != '--tiled'] if '--tiled' in extra_args else None
+    return [*extra_args, '--fast']
+
+
+class TierController:
+    def __init__(self, slo_ms=0, high_depth=8, low_depth=2, window_seconds=30.0, hold_seconds=10.0):
+        self.slo = slo_ms / 1000.0  # 0 disables switching: always 'full'
+        self.high_depth = high_depth
+        self.low_depth = low_depth
+        self.window_seconds = window_seconds
+        self.hold_seconds = hold_seconds
+        self.tier = 'full'
+        self.in_flight = 0
+        self.latencies = deque()  # (finished at, seconds)
+        self.calm_since = None
+        self.switches = 0
+        self.served = dict.fromkeys(TIERS, 0)
+        self.lock = threading.Lock()
+
+    def begin(self):
+        """Register a request; returns the tier it should run at"""
+        with self.lock:
+            self.in_flight += 1
+            self._update(time.monotonic())
+            return self.tier
+
+    def end(self, tier, seconds):
+        with self.lock:
+            now = time.monotonic()
+            self.in_flight -= 1
+            self.served[tier] += 1
+            self.latencies.append((now, seconds))
+            self._update(now)
+
+    def p95(self, now):
+        while self.latencies and now - self.latencies[0][0] > self.window_seconds:
+            self.latencies.popleft()
+        if not self.latencies:
+            return 0.0
+        return float(np.percentile([seconds for _, seconds in self.latencies], 95))
+
+    def _update(self, now):
+        if not self.slo:
+            return
+        p95 = self.p95(now)
+        if self.tier == 'full':
+            if self.in_flight >= self.high_depth or p95 > 0.8 * self.slo:
+                self.tier = 'degraded'
+                self.switches += 1
+                self.calm_since = None
+        elif self.in_flight <= self.low_depth and p95 < 0.5 * self.slo:
+            if self.calm_since is None:
+                self.calm_since = now
+            elif now - self.calm_since >= self.hold_seconds:
+                self.tier = 'full'
+                self.switches += 1
+        else:
+            self.calm_since = None
+
+    def stats(self):
+        with self.lock:
+            return {
+                'tier': self.tier,
+                'in_flight': self.in_flight,
+                'p95_ms': self.p95(time.monotonic()) * 1000,
+                'switches': self.switches,
+                'served': dict(self.served),
+            }
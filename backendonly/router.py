@@ -0,0 +1,439 @@
+"""
+Request router in front of several server.py instances.
+
+Uploads are routed by consistent hashing on their content hash, so the same
+file always lands on the same node and that node's result cache stays warm.
+Nodes are health-checked through /api/server-info; when a node is down its
+keys fall through to the next node on the ring. Analyses are idempotent, so
+a 5xx answer is also retried on the next node (up to --retries times).
+
+Resumable uploads (/api/upload) live on the node that started them: the
+router prefixes the upload id with a tag naming that node and sends every
+later chunk, status check and commit there. A client that sends the file's
+sha256 when it starts the upload gets the content's ring owner, so the
+commit lands on the node whose result cache holds the file; without it
+the upload starts on a random healthy node. Live audio streams go to one
+healthy node for their whole length and are relayed in both directions at
+once, so verdict lines reach the client while it is still sending audio. /api/history is asked of every node
+and the pages are merged newest first; its cursor holds one position per
+node.
+
+    python router.py --backends http://10.0.0.2:80,http://10.0.0.3:80 --port 8080
+"""
+import argparse
+import bisect
+import hashlib
+import http.client
+import re
+import threading
+import time
+import uuid
+from urllib.parse import urlsplit
+
+import requests
+from flask import Flask, Response, jsonify, request, stream_with_context
+from flask_cors import CORS
+
+# Bytes per read when relaying a streamed request body; small, so live audio is not held back
+STREAM_CHUNK = 4096
+
+
+class HashRing:
+    """Consistent hash ring with virtual nodes"""
+
+    def __init__(self, nodes, replicas=100):
+        self.nodes = list(nodes)
+        points = sorted(
+            (self.hash_key(f"{node}#{i}"), node)
+            for node in self.nodes
+            for i in range(replicas)
+        )
+        self.keys = [point for point, _ in points]
+        self.owners = [node for _, node in points]
+
+    @staticmethod
+    def hash_key(value):
+        return int(hashlib.sha256(value.encode()).hexdigest()[:16], 16)
+
+    def nodes_for(self, content_hash):
+        """Every node, in ring order starting at the owner of content_hash"""
+        if not self.keys:
+            return []
+        start = bisect.bisect(self.keys, int(content_hash[:16], 16))
+        ordered = []
+        for i in range(len(self.keys)):
+            node = self.owners[(start + i) % len(self.keys)]
+            if node not in ordered:
+                ordered.append(node)
+                if len(ordered) == len(self.nodes):
+                    break
+        return ordered
+
+
+def node_tag(backend):
+    """Short stable name for a backend, used to pin upload ids to it"""
+    return hashlib.sha256(backend.encode()).hexdigest()[:8]
+
+
+class Router:
+    def __init__(self, backends, health_interval=5.0, timeout=300.0, retries=1):
+        self.ring = HashRing(backends)
+        self.tags = {node_tag(backend): backend for backend in backends}
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.retries = retries
+        self.healthy = {backend: True for backend in backends}
+        self.lock = threading.Lock()
+        self.metrics = {
+            'requests': 0,
+            'failovers': 0,
+            'retries': 0,
+            'unavailable': 0,
+            'per_backend': {backend: 0 for backend in backends},
+        }
+
+    def start_health_checks(self):
+        thread = threading.Thread(target=self._health_loop, daemon=True)
+        thread.start()
+
+    def _health_loop(self):
+        while True:
+            for backend in self.ring.nodes:
+                self.mark(backend, self.check(backend))
+            time.sleep(self.health_interval)
+
+    def check(self, backend):
+        try:
+            response = requests.get(f"{backend}/api/server-info", timeout=2)
+            return response.status_code == 200 and response.json().get('status') == 'running'
+        except (requests.RequestException, ValueError):
+            return False
+
+    def mark(self, backend, healthy):
+        with self.lock:
+            self.healthy[backend] = healthy
+
+    def candidates(self, content_hash):
+        ordered = self.ring.nodes_for(content_hash)
+        with self.lock:
+            healthy = [node for node in ordered if self.healthy[node]]
+        # If every node looks down, the health view may be stale: try them all
+        return healthy or ordered
+
+    def any_node(self):
+        """Healthy nodes in ring order from a random point, for requests with no content hash"""
+        return self.candidates(uuid.uuid4().hex)
+
+    def upload_nodes(self, content_hash):
+        """Where to start an upload: the ring owner of the client's sha256, if it sent one"""
+        if content_hash and re.fullmatch(r'[0-9a-fA-F]{64}', content_hash):
+            return self.candidates(content_hash.lower())
+        return self.any_node()
+
+    def node_for_upload(self, routed_id):
+        """(backend, backend's upload id) for an upload id handed out by the router"""
+        tag, _, upload_id = routed_id.partition('-')
+        return self.tags.get(tag), upload_id
+
+    def send(self, method, nodes, path, retry=True, **kwargs):
+        """Send to the first of nodes that answers; returns (backend, response), or (None, None)
+
+        A connection error fails over to the next node. With retry (only for
+        idempotent requests) a 5xx answer does too, up to self.retries times.
+        """
+        with self.lock:
+            self.metrics['requests'] += 1
+
+        retries = self.retries if retry else 0
+        answered = None, None
+        for backend in nodes:
+            try:
+                response = requests.request(method, f"{backend}{path}", timeout=self.timeout, **kwargs)
+            except requests.RequestException:
+                self.mark(backend, False)
+                with self.lock:
+                    self.metrics['failovers'] += 1
+                continue
+
+            with self.lock:
+                self.metrics['per_backend'][backend] += 1
+            answered = backend, response
+            if response.status_code < 500 or retries <= 0:
+                return answered
+            retries -= 1
+            with self.lock:
+                self.metrics['retries'] += 1
+
+        if answered[1] is None:
+            with self.lock:
+                self.metrics['unavailable'] += 1
+        return answered
+
+    def forward(self, path, content_hash, filename, data, mimetype, form, headers):
+        _, response = self.send('POST', self.candidates(content_hash), path,
+                                files={'file': (filename, data, mimetype)}, data=form, headers=headers)
+        return response
+
+    def open_stream(self, nodes, path, headers, body):
+        """POST body to the first node that accepts a connection, full duplex
+
+        requests sends the whole body before it reads the response, which
+        would hold back every streamed line until the client stops sending.
+        Here a side thread writes the body in chunked encoding while the
+        caller reads the response. Returns (connection, response) or
+        (None, None); once connected there is no failing over, since the
+        body is consumed as it is relayed.
+        """
+        with self.lock:
+            self.metrics['requests'] += 1
+        for backend in nodes:
+            url = urlsplit(backend)
+            connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+            conn = connection_class(url.netloc, timeout=self.timeout)
+            try:
+                conn.putrequest('POST', path)
+                for name, value in headers.items():
+                    conn.putheader(name, value)
+                conn.putheader('Transfer-Encoding', 'chunked')
+                conn.endheaders()
+            except OSError:
+                conn.close()
+                self.mark(backend, False)
+                with self.lock:
+                    self.metrics['failovers'] += 1
+                continue
+
+            def pump():
+                try:
+                    for data in body:
+                        conn.send(b'%x\r\n%s\r\n' % (len(data), data))
+                    conn.send(b'0\r\n\r\n')
+                except OSError:
+                    pass  # the backend hung up; its response says why
+
+            threading.Thread(target=pump, daemon=True).start()
+            with self.lock:
+                self.metrics['per_backend'][backend] += 1
+            try:
+                return conn, conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                self.mark(backend, False)
+                break
+        with self.lock:
+            self.metrics['unavailable'] += 1
+        return None, None
+
+    def history(self, params, cursor):
+        """One merged newest-first page of every node's /api/history
+
+        cursor maps node tag -> that node's cursor ('' = from the newest row,
+        'end' = nothing left). Returns (rows, next cursor or None, unavailable nodes).
+        """
+        limit = max(1, min(int(params.get('limit', 50)), 500))
+        pages, unavailable = {}, []
+        for tag, backend in self.tags.items():
+            position = cursor.get(tag, '')
+            if position == 'end':
+                continue
+            node_params = {**params, 'limit': limit}
+            if position:
+                node_params['cursor'] = position
+            _, response = self.send('GET', [backend], '/api/history', params=node_params)
+            if response is None or response.status_code >= 500:
+                unavailable.append(backend)
+                continue
+            if response.status_code == 404:
+                cursor[tag] = 'end'  # history disabled on that node
+                continue
+            if response.status_code != 200:
+                raise ValueError(response.json().get('error', 'Invalid history query'))
+            payload = response.json()
+            pages[tag] = (payload['analyses'], payload['next_cursor'])
+
+        merged = sorted(
+            ((row, tag) for tag, (rows, _) in pages.items() for row in rows),
+            key=lambda item: item[0]['created_at'], reverse=True)[:limit]
+        next_cursor = dict(cursor)
+        for tag, (rows, node_cursor) in pages.items():
+            taken = [row for row, row_tag in merged if row_tag == tag]
+            if len(taken) == len(rows):
+                next_cursor[tag] = str(node_cursor) if node_cursor is not None else 'end'
+            elif taken:
+                next_cursor[tag] = str(taken[-1]['id'])
+        rows = [{**row, 'node': tag} for row, tag in merged]
+        if all(next_cursor.get(tag) == 'end' for tag in self.tags):
+            return rows, None, unavailable
+        return rows, next_cursor, unavailable
+
+    def history_summary(self, content_hash):
+        """/api/history/<content_hash> of every node, merged per endpoint / options / model version"""
+        groups, unavailable = {}, []
+        for backend in self.ring.nodes:
+            _, response = self.send('GET', [backend], f"/api/history/{content_hash}")
+            if response is None or response.status_code >= 500:
+                unavailable.append(backend)
+                continue
+            if response.status_code != 200:
+                continue
+            for version in response.json()['versions']:
+                key = (version['endpoint'], version['options'], version['model_version'])
+                merged = groups.get(key)
+                if merged is None:
+                    groups[key] = dict(version)
+                    continue
+                latest = version if version['last_seen'] > merged['last_seen'] else merged
+                merged.update(
+                    analyses=merged['analyses'] + version['analyses'],
+                    first_seen=min(merged['first_seen'], version['first_seen']),
+                    last_seen=latest['last_seen'],
+                    verdict=latest['verdict'],
+                    fake_prob=latest['fake_prob'])
+        versions = sorted(groups.values(), key=lambda version: version['last_seen'], reverse=True)
+        return versions, unavailable
+
+
+def passthrough_headers(*names):
+    """Client hints such as X-Priority, plus the named headers"""
+    return {k: v for k, v in request.headers.items() if k.lower().startswith('x-') or k.lower() in names}
+
+
+def relay(response):
+    if response is None:
+        return jsonify(success=False, error="No backend available"), 503
+    return Response(response.content, status=response.status_code,
+                    content_type=response.headers.get('Content-Type'))
+
+
+def request_body():
+    # Bound to this request's stream, so another thread can drain it
+    stream = request.stream
+    return iter(lambda: stream.read(STREAM_CHUNK), b'')
+
+
+def parse_history_cursor(value):
+    """"tag:position,tag:position" from a previous /api/history page"""
+    cursor = {}
+    for part in (value or '').split(','):
+        if part:
+            tag, separator, position = part.partition(':')
+            if not separator:
+                raise ValueError(f"Invalid cursor: {value}")
+            cursor[tag] = position
+    return cursor
+
+
+def create_app(router):
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS
+
+    @app.route('/api/process/<endpoint>', methods=['POST'])
+    def process(endpoint):
+        if 'file' not in request.files:
+            return jsonify(success=False, error=f"No {endpoint} file uploaded"), 400
+
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify(success=False, error="Empty filename"), 400
+
+        data = file.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+
+        response = router.forward(request.path, content_hash, file.filename, data,
+                                  file.mimetype, request.form.to_dict(), passthrough_headers())
+        return relay(response)
+
+    @app.route('/api/upload', methods=['POST'])
+    def start_upload():
+        # Nothing is stored until the node answers, so starting elsewhere is safe
+        nodes = router.upload_nodes(request.form.get('sha256'))
+        backend, response = router.send('POST', nodes, '/api/upload',
+                                        data=request.form.to_dict(), headers=passthrough_headers())
+        if response is None or response.status_code != 201:
+            return relay(response)
+        payload = response.json()
+        payload['upload_id'] = f"{node_tag(backend)}-{payload['upload_id']}"
+        return jsonify(payload), 201
+
+    @app.route('/api/upload/<routed_id>', methods=['GET', 'PUT', 'DELETE'])
+    @app.route('/api/upload/<routed_id>/commit', methods=['POST'], endpoint='commit_upload')
+    def upload(routed_id):
+        backend, upload_id = router.node_for_upload(routed_id)
+        if backend is None:
+            return jsonify(success=False, error="Unknown or expired upload"), 404
+        path = f"/api/upload/{upload_id}" + ('/commit' if request.path.endswith('/commit') else '')
+        headers = passthrough_headers('upload-offset', 'upload-checksum', 'content-type')
+        # The upload only exists on its node, so there is nowhere to fail over to
+        if request.method == 'PUT':
+            _, response = router.send('PUT', [backend], path, retry=False, params=request.args,
+                                      data=request_body(), headers=headers)
+        else:
+            _, response = router.send(request.method, [backend], path, retry=request.method == 'GET',
+                                      params=request.args, data=request.form.to_dict(), headers=headers)
+        return relay(response)
+
+    @app.route('/api/stream/audio', methods=['POST'])
+    def stream_audio():
+        conn, response = router.open_stream(router.any_node(), request.full_path,
+                                            passthrough_headers('content-type'), request_body())
+        if response is None:
+            return jsonify(success=False, error="No backend available"), 503
+        relayed = Response(stream_with_context(iter(lambda: response.read1(STREAM_CHUNK), b'')),
+                           status=response.status, content_type=response.getheader('Content-Type'))
+        relayed.call_on_close(conn.close)
+        return relayed
+
+    @app.route('/api/history', methods=['GET'])
+    def history():
+        try:
+            cursor = parse_history_cursor(request.args.get('cursor'))
+            params = {k: v for k, v in request.args.items() if k != 'cursor'}
+            rows, next_cursor, unavailable = router.history(params, cursor)
+        except ValueError as e:
+            return jsonify(success=False, error=str(e)), 400
+        if next_cursor is not None:
+            next_cursor = ','.join(f"{tag}:{position}" for tag, position in next_cursor.items())
+        return jsonify(success=True, analyses=rows, next_cursor=next_cursor, unavailable=unavailable)
+
+    @app.route('/api/history/<content_hash>', methods=['GET'])
+    def content_history(content_hash):
+        versions, unavailable = router.history_summary(content_hash)
+        return jsonify(success=True, content_hash=content_hash, seen=bool(versions), versions=versions,
+                       unavailable=unavailable)
+
+    @app.route('/api/server-info', methods=['GET'])
+    def server_info():
+        with router.lock:
+            backends = dict(router.healthy)
+        return jsonify({
+            'status': 'running' if any(backends.values()) else 'degraded',
+            'name': 'Forensic Analysis Router',
+            'backends': backends,
+        })
+
+    @app.route('/api/metrics', methods=['GET'])
+    def router_metrics():
+        with router.lock:
+            return jsonify({**router.metrics, 'per_backend': dict(router.metrics['per_backend'])})
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Forensic analysis request router')
+    parser.add_argument('--backends', required=True,
+                        help='comma-separated backend base URLs, e.g. http://10.0.0.2:80')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--health-interval', type=float, default=5.0,
+                        help='seconds between /api/server-info health checks')
+    parser.add_argument('--timeout', type=float, default=300.0,
+                        help='seconds to wait for a backend to finish an analysis')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='times an idempotent request answered with a 5xx is retried on the next node')
+    args = parser.parse_args()
+
+    router = Router([b.rstrip('/') for b in args.backends.split(',') if b],
+                    health_interval=args.health_interval, timeout=args.timeout, retries=args.retries)
+    router.start_health_checks()
+    create_app(router).run(host=args.host, port=args.port, threaded=True)
@@ -1,29 +1,287 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import netifaces
 import subprocess
 import tempfile
+import hashlib
+import hmac
+import io
+import threading
+import time
+import json
 import os
+import sqlite3
+import sys
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+import numpy as np
+from audio_stream import AudioStream, ReadAhead
+from detectors import DETECTORS, SCRIPT_DETECTORS
+from history import HistoryStore
+from model_registry import ModelRegistry
+from pipeline import LANES, AnalysisPipeline, PreprocessError, parse_lane_weights
+from qos import TierController, tier_args
+from uploads import UploadError, UploadStore
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS
 
+# Counters exposed through /api/metrics
+metrics = {
+    'requests': 0,
+    'inferences': 0,
+    'coalesced': 0,
+    'cache_hits': 0,
+    'streams': 0,
+    'stream_windows': 0,
+    'model_swaps': 0,
+    'model_swap_failures': 0,
+}
+metrics_lock = threading.Lock()
+
+# Single-flight table: (endpoint, options, tier, model version, content hash) -> running job
+inflight_jobs = {}
+inflight_lock = threading.Lock()
+
+# In-process decode/preprocess/model pipeline, optionally backed by pre-forked
+# model workers. Started in __main__ when FORENSICS_PIPELINE=1 or
+# FORENSICS_POOL_WORKERS > 0; otherwise each request runs its detector script
+# in a subprocess.
+analysis_pipeline = None
+
+# SQLite history of every analysis (history.py). Opened in __main__ at
+# FORENSICS_HISTORY_DB (default history.db); set it to '' to disable.
+history_store = None
+
+# LRU of successful results, keyed like the single-flight table
+result_cache = OrderedDict()
+result_cache_size = int(os.environ.get('FORENSICS_CACHE_SIZE', '256'))
+result_cache_lock = threading.Lock()
+
+# Per-endpoint analysis tier (see qos.py). FORENSICS_QOS_SLO_MS=0 keeps every
+# request on the full tier.
+tier_controllers = {
+    endpoint: TierController(
+        slo_ms=float(os.environ.get('FORENSICS_QOS_SLO_MS', '0')),
+        high_depth=int(os.environ.get('FORENSICS_QOS_HIGH_DEPTH', '8')),
+        low_depth=int(os.environ.get('FORENSICS_QOS_LOW_DEPTH', '2')),
+        hold_seconds=float(os.environ.get('FORENSICS_QOS_HOLD_SECONDS', '10')))
+    for endpoint in ('ai-image', 'forged-image', 'image', 'audio')
+}
+
+# Live audio streams (/api/stream/audio): each costs at most one model call
+# per hop, and the number of concurrent streams is capped.
+stream_slots = threading.BoundedSemaphore(int(os.environ.get('FORENSICS_MAX_STREAMS', '4')))
+stream_default_hop = int(os.environ.get('FORENSICS_STREAM_HOP', '16000'))
+stream_min_hop = 4000
+stream_max_hop = 64600  # one model window: a longer hop would leave audio unscored
+# Used for streams when no pipeline (and so no shared registry) is running
+stream_model_registry = ModelRegistry()
+
+# Resumable uploads: partial files on disk, deleted after FORENSICS_UPLOAD_TTL
+# seconds without a new chunk
+upload_store = UploadStore(
+    root=os.environ.get('FORENSICS_UPLOAD_DIR'),
+    ttl_seconds=float(os.environ.get('FORENSICS_UPLOAD_TTL', '3600')),
+    max_bytes=int(float(os.environ.get('FORENSICS_UPLOAD_MAX_MB', '0')) * 2**20))
+# Suggested chunk size for clients: small enough to resend cheaply on a flaky link
+upload_chunk_size = int(os.environ.get('FORENSICS_UPLOAD_CHUNK_KB', '1024')) * 1024
+
+class InflightJob:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+
+# Detector script behind each analysis endpoint
+ENDPOINT_SCRIPTS = {
+    'ai-image': 'ai_image_detector_integration.py',
+    'forged-image': 'forged_image_detector.py',
+    'image': 'forged_image_detector.py',
+    'audio': 'audio_detector.py',
+}
+
+def endpoint_args(file_type, form):
+    # mode=tiled runs full-resolution tiled ELA instead of a single 128x128 pass
+    if file_type == 'forged-image' and form.get('mode') == 'tiled':
+        return ['--tiled']
+    # mode=frames scores sampled frames of an animated / multi-page image
+    if file_type == 'ai-image' and form.get('mode') == 'frames':
+        return ['--frames']
+    return []
+
 @app.route('/api/process/ai-image', methods=['POST'])
 def process_ai_image():
-    return process_file('ai-image', 'ai_image_detector_integration.py')
+    return process_file('ai-image', check_payload=check_ai_image_payload)
+
+def check_ai_image_payload(filename, data):
+    """Validate a compact client payload (see AiImageDetector.contract); returns (filename to analyse it under, payload kind)"""
+    payload = request.form.get('payload', 'file')
+    size = tuple(DETECTORS['ai-image'].contract['size'])
+    if payload == 'tensor':
+        expected = size[0] * size[1] * 3
+        if len(data) != expected:
+            raise ValueError(f"Tensor payload must be {expected} bytes ({size[0]}x{size[1]}x3 uint8), got {len(data)}")
+        # The .rgb suffix tells the detector to skip decode and resize
+        return os.path.splitext(os.path.basename(filename))[0] + '.rgb', payload
+    if payload == 'resized':
+        from PIL import Image
+        try:
+            actual = Image.open(io.BytesIO(data)).size
+        except Exception:
+            raise ValueError("Resized payload is not a readable image")
+        if actual != size:
+            raise ValueError(f"Resized payload must be {size[0]}x{size[1]}, got {actual[0]}x{actual[1]}")
+    elif payload != 'file':
+        raise ValueError(f"Unknown payload: {payload}")
+    return filename, payload
 
 @app.route('/api/process/forged-image', methods=['POST'])
 def process_forged_image():
-    return process_file('forged-image', 'forged_image_detector.py')
+    return process_file('forged-image', endpoint_args('forged-image', request.form))
 
 # API in case we use old version again:
 @app.route('/api/process/image', methods=['POST'])
 def process_forged_image_legacy():
-    return process_file('image', 'forged_image_detector.py')
+    return process_file('image')
 
 @app.route('/api/process/audio', methods=['POST'])
 def process_audio():
-    return process_file('audio', 'audio_detector.py')
+    return process_file('audio')
+
+@app.route('/api/upload', methods=['POST'])
+def start_upload():
+    """Begin a resumable upload (see uploads.py); the analysis settings are fixed here"""
+    file_type = request.form.get('type')
+    if file_type not in ENDPOINT_SCRIPTS:
+        return jsonify(success=False, error=f"Unknown upload type: {file_type}"), 400
+    try:
+        size = int(request.form['size']) if request.form.get('size') else None
+        upload = upload_store.create(request.form.get('filename'), size, {
+            'type': file_type,
+            'extra_args': endpoint_args(file_type, request.form),
+        })
+    except ValueError:
+        return jsonify(success=False, error="Invalid size"), 400
+    except UploadError as e:
+        return jsonify(success=False, error=str(e)), e.status
+    return jsonify(success=True, upload_id=upload.id, offset=0,
+                   chunk_size=upload_chunk_size, expires_in=upload_store.ttl), 201
+
+@app.route('/api/upload/<upload_id>', methods=['GET', 'PUT', 'DELETE'])
+def upload_chunk(upload_id):
+    try:
+        upload = upload_store.get(upload_id)
+        if request.method == 'DELETE':
+            upload_store.discard(upload_id)
+            return jsonify(success=True)
+        if request.method == 'PUT':
+            offset = request.args.get('offset', request.headers.get('Upload-Offset'))
+            if offset is None or not offset.isdigit():
+                return jsonify(success=False, error="Missing or invalid offset"), 400
+            upload_store.append(upload_id, int(offset), request.stream)
+    except UploadError as e:
+        payload = {'success': False, 'error': str(e)}
+        if e.offset is not None:
+            payload['offset'] = e.offset  # where the client should resume
+        return jsonify(**payload), e.status
+    return jsonify(success=True, offset=upload.offset, size=upload.size)
+
+@app.route('/api/upload/<upload_id>/commit', methods=['POST'])
+def commit_upload(upload_id):
+    try:
+        upload = upload_store.finish(upload_id)
+    except UploadError as e:
+        payload = {'success': False, 'error': str(e)}
+        if e.offset is not None:
+            payload['offset'] = e.offset
+        return jsonify(**payload), e.status
+    try:
+        # Optional end-to-end check against the client's own hash of the file
+        expected = request.form.get('sha256') or request.headers.get('Upload-Checksum')
+        if expected and expected.lower() != upload.content_hash:
+            return jsonify(success=False, error="Checksum mismatch", sha256=upload.content_hash), 422
+        count('requests')
+        return analyze(upload.options['type'], upload.options['extra_args'],
+                       upload.content_hash, lambda: nullcontext(upload.path))
+    finally:
+        upload_store.remove_files(upload)
+
+@app.route('/api/stream/audio', methods=['POST'])
+def stream_audio():
+    """Live analysis of a chunked PCM upload
+
+    Query parameters: sr (sample rate, 8000-192000, default 16000), format
+    (s16le or f32le, mono) and hop (samples at 16 kHz between scored
+    windows, clamped to 4000-64600). One NDJSON line is streamed back per
+    scored window, then a summary line.
+    """
+    try:
+        hop = min(max(int(request.args.get('hop', stream_default_hop)), stream_min_hop), stream_max_hop)
+        stream = AudioStream(int(request.args.get('sr', '16000')), hop, request.args.get('format', 's16le'))
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    if not stream_slots.acquire(blocking=False):
+        return jsonify(success=False, error="Too many live streams"), 503
+    count('streams')
+
+    input_stream = request.stream
+    # ~100 ms of audio per read keeps the verdict latency low
+    read_size = max(stream.sample_rate // 10, 1) * stream.dtype.itemsize
+    spoof_probs = []
+
+    def scored(window):
+        samples, end = window
+        line = {'window': stream.windows, 'end_seconds': end / stream.sample_rate, 'skipped': stream.skipped}
+        if not np.any(samples):
+            line['silent'] = True
+        else:
+            try:
+                result = score_audio_window(samples, stream.sample_rate)
+            except Exception as e:
+                line['error'] = f"Server error: {str(e)}"
+            else:
+                spoof_probs.append(result['spoof_prob'])
+                line.update(result)
+                count('stream_windows')
+        return json.dumps(line) + '\n'
+
+    def generate():
+        # Everything that arrived while a window was being scored is fed at
+        # once, so a backlog costs one model call and its stale hops count as skipped
+        reader = ReadAhead(input_stream, read_size)
+        while True:
+            data = reader.take()
+            if not data:
+                break
+            window = stream.feed(data)
+            if window is not None:
+                yield scored(window)
+        window = stream.flush()
+        if window is not None:
+            yield scored(window)
+        yield json.dumps({
+            'done': True,
+            'seconds': stream.received / stream.sample_rate,
+            'windows': stream.windows,
+            'skipped': stream.skipped,
+            'max_spoof_prob': max(spoof_probs, default=None),
+            'mean_spoof_prob': float(np.mean(spoof_probs)) if spoof_probs else None,
+        }) + '\n'
+
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.call_on_close(stream_slots.release)
+    return response
+
+def score_audio_window(samples, sample_rate):
+    """AASIST-L result for one stream window, prepared like an uploaded file"""
+    detector = DETECTORS['audio']
+    batch = detector.prepare((samples, sample_rate))[None]
+    if analysis_pipeline is not None and analysis_pipeline.inference_pool is not None:
+        pool = analysis_pipeline.inference_pool
+        return pool.submit('audio', batch).result(timeout=pool.timeout)[0]
+    registry = analysis_pipeline.model_registry if analysis_pipeline is not None else stream_model_registry
+    with registry.lease('audio') as model:
+        return detector.infer(model, batch)[0]
 
 @app.route('/api/server-info', methods=['GET'])
 def server_info():
@@ -31,9 +289,95 @@ def server_info():
         'ip': get_local_ip(),
         'port': 80,
         'status': 'running',
-        'name': 'Forensic Analysis Server'
+        'name': 'Forensic Analysis Server',
+        'models': {name: detector.contract for name, detector in DETECTORS.items()},
     })
 
+@app.route('/api/history', methods=['GET'])
+def analysis_history():
+    """Newest-first page of past analyses, filtered by content_hash / endpoint / model_version / verdict"""
+    if history_store is None:
+        return jsonify(success=False, error="History store disabled"), 404
+    filters = {name: request.args[name] for name in ('content_hash', 'endpoint', 'model_version', 'verdict')
+               if name in request.args}
+    try:
+        rows, cursor = history_store.query(
+            filters,
+            since=request.args.get('since'),
+            until=request.args.get('until'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50),
+            include_output=request.args.get('output') == '1')
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    return jsonify(success=True, analyses=rows, next_cursor=cursor)
+
+@app.route('/api/history/<content_hash>', methods=['GET'])
+def content_history(content_hash):
+    """Have we seen this file, and what did each endpoint / model version say?"""
+    if history_store is None:
+        return jsonify(success=False, error="History store disabled"), 404
+    summary = history_store.summary(content_hash)
+    return jsonify(success=True, content_hash=content_hash, seen=bool(summary), versions=summary)
+
+@app.route('/api/admin/models/<name>/swap', methods=['POST'])
+def admin_swap_model(name):
+    """Hot-swap a model: load and warm the new weights, then switch traffic over"""
+    denied = check_admin()
+    if denied is not None:
+        return denied
+    if name not in DETECTORS:
+        return jsonify(success=False, error=f"Unknown model: {name}"), 404
+    weights = request.form.get('weights') or (request.get_json(silent=True) or {}).get('weights')
+    if weights and analysis_pipeline is None:
+        # Detector scripts always load their default weights file
+        return jsonify(success=False, error="Custom weights need the in-process pipeline (FORENSICS_PIPELINE=1)"), 400
+    if weights and not os.path.isfile(DETECTORS[name].weights_path(weights)):
+        return jsonify(success=False, error=f"Weights file not found: {weights}"), 400
+    try:
+        results = swap_model(name, weights)
+    except Exception as e:
+        return jsonify(success=False, error=f"Swap failed, still serving the previous model: {str(e)}"), 500
+    return jsonify(success=True, model=name, version=active_model_version(name), results=results)
+
+@app.route('/api/admin/models', methods=['GET'])
+def admin_models():
+    denied = check_admin()
+    if denied is not None:
+        return denied
+    return jsonify(success=True, versions={name: active_model_version(name) for name in DETECTORS})
+
+def check_admin():
+    """Error response unless the request carries FORENSICS_ADMIN_TOKEN (admin routes are off without one)"""
+    token = os.environ.get('FORENSICS_ADMIN_TOKEN')
+    if not token:
+        return jsonify(success=False, error="Admin endpoints disabled"), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify(success=False, error="Invalid admin token"), 403
+    return None
+
+@app.route('/api/metrics', methods=['GET'])
+def server_metrics():
+    with metrics_lock:
+        snapshot = dict(metrics)
+    snapshot['uploads'] = upload_store.stats()
+    if history_store is not None:
+        snapshot['history'] = history_store.stats()
+    snapshot['model_versions'] = {name: active_model_version(name) for name in DETECTORS}
+    snapshot['tiers'] = {endpoint: controller.stats() for endpoint, controller in tier_controllers.items()}
+    if analysis_pipeline is not None:
+        snapshot['stages'] = analysis_pipeline.stats()
+        snapshot['lanes'] = analysis_pipeline.lane_stats()
+        if analysis_pipeline.inference_pool is None:
+            snapshot['models'] = analysis_pipeline.model_registry.stats()
+        else:
+            snapshot['workers'] = analysis_pipeline.inference_pool.stats()
+    return jsonify(snapshot)
+
+def count(name, amount=1):
+    with metrics_lock:
+        metrics[name] += amount
+
 def get_local_ip():
     """Get the most probable local IP address"""
     try:
@@ -64,7 +408,161 @@ def get_local_ip():
     except:
         return "127.0.0.1"
 
-def process_file(file_type, script_name):
+def cache_get(key):
+    with result_cache_lock:
+        entry = result_cache.get(key)
+        if entry is not None:
+            result_cache.move_to_end(key)
+        return entry
+
+def cache_put(key, entry):
+    if result_cache_size <= 0:
+        return
+    with result_cache_lock:
+        result_cache[key] = entry
+        result_cache.move_to_end(key)
+        while len(result_cache) > result_cache_size:
+            result_cache.popitem(last=False)
+
+def cached_result(key):
+    """Result cache lookup, falling back to the history store so results survive restarts"""
+    entry = cache_get(key)
+    if entry is None and history_store is not None:
+        file_type, extra_args, tier, model_version, content_hash = key
+        try:
+            output = history_store.lookup(content_hash, file_type, ' '.join(extra_args), tier, model_version)
+        except sqlite3.Error:
+            output = None
+        if output is not None:
+            entry = ({'success': True, 'output': output, 'tier': tier}, 200)
+            cache_put(key, entry)
+    return entry
+
+def endpoint_detector(file_type):
+    return DETECTORS[SCRIPT_DETECTORS[ENDPOINT_SCRIPTS[file_type]]]
+
+def active_model_version(name, extra_args=()):
+    """Version of the model that would serve a request now; part of every cache key"""
+    if analysis_pipeline is not None and not extra_args:
+        return analysis_pipeline.model_version(name)
+    # Detector scripts load the weights file afresh for every request
+    return DETECTORS[name].model_version()
+
+def swap_model(name, weights=None):
+    """Hot-swap name wherever it is held in this process tree"""
+    try:
+        if analysis_pipeline is not None:
+            results = analysis_pipeline.swap_model(name, weights)
+        else:
+            # Only live streams hold a model in this process; reload it only if resident
+            results = [stream_model_registry.swap(name, weights, load_if_absent=False)]
+    except Exception:
+        count('model_swap_failures')
+        raise
+    count('model_swaps')
+    return results
+
+def watch_model_files(interval):
+    """Hot-swap a model when its weights file is replaced, once the file has been still for an interval"""
+    seen = {name: detector.model_version() for name, detector in DETECTORS.items()}
+    changed = {}
+    while True:
+        time.sleep(interval)
+        for name, detector in DETECTORS.items():
+            version = detector.model_version()
+            if version is None or version == seen[name]:
+                changed.pop(name, None)
+                continue
+            if changed.get(name) != version:
+                changed[name] = version  # possibly still being written
+                continue
+            del changed[name]
+            seen[name] = version  # a broken file is not retried until it changes again
+            try:
+                swap_model(name)
+                print(f"Hot-swapped {name} to weights version {version}", file=sys.stderr)
+            except Exception as e:
+                print(f"Hot-swap of {name} failed, still serving the previous model: {str(e)}", file=sys.stderr)
+
+def record_history(file_type, extra_args, tier, model_version, content_hash, file_path, payload, seconds):
+    if history_store is None:
+        return
+    detector = endpoint_detector(file_type)
+    output = payload.get('output') or payload.get('error', '')
+    verdict, fake_prob = detector.verdict(output) if payload['success'] else (None, None)
+    history_store.record(
+        content_hash=content_hash,
+        endpoint=file_type,
+        options=' '.join(extra_args),
+        tier=tier,
+        model_version=model_version,
+        verdict=verdict,
+        fake_prob=fake_prob,
+        success=int(payload['success']),
+        seconds=seconds,
+        filename=os.path.basename(file_path),
+        output=output)
+
+def run_coalesced(key, job_fn):
+    """Run job_fn once per key; identical concurrent requests wait for and share its result"""
+    with inflight_lock:
+        job = inflight_jobs.get(key)
+        is_leader = job is None
+        if is_leader:
+            job = InflightJob()
+            inflight_jobs[key] = job
+
+    if not is_leader:
+        count('coalesced')
+        job.done.wait()
+        return job.result
+
+    try:
+        job.result = job_fn()
+    except Exception as e:
+        job.result = ({'success': False, 'error': f"Server error: {str(e)}"}, 500)
+    finally:
+        with inflight_lock:
+            del inflight_jobs[key]
+        job.done.set()
+    return job.result
+
+@contextmanager
+def temp_copy(filename, data):
+    """Path of data written to a temporary file named filename"""
+    with tempfile.TemporaryDirectory() as temp_dir:
+        file_path = os.path.join(temp_dir, filename)
+        with open(file_path, 'wb') as f:
+            f.write(data)
+        yield file_path
+
+def run_script(script_name, file_path, extra_args):
+    count('inferences')
+    try:
+        result = subprocess.run(
+            ['python', script_name, file_path, *extra_args],
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return {'success': True, 'output': result.stdout}, 200
+    except subprocess.CalledProcessError as e:
+        return {'success': False, 'error': f"Script error: {e.stderr}"}, 500
+    except Exception as e:
+        return {'success': False, 'error': f"Server error: {str(e)}"}, 500
+
+def run_pipelined(detector_name, file_path, tier, lane):
+    detector = DETECTORS[detector_name]
+    count('inferences')
+    try:
+        result = analysis_pipeline.submit(detector_name, file_path, tier, lane).result()
+        return {'success': True, 'output': detector.report(file_path, result)}, 200
+    except PreprocessError as e:
+        return {'success': True, 'output': str(e)}, 200
+    except Exception as e:
+        return {'success': False, 'error': f"Server error: {str(e)}"}, 500
+
+def process_file(file_type, extra_args=(), check_payload=None):
     if 'file' not in request.files:
         return jsonify(success=False, error=f"No {file_type} file uploaded"), 400
         
@@ -72,32 +570,117 @@ def process_file(file_type, script_name):
     if file.filename == '':
         return jsonify(success=False, error="Empty filename"), 400
 
-    # Create temp directory
-    with tempfile.TemporaryDirectory() as temp_dir:
-        file_path = os.path.join(temp_dir, file.filename)
-        file.save(file_path)
-
+    count('requests')
+    data = file.read()
+    filename, payload = file.filename, 'file'
+    if check_payload is not None:
         try:
-            result = subprocess.run(
-                ['python', script_name, file_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-            return jsonify(
-                success=True,
-                output=result.stdout
-            )
-        except subprocess.CalledProcessError as e:
-            return jsonify(
-                success=False,
-                error=f"Script error: {e.stderr}"
-            ), 500
-        except Exception as e:
-            return jsonify(
-                success=False,
-                error=f"Server error: {str(e)}"
-            ), 500
+            filename, payload = check_payload(filename, data)
+        except ValueError as e:
+            return jsonify(success=False, error=str(e)), 400
+    content_hash = hashlib.sha256(data).hexdigest()
+    if payload != 'file':
+        # The same bytes read as a different payload kind are a different input
+        content_hash = f"{payload}:{content_hash}"
+    return analyze(file_type, extra_args, content_hash, lambda: temp_copy(filename, data))
+
+def analyze(file_type, extra_args, content_hash, materialize):
+    """Cached / coalesced analysis of one file; materialize() is a context manager yielding its path"""
+    script_name = ENDPOINT_SCRIPTS[file_type]
+    # Results of a swapped-out model are never served for the new one
+    model_version = active_model_version(endpoint_detector(file_type).name, extra_args)
+
+    # A full-tier result is always preferred, even when running degraded
+    cached = cached_result((file_type, tuple(extra_args), 'full', model_version, content_hash))
+    if cached is not None:
+        count('cache_hits')
+        payload, status = cached
+        return jsonify(**payload), status
+
+    # Mobile clients are interactive; batch/API callers send X-Priority: bulk.
+    # Bulk work is not latency sensitive, so it always runs the full tier and
+    # does not count towards the load that degrades interactive requests.
+    lane = (request.headers.get('X-Priority') or request.form.get('priority') or 'interactive').lower()
+    if lane not in LANES:
+        return jsonify(success=False, error=f"Unknown priority: {lane}"), 400
+    controller = tier_controllers[file_type] if lane == 'interactive' else None
+    start = time.perf_counter()
+    tier = controller.begin() if controller is not None else 'full'
+    try:
+        args = tier_args(file_type, extra_args, tier)
+        if args is None:
+            tier, args = 'full', list(extra_args)
+        key = (file_type, tuple(extra_args), tier, model_version, content_hash)
+
+        def job():
+            job_start = time.perf_counter()
+            with materialize() as file_path:
+                if analysis_pipeline is not None and not extra_args:
+                    payload, status = run_pipelined(SCRIPT_DETECTORS[script_name], file_path, tier, lane)
+                else:
+                    payload, status = run_script(script_name, file_path, args)
+            if payload['success']:
+                payload = {**payload, 'tier': tier, 'output': f"{payload['output'].rstrip()}\nAnalysis tier: {tier}\n"}
+            record_history(file_type, extra_args, tier, model_version, content_hash, file_path, payload,
+                           time.perf_counter() - job_start)
+            return payload, status
+
+        cached = cached_result(key) if tier != 'full' else None
+        if cached is not None:
+            count('cache_hits')
+            payload, status = cached
+        else:
+            payload, status = run_coalesced(key, job)
+            if status == 200 and payload['success']:
+                cache_put(key, (payload, status))
+    finally:
+        if controller is not None:
+            controller.end(tier, time.perf_counter() - start)
+    return jsonify(**payload), status
 
 if __name__ == '__main__':
+    # Models held by the in-process pipeline, or by each pool worker
+    registry_options = {
+        'budget_mb': float(os.environ.get('FORENSICS_MODEL_BUDGET_MB', '0')),
+        'pinned': [name for name in os.environ.get('FORENSICS_PINNED_MODELS', '').split(',') if name],
+        'policy': os.environ.get('FORENSICS_MODEL_EVICTION', 'lru'),
+    }
+    inference_pool = None
+    pool_workers = int(os.environ.get('FORENSICS_POOL_WORKERS', '0'))
+    if pool_workers > 0:
+        from inference_pool import InferencePool, parse_cpu_sets
+        inference_pool = InferencePool(
+            list(DETECTORS),
+            pool_workers,
+            threads_per_worker=int(os.environ.get('FORENSICS_POOL_THREADS', '1')),
+            cpu_sets=parse_cpu_sets(os.environ.get('FORENSICS_POOL_CPUS')),
+            registry_options=registry_options,
+            # A dead worker fails its jobs at once; this bounds a stuck one (0 = wait forever)
+            timeout=float(os.environ.get('FORENSICS_POOL_TIMEOUT_SECONDS', '300')) or None)
+
+    # The history writer is a thread, so it starts only once the pool has forked
+    history_path = os.environ.get('FORENSICS_HISTORY_DB', 'history.db')
+    if history_path:
+        history_store = HistoryStore(history_path)
+
+    if inference_pool is not None or os.environ.get('FORENSICS_PIPELINE') == '1':
+        analysis_pipeline = AnalysisPipeline(
+            decode_threads=int(os.environ.get('FORENSICS_DECODE_THREADS', '4')),
+            preprocess_threads=int(os.environ.get('FORENSICS_PREPROCESS_THREADS', str(os.cpu_count() or 4))),
+            queue_size=int(os.environ.get('FORENSICS_QUEUE_SIZE', '32')),
+            max_batch=int(os.environ.get('FORENSICS_MAX_BATCH', '8')),
+            inference_pool=inference_pool,
+            # One dispatcher thread per pool worker keeps every worker busy
+            model_threads=pool_workers if inference_pool is not None else 1,
+            model_registry=ModelRegistry(**registry_options),
+            lane_weights=parse_lane_weights(os.environ.get('FORENSICS_LANE_WEIGHTS')))
+        if inference_pool is None:
+            # Pinned models are never evicted, so load them before the first request
+            for name in registry_options['pinned']:
+                analysis_pipeline.model_registry.get(name)
+
+    # Poll the default weights files and hot-swap replaced ones (0 = off)
+    model_watch_seconds = float(os.environ.get('FORENSICS_MODEL_WATCH_SECONDS', '0'))
+    if model_watch_seconds > 0:
+        threading.Thread(target=watch_model_files, args=(model_watch_seconds,), daemon=True).start()
     app.run(host='0.0.0.0', port=80)
\ No newline at end of file
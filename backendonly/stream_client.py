@@ -0,0 +1,131 @@
+"""
+Scripted client for /api/stream/audio.
+
+Sends a WAV file (16-bit PCM, downmixed to mono), or a synthetic tone when
+no file is given, as a chunked upload. By default it is paced like a live
+call, and it prints each score line as soon as the server pushes it.
+
+    python stream_client.py --url http://127.0.0.1:80 call.wav --hop 8000
+    python stream_client.py --seconds 12 --no-realtime
+"""
+import argparse
+import json
+import socket
+import sys
+import threading
+import time
+import wave
+from urllib.parse import urlencode, urlparse
+
+import numpy as np
+
+
+def read_wav(path):
+    with wave.open(path, 'rb') as fh:
+        if fh.getsampwidth() != 2:
+            raise ValueError("only 16-bit PCM WAV files are supported")
+        samples = np.frombuffer(fh.readframes(fh.getnframes()), dtype='<i2')
+        channels = fh.getnchannels()
+        if channels > 1:
+            samples = samples.reshape(-1, channels).mean(axis=1).astype('<i2')
+        return samples, fh.getframerate()
+
+
+def synthetic_tone(seconds, sample_rate):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 120 + 40 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    x = sum(np.sin(k * phase) / k for k in range(1, 6))
+    return (0.5 * x / np.max(np.abs(x)) * 32767).astype('<i2'), sample_rate
+
+
+def send_chunks(sock, samples, sample_rate, chunk_ms, realtime):
+    chunk = max(int(sample_rate * chunk_ms / 1000), 1)
+    start = time.perf_counter()
+    for i in range(0, len(samples), chunk):
+        data = samples[i:i + chunk].tobytes()
+        sock.sendall(b'%x\r\n%s\r\n' % (len(data), data))
+        if realtime:
+            # Sleep until this chunk's end time, so the upload keeps pace with the audio
+            delay = (i + chunk) / sample_rate - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+    sock.sendall(b'0\r\n\r\n')
+
+
+def read_chunked_lines(fh):
+    """Yield lines of a chunked HTTP response body"""
+    pending = b''
+    while True:
+        size = int(fh.readline().split(b';')[0], 16)
+        if size == 0:
+            break
+        pending += fh.read(size)
+        fh.readline()
+        *lines, pending = pending.split(b'\n')
+        yield from lines
+    if pending:
+        yield pending
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream audio to /api/stream/audio and print live scores')
+    parser.add_argument('wav', nargs='?', help='16-bit PCM WAV file (default: synthetic tone)')
+    parser.add_argument('--url', default='http://127.0.0.1:80')
+    parser.add_argument('--hop', type=int, default=16000, help='samples at 16 kHz between scored windows')
+    parser.add_argument('--seconds', type=float, default=10.0, help='length of the synthetic tone')
+    parser.add_argument('--chunk-ms', type=int, default=100)
+    parser.add_argument('--no-realtime', action='store_true', help='send as fast as possible')
+    args = parser.parse_args()
+
+    samples, sample_rate = read_wav(args.wav) if args.wav else synthetic_tone(args.seconds, 16000)
+    url = urlparse(args.url)
+    host, port = url.hostname, url.port or 80
+    query = urlencode({'sr': sample_rate, 'format': 's16le', 'hop': args.hop})
+
+    sock = socket.create_connection((host, port))
+    sock.sendall((f"POST /api/stream/audio?{query} HTTP/1.1\r\n"
+                  f"Host: {host}:{port}\r\n"
+                  "Content-Type: application/octet-stream\r\n"
+                  "Transfer-Encoding: chunked\r\n"
+                  "Connection: close\r\n\r\n").encode())
+    sender = threading.Thread(target=send_chunks,
+                              args=(sock, samples, sample_rate, args.chunk_ms, not args.no_realtime),
+                              daemon=True)
+    start = time.perf_counter()
+    sender.start()
+
+    fh = sock.makefile('rb')
+    status = fh.readline().decode().strip()
+    headers = {}
+    for line in iter(fh.readline, b'\r\n'):
+        name, _, value = line.decode().partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if ' 200 ' not in status + ' ':
+        print(status, fh.read().decode(errors='replace'), file=sys.stderr)
+        sys.exit(1)
+
+    if headers.get('transfer-encoding') == 'chunked':
+        lines = read_chunked_lines(fh)
+    else:
+        lines = iter(fh.readline, b'')
+    for line in lines:
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        elapsed = time.perf_counter() - start
+        if result.get('done'):
+            print(f"[{elapsed:6.2f}s] done: {json.dumps(result)}")
+        elif result.get('silent'):
+            print(f"[{elapsed:6.2f}s] window {result['window']} @ {result['end_seconds']:.2f}s: silent")
+        elif 'error' in result:
+            print(f"[{elapsed:6.2f}s] window {result['window']}: {result['error']}")
+        else:
+            print(f"[{elapsed:6.2f}s] window {result['window']} @ {result['end_seconds']:.2f}s: "
+                  f"{result['prediction']} (spoof {result['spoof_prob']:.3f}, skipped {result['skipped']})")
+    sender.join()
+    sock.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Hop and skip accounting of the live audio stream state (audio_stream.py).
+"""
+import io
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_stream import AudioStream, ReadAhead
+
+
+def pcm(seconds, sample_rate=16000):
+    samples = (np.sin(np.arange(int(seconds * sample_rate)) / 10) * 10000).astype('<i2')
+    return samples.tobytes()
+
+
+def test_window_every_hop():
+    stream = AudioStream(16000, hop=8000)
+    assert stream.feed(pcm(0.25)) is None  # 4000 samples, half a hop
+    samples, end = stream.feed(pcm(0.25))
+    assert end == 8000 and len(samples) == 8000
+    assert stream.feed(pcm(0.5)) is not None
+    assert (stream.windows, stream.skipped) == (2, 0)
+
+
+def test_backlog_scores_only_the_newest_window():
+    stream = AudioStream(16000, hop=4000)
+    window = stream.feed(pcm(20))
+    assert window is not None
+    samples, end = window
+    assert end == 20 * 16000
+    assert len(samples) == 64600  # the newest full model window
+    assert stream.windows == 1
+    assert stream.skipped == 20 * 16000 // 4000 - 1
+    assert stream.feed(b'') is None
+
+
+def test_hop_and_window_scale_with_the_sample_rate():
+    stream = AudioStream(48000, hop=16000)
+    assert (stream.window, stream.hop) == (64600 * 3, 48000)
+
+
+def test_sample_split_across_reads():
+    stream = AudioStream(16000, hop=4000)
+    data = pcm(0.25)
+    assert stream.feed(data[:4001]) is None
+    assert stream.feed(data[4001:]) is not None
+    assert stream.received == 4000 and stream.pending == b''
+
+
+@pytest.mark.parametrize('sample_rate', [0, 7999, 192001])
+def test_rejects_sample_rates_out_of_range(sample_rate):
+    with pytest.raises(ValueError):
+        AudioStream(sample_rate, hop=16000)
+
+
+class GatedStream(io.RawIOBase):
+    """Serves chunks one read at a time, holding each read until released"""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.gate = threading.Semaphore(0)
+
+    def read(self, size=-1):
+        self.gate.acquire()
+        return self.chunks.pop(0) if self.chunks else b''
+
+
+def test_read_ahead_takes_the_whole_backlog_at_once():
+    chunks = [pcm(0.2) for _ in range(100)]  # 20 s in 200 ms pieces
+    source = GatedStream(chunks)
+    reader = ReadAhead(source, 6400)
+    # Everything arrives while the consumer is busy scoring
+    for _ in range(len(chunks)):
+        source.gate.release()
+    while reader.chunks.qsize() < len(chunks):
+        threading.Event().wait(0.01)
+
+    stream = AudioStream(16000, hop=4000)
+    assert stream.feed(reader.take()) is not None
+    assert stream.windows == 1 and stream.skipped > 0
+
+    source.gate.release()  # end of stream
+    assert reader.take() == b''
+    assert reader.take() == b''
@@ -0,0 +1,79 @@
+"""
+Single-flight coalescing in server.analyze: identical uploads that arrive
+while the first is still being analysed share its result instead of each
+running the detector.
+"""
+import io
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def server():
+    pytest.importorskip('flask')
+    pytest.importorskip('flask_cors')
+    pytest.importorskip('netifaces')
+    import server
+    return server
+
+
+@pytest.fixture
+def client(server, monkeypatch):
+    monkeypatch.setattr(server, 'analysis_pipeline', None)
+    monkeypatch.setattr(server, 'history_store', None)
+    monkeypatch.setattr(server, 'active_model_version', lambda name, extra_args=(): 'test')
+    server.result_cache.clear()
+    return server.app.test_client()
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_identical_concurrent_uploads_run_one_inference(server, client, monkeypatch):
+    uploads = 8
+    calls = []
+
+    def fake_run_script(script_name, file_path, extra_args):
+        server.count('inferences')
+        calls.append(file_path)
+        # Hold the leader until every other request has joined its job
+        wait_for(lambda: server.metrics['coalesced'] >= coalesced_before + uploads - 1)
+        return {'success': True, 'output': f"Prediction: Authentic\nFile: {os.path.basename(file_path)}"}, 200
+
+    monkeypatch.setattr(server, 'run_script', fake_run_script)
+    inferences_before = server.metrics['inferences']
+    coalesced_before = server.metrics['coalesced']
+
+    responses = [None] * uploads
+
+    def upload(i):
+        response = client.post('/api/process/ai-image', data={
+            'file': (io.BytesIO(b'same image bytes'), 'photo.jpg'),
+        }, content_type='multipart/form-data')
+        responses[i] = (response.status_code, response.get_json())
+
+    threads = [threading.Thread(target=upload, args=(i,)) for i in range(uploads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+
+    assert len(calls) == 1
+    assert server.metrics['inferences'] - inferences_before == 1
+    assert server.metrics['coalesced'] - coalesced_before == uploads - 1
+    assert all(response == responses[0] for response in responses)
+    status, payload = responses[0]
+    assert status == 200 and payload['success']
+    assert not server.inflight_jobs
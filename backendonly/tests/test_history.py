@@ -0,0 +1,83 @@
+"""
+Paging and time windows of the analysis history (history.py).
+"""
+import os
+import sys
+import time
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import history
+from history import HistoryStore
+
+
+def write(path, rows, endpoint='ai-image'):
+    store = HistoryStore(path, flush_seconds=0)
+    for i in range(rows):
+        store.record(content_hash=f"{i:064x}", endpoint=endpoint, options='', tier='full', success=1)
+    store.close()  # flushes every queued row
+
+
+def at(monkeypatch, now):
+    """Make the history writer's clock read now"""
+    monkeypatch.setattr(history, 'time', types.SimpleNamespace(time=lambda: now, monotonic=time.monotonic))
+
+
+def pages(store, **kwargs):
+    rows, cursor = store.query(**kwargs)
+    yield rows
+    while cursor is not None:
+        rows, cursor = store.query(cursor=cursor, **kwargs)
+        yield rows
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / 'history.db')
+
+
+def test_pages_meet_at_the_cursor_without_gaps_or_repeats(db):
+    write(db, 7)
+    write(db, 3, endpoint='audio')
+    store = HistoryStore(db)
+
+    seen = [[row['id'] for row in page] for page in pages(store, limit=3)]
+    assert [len(page) for page in seen] == [3, 3, 3, 1]
+    ids = [row_id for page in seen for row_id in page]
+    assert ids == sorted(ids, reverse=True) == list(range(10, 0, -1))
+
+    filtered = [row['id'] for page in pages(store, filters={'endpoint': 'ai-image'}, limit=3) for row in page]
+    assert filtered == list(range(7, 0, -1))
+    store.close()
+
+
+def test_page_that_ends_exactly_on_the_last_row_has_no_cursor(db):
+    write(db, 4)
+    store = HistoryStore(db)
+    rows, cursor = store.query(limit=2)
+    rows, cursor = store.query(limit=2, cursor=cursor)
+    assert [row['id'] for row in rows] == [2, 1] and cursor is None
+    store.close()
+
+
+def test_time_window_follows_insert_order_when_the_clock_steps_back(db, monkeypatch):
+    at(monkeypatch, 100.0)
+    write(db, 3)
+    at(monkeypatch, 200.0)
+    write(db, 2)
+    at(monkeypatch, 150.0)  # clock stepped back
+    write(db, 1)
+    store = HistoryStore(db)
+
+    rows, _ = store.query(limit=50)
+    created = [row['created_at'] for row in rows]
+    assert created == sorted(created, reverse=True)
+
+    newer = [row['id'] for page in pages(store, since=150.0, limit=2) for row in page]
+    assert newer == [6, 5, 4]
+    assert [row['id'] for row in store.query(until=150.0)[0]] == [3, 2, 1]
+    assert store.query(since=300.0) == ([], None)
+    store.close()
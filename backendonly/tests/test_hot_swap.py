@@ -0,0 +1,85 @@
+"""
+Model hot-swap of the forged-image detector through ModelRegistry: a swap
+without new weights reloads the weights file from disk, and retiring the
+old model leaves the standalone script's module global alone.
+"""
+import os
+import sys
+import types
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeKerasModel:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.weights = f.read()
+
+    def predict(self, batch, verbose=0):
+        return np.zeros((len(batch), 1), dtype=np.float32)
+
+
+@pytest.fixture
+def forged(monkeypatch, tmp_path):
+    """The forged-image detector on a fake TensorFlow, serving a weights file in tmp_path"""
+    pytest.importorskip('PIL')
+    tf = types.ModuleType('tensorflow')
+    tf.keras = types.SimpleNamespace(models=types.SimpleNamespace(load_model=FakeKerasModel))
+    tf.get_logger = lambda: types.SimpleNamespace(setLevel=lambda level: None)
+    monkeypatch.setitem(sys.modules, 'tensorflow', tf)
+    monkeypatch.delitem(sys.modules, 'forged_image_detector', raising=False)
+
+    from detectors import DETECTORS
+    detector = DETECTORS['forged-image']
+    weights = tmp_path / 'model.keras'
+    weights.write_bytes(b'weights v1')
+    monkeypatch.setattr(detector, 'weights', str(weights))
+    monkeypatch.setattr(detector.module, 'model_path', str(weights))
+    return detector, weights
+
+
+def replace_file(path, data):
+    """Write data over path, with an mtime that differs from the old file's"""
+    stat = path.stat()
+    path.write_bytes(data)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_swap_loads_a_new_model_after_the_file_changed(forged):
+    from model_registry import ModelRegistry
+    detector, weights = forged
+    registry = ModelRegistry()
+
+    old = registry.get('forged-image')
+    assert old.weights == b'weights v1'
+
+    replace_file(weights, b'weights v2')
+    result = registry.swap('forged-image')
+
+    new = registry.get('forged-image')
+    assert new is not old
+    assert new.weights == b'weights v2'
+    assert result['version'] != result['previous_version']
+    assert registry.version('forged-image') == detector.model_version()
+
+
+def test_retiring_a_model_keeps_the_script_model(forged):
+    from model_registry import ModelRegistry
+    detector, weights = forged
+    module = detector.module
+    script_model = module.load_model()  # what the standalone script path uses
+    registry = ModelRegistry()
+
+    with registry.lease('forged-image') as leased:
+        assert leased is not script_model
+        registry.swap('forged-image')
+        assert registry.get('forged-image') is not leased
+    # The old model was unloaded when its lease ended
+    assert registry.stats()['draining'] == []
+    assert module.model is script_model
+
+    detector.unload(script_model)
+    assert module.model is None
@@ -0,0 +1,62 @@
+"""
+Hot-swaps across the workers of an InferencePool (inference_pool.py): a
+swap that fails in one worker leaves every worker on the previous model.
+"""
+import multiprocessing as mp
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detectors import DETECTORS, Detector
+from inference_pool import InferencePool
+
+
+class VersionDetector(Detector):
+    """The model is its weights name; the next load fails while fail_next is set"""
+    name = 'versions'
+    input_shape = (1,)
+
+    def __init__(self):
+        self.fail_next = mp.Value('b', 0)
+
+    def load(self, weights=None):
+        with self.fail_next.get_lock():
+            if self.fail_next.value:
+                self.fail_next.value = 0
+                raise OSError(f"cannot read {weights}")
+        return weights or 'v1'
+
+    def warm(self, model, passes=2):
+        pass
+
+    def model_version(self, weights=None):
+        return weights or 'v1'
+
+    def infer(self, model, batch):
+        return [model] * len(batch)
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    detector = VersionDetector()
+    monkeypatch.setitem(DETECTORS, detector.name, detector)
+    pool = InferencePool([detector.name], num_workers=2, cpu_sets=[None], timeout=30)
+    yield pool, detector
+    pool.close()
+
+
+def test_failed_swap_leaves_every_worker_on_the_previous_model(pool):
+    pool, detector = pool
+    pool.swap('versions', 'v1')  # every worker holds v1
+
+    detector.fail_next.value = 1  # exactly one worker fails to load v2
+    with pytest.raises(RuntimeError, match='cannot read v2'):
+        pool.swap('versions', 'v2')
+    assert pool.model_version('versions') == 'v1'
+
+    results = pool.swap('versions', 'v3')
+    assert [result['previous_version'] for result in results] == ['v1', 'v1']
+    assert pool.model_version('versions') == 'v3'
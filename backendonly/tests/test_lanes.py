@@ -0,0 +1,67 @@
+"""
+Priority lanes of the analysis pipeline (pipeline.py): weighted fair
+sharing in LaneQueue and validation of FORENSICS_LANE_WEIGHTS.
+"""
+import os
+import queue
+import sys
+import types
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pipeline import LaneQueue, parse_lane_weights
+
+
+def job(lane, n=0):
+    return types.SimpleNamespace(lane=lane, n=n)
+
+
+def drain(lanes, count):
+    return [lanes.get_nowait() for _ in range(count)]
+
+
+def test_backlogged_lanes_are_served_in_proportion_to_their_weights():
+    lanes = LaneQueue(100, {'interactive': 8, 'bulk': 1})
+    for n in range(90):
+        lanes.put(job('interactive', n))
+        lanes.put(job('bulk', n))
+    served = drain(lanes, 90)
+    assert Counter(j.lane for j in served) == {'interactive': 80, 'bulk': 10}
+    # Within a lane jobs keep their order
+    assert [j.n for j in served if j.lane == 'bulk'] == list(range(10))
+
+
+def test_an_idle_lane_banks_no_credit():
+    lanes = LaneQueue(100, {'interactive': 1, 'bulk': 1})
+    for n in range(20):
+        lanes.put(job('bulk', n))
+    drain(lanes, 10)  # bulk runs alone for a while
+    for n in range(10):
+        lanes.put(job('interactive', n))
+    # Equal weights alternate from here instead of interactive catching up
+    served = [j.lane for j in drain(lanes, 10)]
+    assert Counter(served) == {'interactive': 5, 'bulk': 5}
+
+
+def test_stop_marker_waits_for_every_lane_to_empty():
+    lanes = LaneQueue(10, {'interactive': 8, 'bulk': 1})
+    lanes.put(job('bulk'))
+    lanes.put(None)
+    assert lanes.get().lane == 'bulk'
+    assert lanes.get() is None
+    with pytest.raises(queue.Empty):
+        lanes.get_nowait()
+
+
+def test_lane_weights_override_the_defaults():
+    assert parse_lane_weights('') == {'interactive': 8, 'bulk': 1}
+    assert parse_lane_weights(' bulk = 2.5 ,') == {'interactive': 8, 'bulk': 2.5}
+
+
+@pytest.mark.parametrize('spec', ['bulk', 'batch=1', 'bulk=fast', 'bulk=0', 'bulk=-1', 'bulk=inf', 'bulk=nan'])
+def test_invalid_lane_weights_are_rejected(spec):
+    with pytest.raises(ValueError):
+        parse_lane_weights(spec)
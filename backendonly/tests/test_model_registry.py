@@ -0,0 +1,102 @@
+"""
+Budget accounting in ModelRegistry (model_registry.py): leased models are
+not evicted, retired models count until they are unloaded, and overlapping
+loads each get their own footprint.
+"""
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model_registry
+from detectors import DETECTORS, Detector
+
+MB = 2**20
+
+
+class FakeDetector(Detector):
+    """Loading adds size bytes to the fake process RSS; unloading gives them back"""
+
+    def __init__(self, name, size, rss, gate=None):
+        self.name = name
+        self.size = size
+        self.rss = rss
+        self.gate = gate
+
+    def load(self, weights=None):
+        self.rss[0] += self.size
+        if self.gate is not None:
+            self.gate.wait(5)
+        return object()
+
+    def warm(self, model, passes=2):
+        pass
+
+    def unload(self, model):
+        self.rss[0] -= self.size
+
+    def model_version(self, weights=None):
+        return weights or 'v1'
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    rss = [0]
+    monkeypatch.setattr(model_registry, 'current_rss', lambda: rss[0])
+    monkeypatch.setattr(model_registry, 'release_free_memory', lambda: None)
+    return rss
+
+
+def install(monkeypatch, *detectors):
+    for detector in detectors:
+        monkeypatch.setitem(DETECTORS, detector.name, detector)
+
+
+def test_leased_model_is_not_evicted(monkeypatch, rss):
+    install(monkeypatch, FakeDetector('a', 60 * MB, rss), FakeDetector('b', 60 * MB, rss))
+    registry = model_registry.ModelRegistry(budget_mb=100)
+
+    with registry.lease('a') as leased:
+        registry.get('b')  # over budget, but 'a' is in use
+        assert set(registry.entries) == {'a', 'b'}
+        assert registry.stats()['draining'] == []
+        assert registry.get('a') is leased
+    # Once 'a' is free, the next load can evict it
+    registry.get('b')
+    assert registry.counters['evictions'] == 0
+
+
+def test_retired_model_counts_until_its_last_lease_ends(monkeypatch, rss):
+    install(monkeypatch, FakeDetector('a', 60 * MB, rss), FakeDetector('b', 30 * MB, rss))
+    registry = model_registry.ModelRegistry(budget_mb=100)
+
+    with registry.lease('a'):
+        registry.swap('a', weights='v2')
+        # The old and the new copy are both in memory
+        assert registry.resident_bytes() == 120 * MB
+        # Making room for 'b' evicts the idle new copy, not the leased old one
+        registry.get('b')
+        assert list(registry.entries) == ['b']
+        assert registry.resident_bytes() == 90 * MB
+        assert [item['version'] for item in registry.stats()['draining']] == ['v1']
+    assert registry.stats()['draining'] == []
+    assert registry.resident_bytes() == sum(e.footprint for e in registry.entries.values())
+
+
+def test_overlapping_loads_measure_their_own_growth(monkeypatch, rss):
+    gate = threading.Event()
+    install(monkeypatch, FakeDetector('a', 40 * MB, rss, gate), FakeDetector('b', 10 * MB, rss))
+    registry = model_registry.ModelRegistry()
+
+    loader = threading.Thread(target=registry.get, args=('a',))
+    loader.start()
+    other = threading.Thread(target=registry.get, args=('b',))
+    other.start()
+    other.join(0.2)  # without serialised loads, 'b' would finish inside 'a's load
+    gate.set()
+    loader.join(5)
+    other.join(5)
+    assert registry.footprints == {'a': 40 * MB, 'b': 10 * MB}
@@ -0,0 +1,120 @@
+"""
+Consistent-hash placement in router.py, and the full-duplex relay of live
+audio streams: verdict lines must reach the client while it is still
+sending.
+"""
+import hashlib
+import http.server
+import os
+import queue
+import sys
+import threading
+from collections import Counter
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NODES = [f"http://10.0.0.{i}:80" for i in range(2, 6)]
+
+
+@pytest.fixture
+def router():
+    pytest.importorskip('flask')
+    pytest.importorskip('flask_cors')
+    pytest.importorskip('requests')
+    import router
+    return router
+
+
+def content_hashes(count):
+    return [hashlib.sha256(str(i).encode()).hexdigest() for i in range(count)]
+
+
+def test_ring_spreads_content_over_every_node(router):
+    ring = router.HashRing(NODES)
+    owners = Counter(ring.nodes_for(h)[0] for h in content_hashes(4000))
+    assert set(owners) == set(NODES)
+    # 100 virtual nodes each keep every share within a loose band around 1/4
+    assert all(600 < n < 1400 for n in owners.values())
+
+
+def test_removing_a_node_only_moves_its_own_content(router):
+    hashes = content_hashes(2000)
+    before = {h: router.HashRing(NODES).nodes_for(h) for h in hashes}
+    ring = router.HashRing(NODES[1:])
+    for h in hashes:
+        ordered = ring.nodes_for(h)
+        assert sorted(ordered) == sorted(NODES[1:])
+        # Content moves to the next node it would have failed over to
+        assert ordered[0] == [n for n in before[h] if n != NODES[0]][0]
+
+
+def test_uploads_start_on_the_owner_of_the_client_hash(router):
+    r = router.Router(NODES)
+    content_hash = content_hashes(1)[0]
+    assert r.upload_nodes(content_hash)[0] == r.ring.nodes_for(content_hash)[0]
+    assert r.upload_nodes(content_hash.upper()) == r.upload_nodes(content_hash)
+    assert sorted(r.upload_nodes('not-a-hash')) == sorted(NODES)
+
+
+class EchoHandler(http.server.BaseHTTPRequestHandler):
+    """Answers each chunk of a chunked POST with a line, as soon as it arrives"""
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        while True:
+            size = int(self.rfile.readline(), 16)
+            data = self.rfile.read(size)
+            self.rfile.readline()
+            if not size:
+                break
+            line = b'%d\n' % len(data)
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(line), line))
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+
+    def log_message(self, *args):
+        pass
+
+
+def test_stream_lines_arrive_before_the_upload_ends(router):
+    backend = http.server.ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+    threading.Thread(target=backend.serve_forever, daemon=True).start()
+    try:
+        r = router.Router([f"http://127.0.0.1:{backend.server_port}"], timeout=10)
+        sent = queue.Queue()
+
+        def body():
+            while True:
+                data = sent.get()
+                if data is None:
+                    return
+                yield data
+
+        conn, response = r.open_stream(r.any_node(), '/api/stream/audio', {}, body())
+        try:
+            assert response.status == 200
+            sent.put(b'abc')
+            assert response.readline() == b'3\n'  # the body is still open
+            sent.put(b'defgh')
+            assert response.readline() == b'5\n'
+            sent.put(None)
+            assert response.read() == b''
+        finally:
+            conn.close()
+        assert r.metrics['requests'] == 1 and r.metrics['unavailable'] == 0
+    finally:
+        backend.shutdown()
+        backend.server_close()
+
+
+def test_stream_fails_over_when_a_node_refuses(router):
+    r = router.Router(['http://127.0.0.1:1'], timeout=2)
+    assert r.open_stream(r.any_node(), '/api/stream/audio', {}, iter([b'x'])) == (None, None)
+    assert r.metrics['failovers'] == 1 and r.metrics['unavailable'] == 1
+    assert r.healthy['http://127.0.0.1:1'] is False
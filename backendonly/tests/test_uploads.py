@@ -0,0 +1,104 @@
+"""
+Resumable chunked uploads (uploads.py): offsets, resuming after a chunk is
+cut off, and the TTL sweep.
+"""
+import hashlib
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from uploads import UploadError, UploadStore
+
+
+class CutOffStream(io.RawIOBase):
+    """Yields data in reads of read_size, then fails as a dropped connection would"""
+
+    def __init__(self, data, read_size):
+        self.data = data
+        self.read_size = read_size
+
+    def read(self, size=-1):
+        if not self.data:
+            raise OSError("connection reset")
+        chunk, self.data = self.data[:self.read_size], self.data[self.read_size:]
+        return chunk
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), ttl_seconds=60, read_size=4)
+
+
+def test_chunks_append_at_the_current_offset(store):
+    upload = store.create('clip.wav', 10, {})
+    assert store.append(upload.id, 0, io.BytesIO(b'01234')) == 5
+    with pytest.raises(UploadError) as error:
+        store.append(upload.id, 3, io.BytesIO(b'xx'))
+    assert (error.value.status, error.value.offset) == (409, 5)
+    assert store.append(upload.id, 5, io.BytesIO(b'56789')) == 10
+
+    done = store.finish(upload.id)
+    with open(done.path, 'rb') as f:
+        assert f.read() == b'0123456789'
+    assert done.content_hash == hashlib.sha256(b'0123456789').hexdigest()
+
+
+def test_resume_after_a_chunk_is_cut_off(store):
+    data = bytes(range(32))
+    upload = store.create('photo.jpg', len(data), {})
+    with pytest.raises(OSError):
+        store.append(upload.id, 0, CutOffStream(data[:10], read_size=4))
+    # The bytes that arrived are kept, and the client resumes from there
+    assert store.get(upload.id).offset == 10
+    with pytest.raises(UploadError) as error:
+        store.finish(upload.id)
+    assert (error.value.status, error.value.offset) == (409, 10)
+
+    assert store.append(upload.id, 10, io.BytesIO(data[10:])) == len(data)
+    done = store.finish(upload.id)
+    with open(done.path, 'rb') as f:
+        assert f.read() == data
+    assert done.content_hash == hashlib.sha256(data).hexdigest()
+
+
+def test_bytes_past_the_offset_are_truncated_on_resume(store):
+    upload = store.create('photo.jpg', None, {})
+    store.append(upload.id, 0, io.BytesIO(b'abcd'))
+    with open(upload.part_path, 'ab') as f:
+        f.write(b'garbage from a failed write')
+    store.append(upload.id, 4, io.BytesIO(b'efgh'))
+    with open(store.finish(upload.id).path, 'rb') as f:
+        assert f.read() == b'abcdefgh'
+
+
+def test_chunk_past_the_declared_size_is_rejected(store):
+    upload = store.create('photo.jpg', 6, {})
+    with pytest.raises(UploadError) as error:
+        store.append(upload.id, 0, io.BytesIO(b'0123456789'))
+    assert (error.value.status, error.value.offset) == (413, 4)
+
+
+def test_sweep_removes_only_idle_uploads(store):
+    assert store.sweeper is None  # no thread until the first upload
+    idle = store.create('old.jpg', None, {})
+    busy = store.create('busy.jpg', None, {})
+    fresh = store.create('new.jpg', None, {})
+    assert store.sweeper is not None
+    idle.touched -= 120
+    busy.touched -= 120
+    busy.lock.acquire()  # receiving a chunk right now
+    try:
+        assert store.sweep() == 1
+    finally:
+        busy.lock.release()
+
+    assert not os.path.exists(idle.directory)
+    with pytest.raises(UploadError) as error:
+        store.get(idle.id)
+    assert error.value.status == 404
+    assert store.get(busy.id) is busy and store.get(fresh.id) is fresh
+    assert store.stats()['expired'] == 1
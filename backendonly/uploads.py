@@ -0,0 +1,190 @@
+"""
+Resumable chunked uploads (/api/upload).
+
+    POST   /api/upload                 start: type, filename[, size, mode]
+    PUT    /api/upload/<id>?offset=N   raw chunk appended at byte N
+    GET    /api/upload/<id>            current offset, i.e. where to resume
+    POST   /api/upload/<id>/commit     analyse the assembled file
+    DELETE /api/upload/<id>            abandon
+
+Chunks are written straight to disk and fed to a running SHA-256 as they
+arrive, so the content hash (the result cache key) is ready as soon as the
+last byte is in. A chunk cut off mid-transfer keeps the bytes that made it;
+the client asks for the offset and resumes from there. Uploads idle for
+longer than the TTL are deleted. Upload state lives in memory, so uploads
+do not survive a server restart.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+
+class UploadError(Exception):
+    """Rejected upload request; status is the HTTP status to answer with
+
+    offset, when set, is where the client should resume.
+    """
+
+    def __init__(self, message, status, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+class Upload:
+    def __init__(self, upload_id, directory, filename, size, options):
+        self.id = upload_id
+        self.directory = directory
+        self.part_path = os.path.join(directory, 'data.part')
+        self.path = os.path.join(directory, filename)  # where the file ends up on commit
+        self.filename = filename
+        self.size = size  # declared total size, or None
+        self.options = options  # endpoint settings fixed when the upload starts
+        self.offset = 0
+        self.sha256 = hashlib.sha256()
+        self.content_hash = None
+        self.touched = time.monotonic()
+        self.lock = threading.Lock()  # one chunk at a time
+
+
+class UploadStore:
+    def __init__(self, root=None, ttl_seconds=3600, max_bytes=0, read_size=1 << 20):
+        self.root = root or tempfile.mkdtemp(prefix='forensics-uploads-')
+        os.makedirs(self.root, exist_ok=True)
+        self.ttl = ttl_seconds
+        self.max_bytes = max_bytes  # 0 = unlimited
+        self.read_size = read_size
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.counters = {'started': 0, 'committed': 0, 'expired': 0, 'chunks': 0}
+        # Started with the first upload, not at import: the server forks its
+        # inference workers after importing this, and must have no threads then
+        self.sweeper = None
+
+    def create(self, filename, size, options):
+        filename = os.path.basename(filename or '')
+        if not filename or filename == 'data.part':
+            raise UploadError("Missing or invalid filename", 400)
+        if size is not None and self.max_bytes and size > self.max_bytes:
+            raise UploadError(f"Upload exceeds the {self.max_bytes} byte limit", 413)
+        upload_id = uuid.uuid4().hex
+        directory = os.path.join(self.root, upload_id)
+        os.mkdir(directory)
+        upload = Upload(upload_id, directory, filename, size, options)
+        open(upload.part_path, 'wb').close()
+        with self.lock:
+            self.uploads[upload_id] = upload
+            self.counters['started'] += 1
+            if self.sweeper is None:
+                self.sweeper = threading.Thread(target=self._sweep_loop, daemon=True)
+                self.sweeper.start()
+        return upload
+
+    def get(self, upload_id):
+        with self.lock:
+            upload = self.uploads.get(upload_id)
+        if upload is None:
+            raise UploadError("Unknown or expired upload", 404)
+        return upload
+
+    def append(self, upload_id, offset, stream):
+        """Write stream to the upload at offset; returns the new offset"""
+        upload = self._lock(upload_id)
+        try:
+            if offset != upload.offset:
+                raise UploadError(f"Offset mismatch: upload is at byte {upload.offset}", 409, upload.offset)
+            limit = upload.size if upload.size is not None else self.max_bytes or None
+            with self.lock:
+                self.counters['chunks'] += 1
+            # Truncate first: a failed write may have left bytes past the offset
+            with open(upload.part_path, 'r+b') as f:
+                f.seek(upload.offset)
+                f.truncate()
+                while True:
+                    data = stream.read(self.read_size)
+                    if not data:
+                        break
+                    if limit is not None and upload.offset + len(data) > limit:
+                        raise UploadError(f"Chunk runs past the upload size of {limit} bytes", 413, upload.offset)
+                    f.write(data)
+                    upload.sha256.update(data)
+                    upload.offset += len(data)
+                    upload.touched = time.monotonic()
+            return upload.offset
+        finally:
+            upload.lock.release()
+
+    def finish(self, upload_id):
+        """Take a complete upload out of the store, its file renamed to the original filename"""
+        upload = self._lock(upload_id)
+        try:
+            if upload.size is not None and upload.offset != upload.size:
+                raise UploadError(f"Upload incomplete: {upload.offset} of {upload.size} bytes received", 409,
+                                  upload.offset)
+            if not upload.offset:
+                raise UploadError("Upload is empty", 400)
+            with self.lock:
+                del self.uploads[upload_id]
+                self.counters['committed'] += 1
+            os.replace(upload.part_path, upload.path)
+            upload.content_hash = upload.sha256.hexdigest()
+            return upload
+        finally:
+            upload.lock.release()
+
+    def discard(self, upload_id):
+        upload = self._lock(upload_id)
+        try:
+            with self.lock:
+                self.uploads.pop(upload_id, None)
+        finally:
+            upload.lock.release()
+        self.remove_files(upload)
+
+    def remove_files(self, upload):
+        shutil.rmtree(upload.directory, ignore_errors=True)
+
+    def sweep(self):
+        """Delete uploads idle for longer than the TTL"""
+        now = time.monotonic()
+        expired = []
+        with self.lock:
+            for upload_id, upload in list(self.uploads.items()):
+                # A locked upload is receiving a chunk right now, so it is not idle
+                if now - upload.touched > self.ttl and upload.lock.acquire(blocking=False):
+                    del self.uploads[upload_id]
+                    upload.lock.release()
+                    expired.append(upload)
+            self.counters['expired'] += len(expired)
+        for upload in expired:
+            self.remove_files(upload)
+        return len(expired)
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(max(min(self.ttl / 4, 60), 1))
+            self.sweep()
+
+    def _lock(self, upload_id):
+        upload = self.get(upload_id)
+        if not upload.lock.acquire(blocking=False):
+            raise UploadError("Another request is writing to this upload", 409)
+        # It may have been committed, discarded or swept while we waited for the lock
+        with self.lock:
+            current = self.uploads.get(upload_id)
+        if current is not upload:
+            upload.lock.release()
+            raise UploadError("Unknown or expired upload", 404)
+        return upload
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                'active': len(self.uploads),
+                'pending_mb': sum(upload.offset for upload in self.uploads.values()) / 2**20,
+            }
@@ -0,0 +1,433 @@
+"""
+Watch-folder ingestion daemon.
+
+Files dropped anywhere under the watched directory are analysed by the
+in-process detectors (the same AnalysisPipeline the server uses) and the
+reports are written next to each file as <name>.forensics.json, or to a
+--sink directory or JSON-lines file.
+
+New files are picked up through inotify (IN_CLOSE_WRITE / IN_MOVED_TO),
+or by polling the tree where inotify is unavailable (non-Linux, network
+file systems, exhausted watch limit). A file is analysed once its mtime has
+been still for --settle seconds, so half-copied files are left alone.
+
+Every finished file is appended to a checkpoint log keyed on path, mtime,
+size and SHA-256. On restart the tree is rescanned, and a file is skipped
+when its path, mtime and size match the checkpoint; if only the mtime
+changed, it is hashed and skipped when the content is unchanged. Throughput
+scales with --workers (files hashed and in flight at once) and the
+pipeline's decode / preprocess threads, optionally backed by pre-forked
+model workers (--pool-workers).
+
+    python watch_folder.py /srv/evidence --workers 8
+    python watch_folder.py /srv/evidence --sink /srv/reports.jsonl --poll
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from detectors import DETECTORS
+from pipeline import AnalysisPipeline, PreprocessError
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif', '.tif', '.tiff', '.bmp')
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.mp3', '.ogg', '.m4a')
+SIDECAR_SUFFIX = '.forensics.json'
+
+
+def ignored(path):
+    """Hidden files (checkpoint, temp files) and our own reports are never analysed"""
+    name = os.path.basename(path)
+    return name.startswith('.') or name.endswith(SIDECAR_SUFFIX)
+
+
+def scan(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if not ignored(path):
+                yield path
+
+
+def file_sha256(path, block_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+# Watchers: read(timeout) returns the paths that may need analysis; None in
+# the list means "events were lost, rescan the tree".
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+
+class InotifyWatcher:
+    def __init__(self, root):
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.add_watch = libc.inotify_add_watch
+        self.add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self.fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.directories = {}  # watch descriptor -> directory
+        self.add_tree(root)
+
+    def add_tree(self, root):
+        for dirpath, dirnames, _ in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            wd = self.add_watch(self.fd, os.fsencode(dirpath), INOTIFY_MASK)
+            if wd < 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, f"inotify_add_watch failed: {os.strerror(errno)}", dirpath)
+            self.directories[wd] = dirpath
+
+    def read(self, timeout):
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        data = os.read(self.fd, 1 << 16)
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                paths.append(None)
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name or name.startswith(b'.'):
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                # Files may land in a new directory before its watch exists
+                self.add_tree(path)
+                paths.extend(scan(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                paths.append(path)
+        return paths
+
+
+class PollWatcher:
+    def __init__(self, root, interval=5.0):
+        self.root = root
+        self.interval = interval
+        self.seen = self._snapshot()
+
+    def _snapshot(self):
+        snapshot = {}
+        for path in scan(self.root):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def read(self, timeout):
+        time.sleep(self.interval)
+        snapshot = self._snapshot()
+        changed = [path for path, state in snapshot.items() if self.seen.get(path) != state]
+        self.seen = snapshot
+        return changed
+
+
+# Checkpoint
+
+class Checkpoint:
+    """Append-only log of finished files; the latest line per path wins"""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}  # path -> (mtime_ns, size, sha256)
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    self.entries[entry['path']] = (entry['mtime_ns'], entry['size'], entry['sha256'])
+        self._compact()
+        self.file = open(path, 'a')
+        self.lock = threading.Lock()
+
+    def _compact(self):
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            for path, (mtime_ns, size, sha256) in self.entries.items():
+                f.write(json.dumps({'path': path, 'mtime_ns': mtime_ns, 'size': size, 'sha256': sha256}) + '\n')
+        os.replace(tmp, self.path)
+
+    def unchanged(self, path, st):
+        """True if path was finished with this exact mtime and size"""
+        entry = self.entries.get(path)
+        return entry is not None and entry[:2] == (st.st_mtime_ns, st.st_size)
+
+    def sha256(self, path):
+        entry = self.entries.get(path)
+        return entry[2] if entry is not None else None
+
+    def record(self, path, st, sha256):
+        with self.lock:
+            self.entries[path] = (st.st_mtime_ns, st.st_size, sha256)
+            self.file.write(json.dumps({'path': path, 'mtime_ns': st.st_mtime_ns,
+                                        'size': st.st_size, 'sha256': sha256}) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+
+# Sinks
+
+class SidecarSink:
+    def write(self, path, record):
+        target = path + SIDECAR_SUFFIX
+        tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(target)}.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(tmp, target)
+
+
+class DirectorySink:
+    """Reports mirrored under another directory: <sink>/<relative path>.json"""
+
+    def __init__(self, root, directory):
+        self.root = root
+        self.directory = directory
+
+    def write(self, path, record):
+        target = os.path.join(self.directory, os.path.relpath(path, self.root) + '.json')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + '.tmp', 'w') as f:
+            json.dump(record, f, indent=2)
+        os.replace(target + '.tmp', target)
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.file = open(path, 'a')
+        self.lock = threading.Lock()
+
+    def write(self, path, record):
+        with self.lock:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+
+# Ingestion
+
+class Ingestor:
+    def __init__(self, pipeline, checkpoint, sink, routes, workers=4, settle_seconds=2.0):
+        self.pipeline = pipeline
+        self.checkpoint = checkpoint
+        self.sink = sink
+        self.routes = routes  # extension -> detector names
+        self.settle_seconds = settle_seconds
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.pending = set()  # paths waiting to settle
+        self.running = set()
+        self.recheck = set()  # changed again while being analysed
+        self.lock = threading.Lock()
+        self.counters = {'analysed': 0, 'skipped': 0, 'failed': 0}
+
+    def detectors_for(self, path):
+        return self.routes.get(os.path.splitext(path)[1].lower(), ())
+
+    def schedule(self, path):
+        if ignored(path) or not self.detectors_for(path):
+            return
+        with self.lock:
+            if path in self.running:
+                self.recheck.add(path)
+            else:
+                self.pending.add(path)
+
+    def dispatch(self):
+        """Start every pending file whose mtime has settled"""
+        now = time.time()
+        with self.lock:
+            for path in list(self.pending):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    self.pending.discard(path)
+                    continue
+                if now - st.st_mtime < self.settle_seconds:
+                    continue
+                self.pending.discard(path)
+                if self.checkpoint.unchanged(path, st):
+                    self.counters['skipped'] += 1
+                    continue
+                self.running.add(path)
+                self.executor.submit(self._run, path, st)
+
+    def _run(self, path, st):
+        try:
+            self.process(path, st)
+        except Exception as e:
+            with self.lock:
+                self.counters['failed'] += 1
+            print(f"{path}: {str(e)}", file=sys.stderr)
+        finally:
+            with self.lock:
+                self.running.discard(path)
+                if path in self.recheck:
+                    self.recheck.discard(path)
+                    self.pending.add(path)
+
+    def process(self, path, st):
+        sha256 = file_sha256(path)
+        if os.stat(path).st_mtime_ns != st.st_mtime_ns:
+            self.schedule(path)  # modified while hashing: wait for it to settle again
+            return
+        if self.checkpoint.sha256(path) == sha256:
+            # Touched but not modified
+            self.checkpoint.record(path, st, sha256)
+            with self.lock:
+                self.counters['skipped'] += 1
+            return
+
+        start = time.perf_counter()
+        futures = {name: self.pipeline.submit(name, path, lane='bulk') for name in self.detectors_for(path)}
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = DETECTORS[name].report(path, future.result())
+            except PreprocessError as e:
+                results[name] = str(e)  # what the detector script would print
+        self.sink.write(path, {
+            'path': path,
+            'sha256': sha256,
+            'size': st.st_size,
+            'analysed_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'seconds': time.perf_counter() - start,
+            'results': results,
+        })
+        # Recorded only after the report is written, so a crash re-analyses
+        self.checkpoint.record(path, st, sha256)
+        with self.lock:
+            self.counters['analysed'] += 1
+        print(f"{path}: {', '.join(results)} in {time.perf_counter() - start:.2f}s")
+
+    def idle(self):
+        with self.lock:
+            return not self.pending and not self.running
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def make_watcher(root, poll, poll_interval):
+    if not poll:
+        try:
+            return InotifyWatcher(root)
+        except OSError as e:
+            print(f"inotify unavailable ({str(e)}); polling every {poll_interval:g}s", file=sys.stderr)
+    return PollWatcher(root, poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Analyse files dropped into a directory tree')
+    parser.add_argument('root', help='directory tree to watch')
+    parser.add_argument('--sink', help='directory or .jsonl file for reports (default: <file>.forensics.json)')
+    parser.add_argument('--checkpoint', help='checkpoint log (default: <root>/.forensics-checkpoint.jsonl)')
+    parser.add_argument('--image-detectors', default='ai-image,forged-image')
+    parser.add_argument('--audio-detectors', default='audio')
+    parser.add_argument('--workers', type=int, default=4, help='files hashed and analysed concurrently')
+    parser.add_argument('--decode-threads', type=int, default=4)
+    parser.add_argument('--preprocess-threads', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--max-batch', type=int, default=8)
+    parser.add_argument('--pool-workers', type=int, default=0, help='pre-forked model worker processes')
+    parser.add_argument('--pool-threads', type=int, default=1, help='torch/TF threads per pool worker')
+    parser.add_argument('--settle', type=float, default=2.0, help='seconds a file must be unmodified')
+    parser.add_argument('--poll', action='store_true', help='poll instead of using inotify')
+    parser.add_argument('--poll-interval', type=float, default=5.0)
+    parser.add_argument('--once', action='store_true', help='analyse what is there now, then exit')
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    routes = {}
+    for extensions, names in ((IMAGE_EXTENSIONS, args.image_detectors), (AUDIO_EXTENSIONS, args.audio_detectors)):
+        names = tuple(name for name in names.split(',') if name)
+        unknown = set(names) - set(DETECTORS)
+        if unknown:
+            parser.error(f"unknown detectors: {', '.join(sorted(unknown))}")
+        routes.update(dict.fromkeys(extensions, names))
+
+    if args.sink is None:
+        sink = SidecarSink()
+    elif args.sink.endswith('.jsonl'):
+        sink = JsonlSink(args.sink)
+    else:
+        sink = DirectorySink(root, args.sink)
+
+    inference_pool = None
+    if args.pool_workers > 0:
+        from inference_pool import InferencePool
+        inference_pool = InferencePool(sorted({name for names in routes.values() for name in names}),
+                                       args.pool_workers, threads_per_worker=args.pool_threads)
+    pipeline = AnalysisPipeline(
+        decode_threads=args.decode_threads,
+        preprocess_threads=args.preprocess_threads,
+        max_batch=args.max_batch,
+        inference_pool=inference_pool,
+        model_threads=args.pool_workers if inference_pool is not None else 1)
+    checkpoint = Checkpoint(args.checkpoint or os.path.join(root, '.forensics-checkpoint.jsonl'))
+    ingestor = Ingestor(pipeline, checkpoint, sink, routes, args.workers, args.settle)
+
+    # The watch is set up before the initial scan so nothing falls in between
+    watcher = None if args.once else make_watcher(root, args.poll, args.poll_interval)
+    for path in scan(root):
+        ingestor.schedule(path)
+    try:
+        while True:
+            ingestor.dispatch()
+            if watcher is None:
+                if ingestor.idle():
+                    break
+                time.sleep(0.5)
+                continue
+            for path in watcher.read(timeout=min(args.settle, 1.0)):
+                if path is None:
+                    for rescanned in scan(root):
+                        ingestor.schedule(rescanned)
+                else:
+                    ingestor.schedule(path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ingestor.close()
+        pipeline.close()
+        if inference_pool is not None:
+            inference_pool.close()
+        checkpoint.close()
+        print(json.dumps(ingestor.counters), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()